@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from typing import List, Tuple, Iterator
+
+from data_helpers import parse_input, parse_input_binary, pack_output
+from gale_shapley import gale_shapley, gale_shapley_array, ENGINES
+
+
+# (input path, output path or "" on failure, n, seconds, error message)
+BatchResult = Tuple[str, str, int, float, str]
+
+
+def find_inputs(source: str) -> List[str]:
+    """
+    Takes a directory (every .in / .gsb file in it) or a manifest file (one input path per line,
+    relative paths are relative to the manifest, blank lines and # comments are skipped).
+    Returns the input paths, largest files first so the big instances don't all end up in the last chunk.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source) if name.endswith((".in", ".gsb"))]
+    else:
+        base = os.path.dirname(source)
+        with open(source, "r") as f:
+            paths = [os.path.join(base, line.strip()) for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return sorted(paths, key=lambda path: (-os.path.getsize(path) if os.path.isfile(path) else 0, path))
+
+
+def output_path(in_path: str, out_dir: str) -> str:
+    """ foo.in / foo.gsb -> out_dir/foo.out (next to the input if out_dir is empty). """
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    return os.path.join(out_dir or os.path.dirname(in_path), stem + ".out")
+
+
+def plan_jobs(paths: List[str], out_dir: str) -> List[Tuple[str, str]]:
+    """
+    Pairs every input path with its output_path().
+    Raises ValueError if two inputs would write the same output file (foo.in and foo.gsb, or the same name from two
+    directories with out_dir), instead of letting one silently overwrite the other.
+    """
+    jobs = []
+    writers = {}
+    for path in paths:
+        out_path = output_path(path, out_dir)
+        key = os.path.normcase(os.path.abspath(out_path))
+        if key in writers:
+            raise ValueError(f"{writers[key]} and {path} would both be written to {out_path}")
+        writers[key] = path
+        jobs.append((path, out_path))
+    return jobs
+
+
+def solve_file(in_path: str, out_path: str, engine: str) -> BatchResult:
+    """
+    Loads one instance, runs the matcher and writes the pairings with pack_output().
+    Runs inside a worker process, so everything it prints is captured and returned as the error message.
+    """
+    start = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            n, written = _solve(in_path, out_path, engine)
+        except Exception as e: # keep one broken instance from taking the whole batch down
+            print(f"{type(e).__name__}: {e}")
+            n, written = -1, ""
+
+    return in_path, written, n, time.perf_counter() - start, log.getvalue().strip()
+
+
+def _solve(in_path: str, out_path: str, engine: str) -> Tuple[int, str]:
+    if engine == "sparse":
+        # Incomplete lists (text or binary incomplete-list files, or G-S files), unpaired hospitals are left out
+        from sparse_preferences import read_instance_sparse, gale_shapley_sparse
+        from preference_arrays import pack_output_array
+        n, sparse = read_instance_sparse(in_path)
+        if n < 1:
+            return n, ""
+        return n, pack_output_array(gale_shapley_sparse(sparse, validate=False), out_path)
+    if engine == "array":
+        # Memory-map binary inputs / parse text straight into int32 matrices, no dicts until the output
+        from preference_arrays import load_input_binary, parse_input_arrays, make_arrays, pairs_from_array
+        n, hospital_prefs, student_prefs = load_input_binary(in_path) if in_path.endswith(".gsb") else parse_input_arrays(in_path)
+        if n < 1:
+            return n, ""
+        pairs = pairs_from_array(gale_shapley_array(make_arrays(n, hospital_prefs, student_prefs), validate=False))
+    else:
+        n, hospital_prefs, student_prefs = parse_input_binary(in_path) if in_path.endswith(".gsb") else parse_input(in_path)
+        if n < 1:
+            return n, ""
+        pairs = gale_shapley(n, hospital_prefs, student_prefs, engine=engine, validate=False)
+
+    return n, pack_output(pairs, out_path)
+
+
+def solve_chunk(jobs: List[Tuple[str, str]], engine: str) -> List[BatchResult]:
+    """ Worker entry point, only paths cross the process boundary so big instances are never pickled. """
+    return [solve_file(in_path, out_path, engine) for in_path, out_path in jobs]
+
+
+def run_batch(paths: List[str], out_dir: str = "", engine: str = "rank", workers: int = 0, chunksize: int = 0) -> Iterator[BatchResult]:
+    """
+    Solves every input file across a process pool, yielding each chunk's results as soon as it completes.
+    workers defaults to the CPU count, chunksize to about four chunks per worker.
+    Raises ValueError before solving anything if two inputs map to the same output file (see plan_jobs()).
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed # pulls in multiprocessing, only load it to run a batch
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, -(-len(paths) // (workers * 4)))
+    jobs = plan_jobs(paths, out_dir)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_chunk, jobs[i:i + chunksize], engine) for i in range(0, len(jobs), chunksize)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def main():
+    """
+    Batch matcher, solves many independent instances in parallel:
+        python batch.py data/markets --out-dir data/results --workers 8
+        python batch.py manifest.txt --engine array
+        python batch.py data/markets --engine sparse     # incomplete preference lists
+    Prints one line per instance as it completes, exits with 1 if any instance failed.
+    """
+    parser = argparse.ArgumentParser(description="Run Gale-Shapley on a directory or manifest of .in / .gsb files.")
+    parser.add_argument("source", help="directory of .in / .gsb files, or a manifest file listing one input path per line")
+    parser.add_argument("--out-dir", default="", help="directory for the .out files (default: next to each input)")
+    parser.add_argument("--engine", default="rank", choices=ENGINES, help="gale_shapley() engine (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=0, help="instances per task sent to a worker (default: automatic)")
+    args = parser.parse_args()
+
+    paths = find_inputs(args.source)
+    try:
+        plan_jobs(paths, args.out_dir)
+    except ValueError as e:
+        print(f"Batch Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    failed = 0
+    for in_path, out_path, n, seconds, message in run_batch(paths, args.out_dir, args.engine, args.workers, args.chunksize):
+        if out_path:
+            print(f"{in_path} -> {out_path} (n = {n}, {seconds * 1000:.1f} ms)", flush=True)
+        else:
+            failed += 1
+            print(f"{in_path}: FAILED {message}", flush=True)
+
+    print(f"Solved {len(paths) - failed} of {len(paths)} instances.", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
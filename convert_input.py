@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import sys
+from preference_arrays import parse_input_arrays, load_input_binary, pack_input_binary, pack_input_text
+from sparse_preferences import read_instance_sparse, pack_input_sparse
+from data_helpers import SPARSE_BINARY_MAGIC
+
+
+def main():
+    """
+    Converts between the G-S text (.in) and binary (.gsb) input file formats, picking the direction from the extensions:
+        python convert_input.py data/example.in data/example.gsb
+        python convert_input.py data/example.gsb data/example.in
+    With --incomplete, or when the input is an incomplete-list binary file, the incomplete-list formats are read
+    and written instead (see data_helpers.py), so the rows may rank any subset of 1..n:
+        python convert_input.py --incomplete market.in market.gsb
+    """
+    args = sys.argv[1:]
+    incomplete = "--incomplete" in args
+    if incomplete:
+        args.remove("--incomplete")
+    if len(args) != 2:
+        print("Usage: python convert_input.py [--incomplete] <input .in/.gsb> <output .gsb/.in>")
+        sys.exit(2)
+    in_path, out_path = args
+
+    if not incomplete and in_path.endswith(".gsb"):
+        try:
+            with open(in_path, "rb") as f:
+                incomplete = f.read(len(SPARSE_BINARY_MAGIC)) == SPARSE_BINARY_MAGIC
+        except OSError:
+            pass # load_input_binary() reports it
+
+    if incomplete:
+        n, sparse = read_instance_sparse(in_path, "binary" if in_path.endswith(".gsb") else "text")
+        if n < 1:
+            sys.exit(1)
+        pack_input_sparse(sparse, out_path, "binary" if out_path.endswith(".gsb") else "text")
+        return
+
+    if in_path.endswith(".gsb"):
+        n, hospital_prefs, student_prefs = load_input_binary(in_path)
+    else:
+        n, hospital_prefs, student_prefs = parse_input_arrays(in_path)
+    if n < 1:
+        sys.exit(1)
+
+    if out_path.endswith(".gsb"):
+        pack_input_binary(n, hospital_prefs, student_prefs, out_path)
+    else:
+        pack_input_text(n, hospital_prefs, student_prefs, out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
-from typing import List, Tuple, Dict
-import random
+from typing import List, Tuple, Dict, Iterator, Optional
+from array import array
+from contextlib import contextmanager
+import io
+import struct
+import sys
 
 """
 G-S input file format:
@@ -26,8 +30,45 @@ Example:
     1 2
     2 3
     3 1
+
+G-S binary input file format (.gsb), all values little-endian:
+    header          ] 4 byte magic b"GSB1", then n as a uint32
+    hospital_prefs  ] n x n int32, row-major, row h - 1 is hospital h's preference list
+    student_prefs   ] n x n int32, row-major, row s - 1 is student s's preference list
+
+Incomplete-list (sparse) input file format, for sparse_preferences.py:
+    the G-S input file format, except every row may rank any subset of 1..n (blank if none)
+
+Incomplete-list binary input file format (.gsb with its own magic), all values little-endian:
+    header          ] 4 byte magic b"GSS1", then n as a uint32
+    list lengths    ] 2n int32, hospitals first
+    preferences     ] every hospital's list, then every student's list, concatenated as int32
+
+Hospitals/residents (many-to-one) input file format, for hospital_residents.py:
+    n_hospitals n_students  ] two integers, which is what tells it apart from the G-S input file format
+    hospital rows           ] n_hospitals lines, the hospital's capacity followed by the students it ranks (any subset of 1..n_students)
+    student rows            ] n_students lines, the hospitals the student ranks (any subset of 1..n_hospitals, blank if none)
+Example (hospital 1 takes two students, student 3 only applied to hospital 2):
+    2 3
+    2 3 1 2
+    1 2 3
+    1 2
+    2 1
+    2
+
+Hospitals/residents binary input file format (.gsb with its own magic), all values little-endian:
+    header          ] 4 byte magic b"GSH1", then n_hospitals and n_students as uint32
+    capacities      ] n_hospitals int32
+    list lengths    ] n_hospitals + n_students int32, hospitals first
+    preferences     ] every hospital's list, then every student's list, concatenated as int32
+
+Hospitals/residents output file format is the G-S output file format with one line per admitted student,
+so a hospital can appear on several lines and unassigned students don't appear.
 """
 
+BINARY_MAGIC = b"GSB1"
+BINARY_HEADER = struct.Struct("<4sI")
+
 
 def valid_input(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> bool:
     if n < 1:
@@ -48,68 +89,458 @@ def valid_input(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dic
         return False
 
     # Preference values must be exactly 1..n
-    for hospital, prefs in hospital_prefs.items():
-        if len(set(prefs)) != n:
-            print(f"Input Error: Hospital {hospital}'s preference list contains duplicates or invalid entries.")
-            return False
-        if set(prefs) != valid_keys:
-            print(f"Input Error: Hospital {hospital}'s preference list is not a permutation of 1..n.")
-            return False
+    for side, prefs in (("Hospital", hospital_prefs), ("Student", student_prefs)):
+        rows = [prefs[i] for i in range(1, n + 1)]
+        bad_row = first_invalid_row(n, rows)
+        if bad_row is None:
+            continue
+        if len(rows[bad_row]) != n or len(set(rows[bad_row])) != n:
+            print(f"Input Error: {side} {bad_row + 1}'s preference list contains duplicates or invalid entries.")
+        else:
+            print(f"Input Error: {side} {bad_row + 1}'s preference list is not a permutation of 1..n.")
+        return False
 
-    for student, prefs in student_prefs.items():
-        if len(set(prefs)) != n:
-            print(f"Input Error: Student {student}'s preference list contains duplicates or invalid entries.")
-            return False
-        if set(prefs) != valid_keys:
-            print(f"Input Error: Student {student}'s preference list is not a permutation of 1..n.")
-            return False
-        
     return True
 
-def generate_input(n: int) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+# Inputs with fewer preference values than this are checked / written in plain Python, numpy's import alone costs more
+VECTORIZE_MIN_VALUES = 1 << 16
+
+def first_invalid_row(n: int, rows: List[List[int]]) -> Optional[int]:
+    """
+    Index of the first row (a list) that isn't a permutation of 1..n, or None.
+    Only integers count (a float or a string is never a valid entry, even if it equals one), so both paths agree.
+    Checked a block of rows at a time by first_invalid_matrix_row(), or with set comparisons for small inputs.
+    """
+    for bad_row, row in enumerate(rows):
+        if len(row) != n:
+            return bad_row
+
+    if len(rows) * n < VECTORIZE_MIN_VALUES:
+        return _first_invalid_row_sets(n, rows)
+
+    import numpy as np
+
+    block = max(1, (1 << 22) // n)
+    for start in range(0, len(rows), block):
+        chunk = rows[start:start + block]
+        # Let NumPy infer the dtype, anything but integers (floats, strings, ints too big for int64) isn't a plain matrix
+        values = np.array(chunk)
+        if values.dtype.kind not in "iub" or values.shape != (len(chunk), n):
+            bad_row = _first_invalid_row_sets(n, chunk)
+        else:
+            bad_row = first_invalid_matrix_row(n, values)
+        if bad_row is not None:
+            return start + bad_row
+
+    return None
+
+def _first_invalid_row_sets(n: int, rows: List[List[int]]) -> Optional[int]:
+    """
+    first_invalid_row() with set comparisons and a type check, rows already have length n.
+    The types of a row are collected at C level, only a row holding something other than int checks each type against Integral.
+    """
+    from numbers import Integral
+    valid_keys = set(range(1, n + 1))
+    for bad_row, row in enumerate(rows):
+        if set(row) != valid_keys:
+            return bad_row
+        types = set(map(type, row))
+        if not types <= {int} and not all(issubclass(kind, Integral) for kind in types):
+            return bad_row
+    return None
+
+def first_invalid_matrix_row(n: int, matrix) -> Optional[int]:
+    """
+    Index of the first row of a NumPy matrix with n columns that isn't a permutation of 1..n, or None.
+    Vectorized, a block of rows at a time: each row's values are shifted into their own range of n bins and a single
+    bincount shows every missing value (n values in range with none missing means no duplicates).
+    """
+    import numpy as np
+
+    # Blocks of roughly 4M values keep the temporaries small
+    block = max(1, (1 << 22) // n)
+    for start in range(0, matrix.shape[0], block):
+        values = matrix[start:start + block]
+        rows = values.shape[0]
+        out_of_range = ((values < 1) | (values > n)).any(axis=1)
+        if out_of_range.any():
+            return start + int(np.flatnonzero(out_of_range)[0])
+        counts = np.bincount((values - 1 + np.arange(0, rows * n, n)[:, None]).ravel(), minlength=rows * n)
+        missing = (counts.reshape(rows, n) == 0).any(axis=1)
+        if missing.any():
+            return start + int(np.flatnonzero(missing)[0])
+
+    return None
+
+def rank_table(n: int, prefs: Dict[int, List[int]]) -> List[List[int]]:
+    """
+    Takes in n and a dict of preference lists (hospital_prefs or student_prefs format).
+    Returns a list where rank[i][j] is the position of j in i's preference list (index 0 of both levels unused).
+    """
+    rank = [None] * (n + 1)
+    for i in range(1, n + 1):
+        row = [0] * (n + 1)
+        for position, j in enumerate(prefs[i]):
+            row[j] = position
+        rank[i] = row
+    return rank
+
+def generate_input(n: int, seed: Optional[int] = None, family: str = "uniform") -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
     """ (sara)
-    Takes in n, the number of hospitals / students.
+    Takes in n, the number of hospitals / students, and an optional seed to make the output reproducible.
     Generates and returns random hospital_prefs and student_prefs matching gale_shapley() input.
+    family picks structured preferences instead of uniform ones, see preference_arrays.INSTANCE_FAMILIES.
     hospital_prefs is a list of n lists, each containing a permutation of 1...n representing hospital i's preferences.
     student_prefs is the same format, but for students' preferences of hospitals.
+    The lists come from the batched NumPy generators, so the same seed gives the same instance as generate_input_file().
     Returns n, hospital_prefs, student_prefs packed in a tuple.
     """
+    from preference_arrays import generate_family_arrays
+    n, hospital_matrix, student_matrix = generate_family_arrays(n, family, seed)
+    if n < 1:
+        return -1, None, None
 
-    # Populate a list of n hospitals/students.
-    ogList = []
-    for num in range(1, n + 1):
-        ogList.append(num)
+    hospitalDict = dict(enumerate(hospital_matrix.tolist(), start=1))
+    studentDict = dict(enumerate(student_matrix.tolist(), start=1))
+    resultTuple = (n, hospitalDict, studentDict)
 
-    hospitalDict = {}
-    studentDict = {}
+    return resultTuple
 
-    # Loop through each hospital/student and add them and their preference list to their respective dict.
-    for num in range(1, n + 1):
-        # Shuffle ogList to get randomized preference lists for hospitals/students.
-        random.shuffle(ogList)
-        hospitalDict[num] = ogList.copy()
+def generate_input_file(n: int, seed: Optional[int] = None, fmt: str = "text", family: str = "uniform") -> str:
+    """
+    Shortcut function to generate input file for testing.
+    Uses the batched NumPy generators and bulk writers, creates "data/n.in" (or "data/n.gsb" with fmt="binary").
+    """
+    from preference_arrays import generate_family_arrays, pack_input_binary, pack_input_text
+    n, hospital_prefs, student_prefs = generate_family_arrays(n, family, seed)
+    if n < 1:
+        return ""
+    if fmt == "binary":
+        return pack_input_binary(n, hospital_prefs, student_prefs, f"data/{n}.gsb")
+    return pack_input_text(n, hospital_prefs, student_prefs, f"data/{n}.in")
 
-        random.shuffle(ogList)
-        studentDict[num] = ogList.copy()
+SPARSE_BINARY_MAGIC = b"GSS1"
+SPARSE_BINARY_HEADER = struct.Struct("<4sI")
+HR_BINARY_MAGIC = b"GSH1"
+HR_BINARY_HEADER = struct.Struct("<4sII")
 
-    resultTuple = (n, hospitalDict, studentDict)
 
-    return resultTuple
+def valid_hr_input(n_hospitals: int, n_students: int, capacities: Dict[int, int], hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> bool:
+    """
+    valid_input() for the hospitals/residents model: capacities and preference lists for hospitals 1..n_hospitals
+    and students 1..n_students, every capacity positive, every list free of duplicates and unknown agents.
+    Lists may be incomplete (and a student's may be empty).
+    """
+    if n_hospitals < 1 or n_students < 1:
+        print("Input Error: n_hospitals and n_students must be at least 1.")
+        return False
+
+    hospital_keys = set(range(1, n_hospitals + 1))
+    student_keys = set(range(1, n_students + 1))
+    if set(capacities.keys()) != hospital_keys or set(hospital_prefs.keys()) != hospital_keys:
+        print("Input Error: Hospital keys must be exactly 1..n_hospitals.")
+        return False
+    if set(student_prefs.keys()) != student_keys:
+        print("Input Error: Student keys must be exactly 1..n_students.")
+        return False
+
+    for hospital, capacity in capacities.items():
+        if capacity < 1:
+            print(f"Input Error: Hospital {hospital}'s capacity must be positive.")
+            return False
+
+    for side, prefs_dict, keys in (("Hospital", hospital_prefs, student_keys), ("Student", student_prefs, hospital_keys)):
+        for agent, prefs in prefs_dict.items():
+            ranked = set(prefs)
+            if len(ranked) != len(prefs) or not ranked <= keys:
+                print(f"Input Error: {side} {agent}'s preference list contains duplicates or invalid entries.")
+                return False
+
+    return True
+
+def generate_hr_input(n_hospitals: int, n_students: int, seed: Optional[int] = None, list_length: Tuple[int, int] = (10, 20), capacity: Tuple[int, int] = (5, 200)) -> Tuple[int, int, Dict[int, int], Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Generates a random hospitals/residents instance shaped like a residency market:
+    every student ranks list_length (inclusive range) random hospitals, every hospital ranks exactly the students
+    who applied to it in random order, and capacities are drawn from the inclusive range capacity.
+    Returns n_hospitals, n_students, capacities, hospital_prefs, student_prefs packed in a tuple.
+    """
+    from random import Random
+    rng = Random(seed)
+    hospitals = list(range(1, n_hospitals + 1))
+
+    capacities = {hospital: rng.randint(*capacity) for hospital in hospitals}
+    student_prefs = {}
+    applicants = {hospital: [] for hospital in hospitals}
+    for student in range(1, n_students + 1):
+        prefs = rng.sample(hospitals, min(n_hospitals, rng.randint(*list_length)))
+        student_prefs[student] = prefs
+        for hospital in prefs:
+            applicants[hospital].append(student)
+
+    for prefs in applicants.values():
+        rng.shuffle(prefs)
+
+    return n_hospitals, n_students, capacities, applicants, student_prefs
+
+def parse_input_hr(input_file: str) -> Tuple[int, int, Optional[Dict[int, int]], Optional[Dict[int, List[int]]], Optional[Dict[int, List[int]]]]:
+    """
+    Parse input from a file in the hospitals/residents input file format, text or binary (told apart by the magic).
+    Returns n_hospitals, n_students, capacities, hospital_prefs, student_prefs (matching hospital_residents() input) packed in a tuple,
+    or -1, -1, None, None, None after printing the error.
+    """
+    failed = (-1, -1, None, None, None)
+    try:
+        f = open(input_file, 'rb', buffering=INPUT_BUFFER_SIZE)
+    except FileNotFoundError:
+        print("Parse_Input Error: input file not found")
+        return failed
+    except OSError as e:
+        print(f"Parse_Input Error opening file: {e}")
+        return failed
+
+    try:
+        with f:
+            if f.peek(len(HR_BINARY_MAGIC))[:len(HR_BINARY_MAGIC)] == HR_BINARY_MAGIC:
+                instance = _read_hr_binary(f)
+            else:
+                instance = _read_hr_text(f)
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return failed
+
+    if not valid_hr_input(*instance):
+        return failed
+    return instance
+
+def _read_hr_text(f) -> Tuple[int, int, Dict[int, int], Dict[int, List[int]], Dict[int, List[int]]]:
+    """ Reads the text hospitals/residents format. Blank lines only count as (empty) student rows, elsewhere they're skipped. """
+    lines = enumerate(f, start=1)
+    header = next(((number, line) for number, line in lines if not line.isspace()), None)
+    if header is None:
+        raise InputFormatError("input file is empty")
+    try:
+        n_hospitals, n_students = map(int, header[1].split())
+    except ValueError:
+        raise InputFormatError("first line must be two integers (n_hospitals n_students)")
+    if n_hospitals <= 0 or n_students <= 0:
+        raise InputFormatError("n_hospitals and n_students must be positive")
+
+    capacities = {}
+    hospital_prefs = {}
+    student_prefs = {}
+    row = 0
+    for number, line in lines:
+        if row == n_hospitals + n_students:
+            if not line.isspace():
+                raise InputFormatError(f"line {number}: expected {n_hospitals + n_students} preference rows, got more")
+            continue
+        if row < n_hospitals and line.isspace():
+            continue
+        try:
+            values = list(map(int, line.split()))
+        except ValueError:
+            raise InputFormatError(f"line {number}: preferences must contain integers only")
+
+        if row < n_hospitals:
+            capacities[row + 1] = values[0]
+            hospital_prefs[row + 1] = values[1:]
+        else:
+            student_prefs[row - n_hospitals + 1] = values
+        row += 1
+
+    if row != n_hospitals + n_students:
+        raise InputFormatError(f"expected {n_hospitals + n_students} preference rows, got {row}")
+    return n_hospitals, n_students, capacities, hospital_prefs, student_prefs
+
+def _read_hr_binary(f) -> Tuple[int, int, Dict[int, int], Dict[int, List[int]], Dict[int, List[int]]]:
+    """ Reads the binary hospitals/residents format. """
+    header = f.read(HR_BINARY_HEADER.size)
+    if len(header) != HR_BINARY_HEADER.size:
+        raise InputFormatError("input file is too short for a hospitals/residents binary header")
+    _, n_hospitals, n_students = HR_BINARY_HEADER.unpack(header)
+    if n_hospitals <= 0 or n_students <= 0:
+        raise InputFormatError("n_hospitals and n_students must be positive")
+
+    def read_values(count: int) -> array:
+        values = array("i")
+        try:
+            values.fromfile(f, count)
+        except EOFError:
+            raise InputFormatError(f"input file is truncated, expected {count} more values, got {len(values)}")
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    capacities = read_values(n_hospitals).tolist()
+    lengths = read_values(n_hospitals + n_students).tolist()
+    if min(lengths) < 0:
+        raise InputFormatError("preference list lengths must not be negative")
+    values = read_values(sum(lengths)).tolist()
+    if f.read(1):
+        raise InputFormatError(f"expected {len(values)} preferences, got more")
+
+    prefs = []
+    offset = 0
+    for length in lengths:
+        prefs.append(values[offset:offset + length])
+        offset += length
+
+    return (n_hospitals, n_students, {h + 1: capacity for h, capacity in enumerate(capacities)},
+            {h + 1: prefs[h] for h in range(n_hospitals)}, {s + 1: prefs[n_hospitals + s] for s in range(n_students)})
+
+def pack_input_hr(n_hospitals: int, n_students: int, capacities: Dict[int, int], hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], fmt: str = "text", filename=None) -> str:
+    """
+    Writes a hospitals/residents instance in the text format, or the binary format with fmt="binary".
+    Creates "data/hr_{n_hospitals}x{n_students}.in" (or ".gsb"), or writes to filename instead if given
+    (a file name, "-" or a file object, see output_file()).
+    Returns the generated file name.
+    """
+    if not valid_hr_input(n_hospitals, n_students, capacities, hospital_prefs, student_prefs):
+        return ""
+
+    hospital_rows = [hospital_prefs[h] for h in range(1, n_hospitals + 1)]
+    student_rows = [student_prefs[s] for s in range(1, n_students + 1)]
+
+    if fmt == "binary":
+        with output_file(filename, f"data/hr_{n_hospitals}x{n_students}.gsb") as (f, name):
+            f.write(HR_BINARY_HEADER.pack(HR_BINARY_MAGIC, n_hospitals, n_students))
+            sections = [[capacities[h] for h in range(1, n_hospitals + 1)], [len(prefs) for prefs in hospital_rows + student_rows]]
+            sections += hospital_rows + student_rows
+            values = array("i")
+            for section in sections:
+                values.extend(section)
+            if sys.byteorder == "big":
+                values.byteswap()
+            f.write(values.tobytes())
+        return name
+
+    with output_file(filename, f"data/hr_{n_hospitals}x{n_students}.in") as (f, name):
+        f.write(f"{n_hospitals} {n_students}\n".encode())
+        rows = [[capacities[hospital]] + prefs for hospital, prefs in enumerate(hospital_rows, start=1)]
+        for chunk in format_lines(rows + student_rows):
+            f.write(chunk)
+    return name
+
+# Read buffer for the streaming parsers, large enough that multi-GB inputs are read in few syscalls
+INPUT_BUFFER_SIZE = 1 << 24
+
+
+class InputFormatError(ValueError):
+    """ Raised while streaming a G-S input file, reported by the parsers as "Parse_Input Error: (message)". """
+
+
+# Write buffer for the bulk writers, output is formatted a block of rows at a time and written in few syscalls
+OUTPUT_BUFFER_SIZE = 1 << 24
+
+
+class _TextSink:
+    """ Lets the bulk writers write bytes to a text-only stream (e.g. io.StringIO). """
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, data: bytes) -> int:
+        return self.f.write(data.decode())
+
+
+@contextmanager
+def output_file(target, default: str):
+    """
+    Opens where a writer was asked to write, as a binary file object. target can be:
+        None            ] the writer's default file name (default)
+        a file name     ] created / truncated, "-" means stdout
+        a file object   ] text or binary, e.g. sys.stdout or an open pipe, written to as is and left open
+    Yields (f, name), name being the file name the writer returns ("-" for stdout, the object's name if it has one).
+    """
+    if target is None:
+        target = default
+    if target == "-":
+        target = sys.stdout
+
+    if isinstance(target, str):
+        with open(target, "wb", buffering=OUTPUT_BUFFER_SIZE) as f:
+            yield f, target
+        return
+
+    name = "-" if target is sys.stdout else str(getattr(target, "name", ""))
+    if isinstance(target, io.TextIOBase):
+        # Flush text already written so the bytes land after it
+        target.flush()
+        buffer = getattr(target, "buffer", None)
+        if buffer is None:
+            yield _TextSink(target), name
+            return
+        yield buffer, name
+        buffer.flush()
+    else:
+        yield target, name
+
+
+def format_lines(rows: Iterator[List[int]]) -> Iterator[bytes]:
+    """ Formats rows of ints (any lengths) as lines of space separated numbers, joined a block of rows at a time. """
+    block = []
+    size = 0
+    for row in rows:
+        block.append(" ".join(map(str, row)))
+        size += len(row)
+        if size >= 1 << 20:
+            block.append("")
+            yield "\n".join(block).encode()
+            block = []
+            size = 0
+    if block:
+        block.append("")
+        yield "\n".join(block).encode()
+
+
+def input_rows(f) -> Iterator:
+    """
+    Streams an open (binary) G-S input file one line at a time, skipping blank lines.
+    Yields n first, then (line number, line) for each of the 2n preference rows.
+    Raises InputFormatError if the header is invalid or the file doesn't have exactly 1 + 2n non-blank lines.
+    """
+    lines = ((number, line) for number, line in enumerate(f, start=1) if not line.isspace())
+
+    first = next(lines, None)
+    if first is None:
+        raise InputFormatError("input file is empty")
+    try:
+        n = int(first[1])
+    except ValueError:
+        raise InputFormatError("first line must be an integer (n)")
+    if n <= 0:
+        raise InputFormatError("n must be positive")
+    yield n
+
+    expected_lines = 1 + 2 * n
+    count = 1
+    for number, line in lines:
+        count += 1
+        if count > expected_lines:
+            count += sum(1 for _ in lines)
+            break
+        yield number, line
+
+    if count != expected_lines:
+        raise InputFormatError(f"expected {expected_lines} lines, got {count}")
+
+
+def row_owner(n: int, row: int) -> str:
+    """ Names the agent a preference row (0-based, hospitals first) belongs to, for error messages. """
+    return f"Hospital {row + 1}" if row < n else f"Student {row - n + 1}"
 
-def generate_input_file(n: int) -> str:
-    """ Shortcut function to generate input file for testing. """
-    n, hospital_prefs, student_prefs = generate_input(n)
-    return pack_input(n, hospital_prefs, student_prefs)
 
 def parse_input(input_file: str) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
     """ (finn)
     Parse input from a file in the G-S input file format.
+    The file is streamed through a large read buffer and all rows are validated in one vectorized pass,
+    errors point at the offending line.
     Returns n, hospital_prefs, student_prefs (matching gale_shapley() input) packed in a tuple.
     """
     # Attempt to Open File
     try:
-        with open(input_file, 'r') as f:
-            lines = [line.strip() for line in f if line.strip()]
+        f = open(input_file, 'rb', buffering=INPUT_BUFFER_SIZE)
     except FileNotFoundError:
         print("Parse_Input Error: input file not found")
         return -1, None, None
@@ -117,80 +548,165 @@ def parse_input(input_file: str) -> Tuple[int, Dict[int, List[int]], Dict[int, L
         print(f"Parse_Input Error opening file: {e}")
         return -1, None, None
 
-    if not lines:
-        print("Parse_Input Error: input file is empty")
-        return -1, None, None
-
-    # Parse n
     try:
-        n = int(lines[0])
-    except ValueError:
-        print("Parse_Input Error: first line must be an integer (n)")
-        return -1, None, None
-    if n <= 0:
-        print("Parse_Input Error: n must be positive")
+        with f:
+            return _read_input_text(f)
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
         return -1, None, None
 
+def _read_input_text(f) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """ Reads a G-S input file from an open binary file object, raises InputFormatError. """
+    rows = input_rows(f)
+    n = next(rows)
 
-    # Check line amount
-    expected_lines = 1 + 2 * n
-    if len(lines) != expected_lines:
-        print(f"Parse_Input Error: expected {expected_lines} lines, got {len(lines)}")
-        return -1, None, None
+    # Parse preferences row by row, then validate them all at once
+    line_numbers = []
+    preferences = []
+    for number, line in rows:
+        try:
+            preferences.append(list(map(int, line.split())))
+        except ValueError:
+            raise InputFormatError(f"line {number}: preferences must contain integers only")
+        line_numbers.append(number)
 
-    # Parse preferences
-    try:
-        hospital_lists = [list(map(int, lines[i].split())) for i in range(1, n + 1)]
-        student_lists  = [list(map(int, lines[i].split())) for i in range(n + 1, 2 * n + 1)]
-    except ValueError:
-        print("Parse_Input Error: preferences must contain integers only")
+    bad_row = first_invalid_row(n, preferences)
+    if bad_row is not None:
+        raise InputFormatError(f"line {line_numbers[bad_row]}: {row_owner(n, bad_row)}'s preference list is not a permutation of 1..n")
+
+    # Return successfully
+    return n, dict(enumerate(preferences[:n], start=1)), dict(enumerate(preferences[n:], start=1))
+
+def parse_input_data(data: bytes, fmt: Optional[str] = None) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Parses a whole G-S input already in memory (e.g. all of stdin, read in one call) with the same parsers as the files.
+    fmt is "text" or "binary", or None to tell them apart by the binary magic.
+    Returns n, hospital_prefs, student_prefs, or -1, None, None after printing the error.
+    """
+    if fmt is None:
+        fmt = "binary" if data[:len(BINARY_MAGIC)] == BINARY_MAGIC else "text"
+    if fmt not in ("text", "binary"):
+        print(f"Parse_Input Error: unknown format '{fmt}', expected text or binary")
         return -1, None, None
-    
-    # Convert preference lists to dicts
-    hospital_prefs = {i + 1: hospital_lists[i] for i in range(n)}
-    student_prefs  = {i + 1: student_lists[i]  for i in range(n)}
 
-    # Validate preference lists
-    if not valid_input(n, hospital_prefs, student_prefs):
+    f = io.BytesIO(data)
+    try:
+        if fmt == "binary":
+            return _read_input_binary(f)
+        return _read_input_text(f)
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
         return -1, None, None
 
-    # Return successfully
-    return n, hospital_prefs, student_prefs
+def read_instance(source: str = "-", fmt: Optional[str] = None) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Loads a G-S instance for the command line tools without prompting: source is a file name, or "-" to read
+    all of stdin in one bulk read. fmt is "text" or "binary", or None to tell them apart by the binary magic.
+    Returns n, hospital_prefs, student_prefs, or -1, None, None after printing the error.
+    """
+    if source == "-":
+        return parse_input_data(sys.stdin.buffer.read(), fmt)
 
-def pack_input(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> str:
+    if fmt is None:
+        try:
+            with open(source, "rb") as f:
+                fmt = "binary" if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC else "text"
+        except OSError:
+            fmt = "text" # parse_input() reports it
+    if fmt == "binary":
+        return parse_input_binary(source)
+    return parse_input(source)
+
+def pack_input(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], fmt: str = "text", filename=None) -> str:
     """ (sara)
     Creates a .in file containing input in the G-S input file format.
-    Creates a file "data/n.out" in the G-S input file format (where n is the number of hospitals / students).
+    Creates a file "data/n.in" in the G-S input file format (where n is the number of hospitals / students).
+    With fmt="binary", creates "data/n.gsb" in the G-S binary input file format instead.
+    filename writes somewhere else instead: a file name, "-" for stdout or an open file object (see output_file()).
     Returns the generated file name.
     """
 
     if not valid_input(n, hospital_prefs, student_prefs):
         return ""
 
-    # Create .in file.
-    filename = f"data/{n}.in"
-
-    # Write hospital_prefs and student_prefs to file.
-    with open(filename, "w") as f:
-        f.write(f"{n}\n")
-
-        # Write each hospital's preference list to file.
-        for hospital in range(1, n + 1):
-            # Get's hospital's preference list.
-            prefs = hospital_prefs[hospital]
-
-            # Converts ints to strings and joins them with spaces.
-            f.write(" ".join(map(str, prefs)) + "\n")
-
-        # Write each student's preference list to file.
-        for student in range(1, n + 1):
-            # Get's hospital's preference list.
-            prefs = student_prefs[student]
+    from itertools import chain
+    target = filename or (f"data/{n}.gsb" if fmt == "binary" else f"data/{n}.in")
+    rows = [prefs[i] for prefs in (hospital_prefs, student_prefs) for i in range(1, n + 1)]
+
+    # Small instances are written in plain Python, numpy's import alone costs more
+    if 2 * n * n < VECTORIZE_MIN_VALUES:
+        with output_file(target, target) as (f, name):
+            if fmt == "binary":
+                values = array("i", chain.from_iterable(rows))
+                if sys.byteorder == "big":
+                    values.byteswap()
+                f.write(BINARY_HEADER.pack(BINARY_MAGIC, n))
+                f.write(values.tobytes())
+            else:
+                f.write((f"{n}\n" + "".join(" ".join(map(str, row)) + "\n" for row in rows)).encode())
+        return name
+
+    # Both sides as one 2n x n matrix, written by the bulk writers
+    import numpy as np
+    from preference_arrays import pack_input_binary, pack_input_text
+    matrix = np.fromiter(chain.from_iterable(rows), dtype=np.int32, count=2 * n * n).reshape(2 * n, n)
+
+    if fmt == "binary":
+        return pack_input_binary(n, matrix[:n], matrix[n:], target)
+    return pack_input_text(n, matrix[:n], matrix[n:], target)
+
+def read_binary_header(f) -> int:
+    """ Reads the header of an open .gsb file, returns n. Raises InputFormatError if the header is invalid. """
+    header = f.read(BINARY_HEADER.size)
+    if not header:
+        raise InputFormatError("input file is empty")
+    if len(header) != BINARY_HEADER.size:
+        raise InputFormatError("input file is too short for a G-S binary header")
+    magic, n = BINARY_HEADER.unpack(header)
+    if magic != BINARY_MAGIC:
+        raise InputFormatError("not a G-S binary input file")
+    if n <= 0:
+        raise InputFormatError("n must be positive")
+    return n
 
-            # Converts numbers to strings and joins them with spaces.
-            f.write(" ".join(map(str, prefs)) + "\n")
+def parse_input_binary(input_file: str) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Parse input from a file in the G-S binary input file format.
+    Returns n, hospital_prefs, student_prefs (matching gale_shapley() input) packed in a tuple.
+    """
+    try:
+        with open(input_file, "rb") as f:
+            return _read_input_binary(f)
+    except FileNotFoundError:
+        print("Parse_Input Error: input file not found")
+        return -1, None, None
+    except OSError as e:
+        print(f"Parse_Input Error opening file: {e}")
+        return -1, None, None
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return -1, None, None
 
-    return filename
+def _read_input_binary(f) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """ Reads a G-S binary input file from an open binary file object, raises InputFormatError. """
+    n = read_binary_header(f)
+    data = f.read(4 * 2 * n * n + 1)
+    if len(data) != 4 * 2 * n * n:
+        raise InputFormatError(f"expected {2 * n * n} preferences, got {'more' if len(data) > 4 * 2 * n * n else len(data) // 4}")
+    values = array("i", data)
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    rows = [values[i * n:(i + 1) * n].tolist() for i in range(2 * n)]
+    if len(values) < VECTORIZE_MIN_VALUES:
+        bad_row = first_invalid_row(n, rows)
+    else:
+        import numpy as np
+        bad_row = first_invalid_matrix_row(n, np.frombuffer(values, dtype=np.int32).reshape(2 * n, n))
+    if bad_row is not None:
+        raise InputFormatError(f"{row_owner(n, bad_row)}'s preference list is not a permutation of 1..n")
+
+    return n, dict(enumerate(rows[:n], start=1)), dict(enumerate(rows[n:], start=1))
 
 def parse_output(filename: str) -> Dict[int, int]:
     """ (sara)
@@ -220,44 +736,104 @@ def parse_output(filename: str) -> Dict[int, int]:
 
     return pairs
 
-def pack_output(output: Dict[int, int]) -> str:
+def pack_output(output: Dict[int, int], filename=None) -> str:
     """ (finn)
     Takes in input matching gale_shapley() output.
-    Creates a file "data/n.out" in the G-S output file format (where n is the number of hospitals / students).
+    Creates a file "data/n.out" in the G-S output file format (where n is the number of hospitals / students),
+    or writes to filename instead if given: a file name, "-" for stdout or an open file object (see output_file()).
     Returns the generated file name.
     """
-    # Create .out file
+    # Every hospital must be paired, written in hospital order
     n = len(output)
-    filename = f'data/{n}.out'
-    
-    # Write pairs to file
     try:
-        with open(filename, 'w') as f:
-            for hospital in range(1, n + 1):
-                student = output[hospital]  # may KeyError
-                f.write(f"{hospital} {student}\n")
+        ordered = {hospital: output[hospital] for hospital in range(1, n + 1)}
     except KeyError as e:
         print(f"Pack_Output Error: missing hospital key {e}")
         return ""
-    
-    return filename
+
+    return write_pairs(ordered, filename or f'data/{n}.out')
+
+
+# Largest hospital / student id, the binary formats store them as int32
+MAX_AGENT_ID = (1 << 31) - 1
+
+def write_pairs(pairs: Dict[int, int], filename) -> str:
+    """
+    Writes [hospital, student] pairs in dict order in the G-S output file format (no check that every hospital is there),
+    to a file name, "-" for stdout or an open file object. The pairs are formatted in bulk, returns the file name.
+    Every hospital and student must be an integer in 1..MAX_AGENT_ID, otherwise nothing is written and "" is returned.
+    """
+    # format_rows() would silently wrap a negative or oversized id around, so both paths check them first
+    if pairs:
+        from numbers import Integral
+        types = set(map(type, pairs)) | set(map(type, pairs.values()))
+        if (not all(issubclass(kind, Integral) for kind in types)
+                or min(min(pairs), min(pairs.values())) < 1 or max(max(pairs), max(pairs.values())) > MAX_AGENT_ID):
+            print(f"Pack_Output Error: hospitals and students must be integers in 1..{MAX_AGENT_ID}")
+            return ""
+
+    if len(pairs) < VECTORIZE_MIN_VALUES:
+        with output_file(filename, filename) as (f, name):
+            f.write("".join(f"{hospital} {student}\n" for hospital, student in pairs.items()).encode())
+        return name
+
+    import numpy as np
+    from preference_arrays import format_rows
+    matrix = np.empty((len(pairs), 2), dtype=np.int64)
+    matrix[:, 0] = np.fromiter(pairs.keys(), dtype=np.int64, count=len(pairs))
+    matrix[:, 1] = np.fromiter(pairs.values(), dtype=np.int64, count=len(pairs))
+
+    with output_file(filename, filename) as (f, name):
+        for chunk in format_rows(matrix):
+            f.write(chunk)
+    return name
+
+
+def parse_output_hr(filename: str) -> Dict[int, List[int]]:
+    """
+    Parse output from a file in the hospitals/residents output file format.
+    Returns output matching hospital_residents() output (only hospitals that appear in the file).
+    """
+    assignment = {}
+    with open(filename, "r") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 2:
+                raise ValueError(f"Invalid output line: '{line.strip()}'")
+            hospital, student = map(int, parts)
+            assignment.setdefault(hospital, []).append(student)
+    return assignment
+
+def pack_output_hr(assignment: Dict[int, List[int]], filename) -> str:
+    """
+    Takes in input matching hospital_residents() output and writes it in the hospitals/residents output file format
+    to filename: a file name, "-" for stdout or an open file object (see output_file()). Returns the file name.
+    """
+    pairs = ([hospital, student] for hospital in sorted(assignment) for student in assignment[hospital])
+    with output_file(filename, filename) as (f, name):
+        for chunk in format_lines(pairs):
+            f.write(chunk)
+    return name
 
 
 def read_input():
     # Read n
+    # Prompts go to stderr so they never mix into the pairings on stdout
     while True:
-        print("Enter an integer >1 for n.")
+        print("Enter an integer >0 for n.", file=sys.stderr)
         try:
             n = int(input().strip())
-            if n > 1:
+            if n > 0:
                 break
         except ValueError:
             pass
-        print("Error: Invalid input.")
+        print("Error: Invalid input.", file=sys.stderr)
 
     # Read hospital preferences
     hospital_prefs = {}
-    print(f"Enter {n} lists of some permutation of 1..{n} to represent hospital preferences.")
+    print(f"Enter {n} lists of some permutation of 1..{n} to represent hospital preferences.", file=sys.stderr)
     for i in range(1, n + 1):
         while True:
             try:
@@ -267,11 +843,11 @@ def read_input():
                 hospital_prefs[i] = prefs
                 break
             except ValueError:
-                print("Error: Invalid input.")
+                print("Error: Invalid input.", file=sys.stderr)
 
     # Read student preferences
     student_prefs = {}
-    print(f"Enter {n} lists of some permutation of 1..{n} to represent student preferences.")
+    print(f"Enter {n} lists of some permutation of 1..{n} to represent student preferences.", file=sys.stderr)
     for i in range(1, n + 1):
         while True:
             try:
@@ -281,13 +857,13 @@ def read_input():
                 student_prefs[i] = prefs
                 break
             except ValueError:
-                print("Error: Invalid input.")
+                print("Error: Invalid input.", file=sys.stderr)
 
     return n, hospital_prefs, student_prefs
     
 
 def read_pairs(n: int) -> Dict[int, int]:
-    print(f"Enter {n} [hospital, student] pairs, consisting of two ints 1..{n} separated by a space:")
+    print(f"Enter {n} [hospital, student] pairs, consisting of two ints 1..{n} separated by a space:", file=sys.stderr)
 
     pairs = {}
     while len(pairs) < n:
@@ -295,19 +871,28 @@ def read_pairs(n: int) -> Dict[int, int]:
         parts = line.split()
 
         if len(parts) != 2:
-            print("Error: Invalid pairings.")
+            print("Error: Invalid pairings.", file=sys.stderr)
             continue
 
         try:
             h, s = int(parts[0]), int(parts[1])
         except ValueError:
-            print("Error: Invalid pairings.")
+            print("Error: Invalid pairings.", file=sys.stderr)
             continue
 
         if h in pairs:
-            print("Error: Invalid pairings.")
+            print("Error: Invalid pairings.", file=sys.stderr)
             continue
 
         pairs[h] = s
 
     return pairs
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """ Linearly interpolated q-th percentile (0..100) of samples, shared by the benchmark harness and the service's stats. """
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
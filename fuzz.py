@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from itertools import islice
+from random import Random
+from typing import Dict, List, Iterator, Optional, Tuple
+
+from data_helpers import generate_input, generate_hr_input
+from gale_shapley import gale_shapley, extreme_matchings, ResumableMatcher, ENGINES
+from verifier import verifier, sparse_verifier, hr_verifier, VERIFIER_MODES
+
+"""
+Differential fuzzing of the matcher engines and verifier modes against the reference implementations.
+Every seeded instance is solved by every engine in ENGINES (and both engines of extreme_matchings()), and all of
+them must return the reference matching: the classic engine's up to CLASSIC_MAX_N, the rank engine's above.
+The matching and perturbed copies of it are then checked by every verifier mode in VERIFIER_MODES, and every mode
+must print the same verdict and return the same result as the reference mode (classic, then prefix above CLASSIC_MAX_N):
+    "stable"            ] the reference matching itself, VALID STABLE
+    "swapped pair"      ] two hospitals trade students, still valid, usually UNSTABLE
+    "duplicated student"] a hospital gets another hospital's student, INVALID
+    "missing hospital"  ] a hospital is left out, INVALID
+The same instance then goes through the stateful and incomplete-list code, selected with --checks (CHECKS):
+    incremental ] IncrementalMatcher after rounds of random edits, must equal a fresh gale_shapley() on the edited input
+    resumable   ] ResumableMatcher killed after every checkpoint and restored from it, must end with the uninterrupted
+                  run's matching and counters
+    sparse      ] gale_shapley_sparse() on incomplete lists, stable per sparse_verifier() and hr_verifier() (capacity 1),
+                  hospital-optimal, and matching the same agents as the student-optimal matching (rural hospitals theorem)
+    hr          ] hospital_residents() against gale_shapley_sparse() on the instance with every hospital cloned into
+                  one slot per place, and hr_verifier() against sparse_verifier() on the clone
+    lattice     ] RotationPoset's matchings, egalitarian and minimum regret matchings against its own enumeration
+Up to BRUTE_FORCE_MAX_N, the sparse and lattice results are also checked against every stable matching found by brute force.
+"""
+
+
+# The classic implementations are O(n^3), past this n the rank engine and prefix verifier are the reference
+CLASSIC_MAX_N = 128
+
+# Brute force tries every matching, up to 1546 of them at n = 5
+BRUTE_FORCE_MAX_N = 5
+
+# The lattice check enumerates at most this many stable matchings, and only compares optima when it saw them all
+LATTICE_MAX_MATCHINGS = 200
+
+CHECKS = ("incremental", "resumable", "sparse", "hr", "lattice")
+
+# Sizes and families cycled through by default, small sizes catch the edge cases, larger ones the longer proposal chains
+DEFAULT_SIZES = [1, 2, 3, 4, 5, 8, 13, 21, 34, 64, 100, 200]
+DEFAULT_FAMILIES = ["uniform", "master", "noisy", "tiered", "adversarial"]
+
+PERTURBATIONS = ("stable", "swapped pair", "duplicated student", "missing hospital")
+
+
+def case(index: int, seed: int, sizes: List[int], families: List[str]) -> Tuple[int, str, int]:
+    """ The (n, family, seed) of the index-th instance, the same for every run with the same seed. """
+    return sizes[index % len(sizes)], families[(index // len(sizes)) % len(families)], seed + index
+
+
+def perturb(pairs: Dict[int, int], kind: str, rng: Random) -> Dict[int, int]:
+    """ A copy of pairs with one perturbation from PERTURBATIONS applied (needs at least 2 pairs except for "stable"). """
+    pairs = dict(pairs)
+    if kind == "stable":
+        return pairs
+    first, second = rng.sample(sorted(pairs), 2)
+    if kind == "swapped pair":
+        pairs[first], pairs[second] = pairs[second], pairs[first]
+    elif kind == "duplicated student":
+        pairs[first] = pairs[second]
+    elif kind == "missing hospital":
+        del pairs[first]
+    return pairs
+
+
+def captured(function, *args, **kwargs) -> Tuple[bool, str]:
+    """ A verifier's result and printed verdict. """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = function(*args, **kwargs)
+    return result, log.getvalue().strip()
+
+
+def verdict(n: int, hospital_prefs, student_prefs, pairs: Dict[int, int], mode: str) -> Tuple[bool, str]:
+    """ verifier()'s result and printed verdict for one mode. """
+    return captured(verifier, n, hospital_prefs, student_prefs, pairs, mode=mode)
+
+
+def brute_force_stable(n_hospitals: int, n_students: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> List[Dict[int, int]]:
+    """
+    Every stable matching of a one-to-one instance with (possibly incomplete) lists, as [hospital, student] dicts
+    sorted by hospital, found by trying every matching of mutually ranked pairs. Exponential, small instances only.
+    """
+    hospital_rank = {h: {s: position for position, s in enumerate(hospital_prefs.get(h, []))} for h in range(1, n_hospitals + 1)}
+    student_rank = {s: {h: position for position, h in enumerate(student_prefs.get(s, []))} for s in range(1, n_students + 1)}
+    acceptable = {h: [s for s in hospital_prefs.get(h, []) if h in student_rank[s]] for h in range(1, n_hospitals + 1)}
+
+    def stable(partner: Dict[int, int]) -> bool:
+        held = {s: h for h, s in partner.items()}
+        for h, students in acceptable.items():
+            for s in students:
+                if partner.get(h) == s:
+                    continue
+                if (h not in partner or hospital_rank[h][s] < hospital_rank[h][partner[h]]) \
+                        and (s not in held or student_rank[s][h] < student_rank[s][held[s]]):
+                    return False
+        return True
+
+    found = []
+    partner = {}
+
+    def extend(h: int):
+        if h > n_hospitals:
+            if stable(partner):
+                found.append(dict(sorted(partner.items())))
+            return
+        extend(h + 1)
+        taken = set(partner.values())
+        for s in acceptable[h]:
+            if s not in taken:
+                partner[h] = s
+                extend(h + 1)
+                del partner[h]
+
+    extend(1)
+    return found
+
+
+def cost(n: int, hospital_prefs, student_prefs, pairs: Dict[int, int]) -> Tuple[int, int]:
+    """ (sum, max) of the ranks both sides give their partners, the egalitarian cost and the regret of a matching. """
+    ranks = []
+    for hospital, student in pairs.items():
+        ranks += [hospital_prefs[hospital].index(student), student_prefs[student].index(hospital)]
+    return sum(ranks), max(ranks, default=0)
+
+
+def check_incremental(name: str, n: int, hospital_prefs, student_prefs, reference: Dict[int, int], rng: Random) -> List[str]:
+    """ IncrementalMatcher after a few rounds of edits (adjacent swaps and full reshuffles) against fresh solves. """
+    from incremental import IncrementalMatcher
+
+    failures = []
+    matcher = IncrementalMatcher(n, hospital_prefs, student_prefs)
+    if matcher.pairings != reference:
+        failures.append(f"{name}: IncrementalMatcher disagrees with gale_shapley() before any edit")
+
+    hospital_prefs, student_prefs = dict(hospital_prefs), dict(student_prefs)
+    for edit_round in range(3):
+        edits = ({}, {})
+        for prefs, side_edits in zip((hospital_prefs, student_prefs), edits):
+            for agent in rng.sample(range(1, n + 1), rng.randint(0, min(n, 3))):
+                row = list(prefs[agent])
+                if rng.random() < 0.5 and n > 1:
+                    i = rng.randrange(n - 1)
+                    row[i], row[i + 1] = row[i + 1], row[i]
+                else:
+                    rng.shuffle(row)
+                side_edits[agent] = prefs[agent] = row
+
+        pairs = matcher.update(hospital_edits=edits[0], student_edits=edits[1])
+        expected = gale_shapley(n, hospital_prefs, student_prefs)
+        if pairs != expected:
+            failures.append(f"{name}: IncrementalMatcher disagrees with gale_shapley() after edit round {edit_round + 1}")
+            break
+    return failures
+
+
+class _Killed(Exception):
+    pass
+
+
+class _KilledMatcher(ResumableMatcher):
+    """ ResumableMatcher that dies right after writing a mid-run checkpoint, like a run killed there. """
+
+    def save(self, filename: str):
+        super().save(filename)
+        if not self.done:
+            raise _Killed
+
+
+def check_resumable(name: str, n: int, hospital_prefs, student_prefs, rng: Random) -> List[str]:
+    """ ResumableMatcher killed after every checkpoint and restored from it, against one uninterrupted run. """
+    from preference_arrays import to_arrays
+
+    arrays = to_arrays(n, hospital_prefs, student_prefs)
+    uninterrupted = ResumableMatcher(arrays)
+    expected = uninterrupted.run()
+
+    every = rng.randint(1, n)
+    restores = 0
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = os.path.join(directory, "run.gsk")
+        matcher = _KilledMatcher(arrays)
+        while True:
+            try:
+                matches = matcher.run(checkpoint=checkpoint, every=every)
+                break
+            except _Killed:
+                matcher = _KilledMatcher.restore(arrays, checkpoint)
+                restores += 1
+            if restores > n * n:
+                return [f"{name}: ResumableMatcher restored {restores} times without finishing (every={every})"]
+
+    if (matches != expected).any():
+        return [f"{name}: ResumableMatcher disagrees with an uninterrupted run after {restores} restores (every={every})"]
+    if (matcher.proposals, matcher.pair_breaks) != (uninterrupted.proposals, uninterrupted.pair_breaks):
+        return [f"{name}: ResumableMatcher counters disagree with an uninterrupted run after {restores} restores (every={every})"]
+    return []
+
+
+def compare_verdicts(name: str, kind: str, expected: Tuple[bool, str], got: Tuple[bool, str], expected_name: str, got_name: str) -> List[str]:
+    """
+    Two verifiers of different models on the same matching: the results must agree, and so must the printed verdict
+    unless it's INVALID (each verifier reports the first problem it finds in its own order).
+    """
+    if got[0] != expected[0] or (not expected[1].startswith("INVALID") and got[1] != expected[1]):
+        return [f"{name}: {kind}: {got_name} says {got[1]!r}, {expected_name} says {expected[1]!r}"]
+    return []
+
+
+def check_sparse(name: str, n: int, seed: int, rng: Random) -> List[str]:
+    """
+    gale_shapley_sparse() on a generate_sparse() instance, with some students' lists trimmed so that not every
+    ranking is returned. Checked with sparse_verifier() and hr_verifier() (capacity 1) on the matching and perturbed
+    copies of it, and against the student-optimal matching and brute force.
+    """
+    from sparse_preferences import generate_sparse, gale_shapley_sparse, to_sparse, from_sparse
+    from preference_arrays import pairs_from_array
+    from hospital_residents import hospital_residents
+
+    failures = []
+    sparse = generate_sparse(n, rng.randint(1, n), seed)
+    n, hospital_prefs, student_prefs = from_sparse(sparse)
+    if seed % 2:
+        for student in rng.sample(range(1, n + 1), rng.randint(1, n)):
+            row = student_prefs[student]
+            del row[rng.randrange(len(row) + 1):]
+        sparse = to_sparse(n, hospital_prefs, student_prefs)
+    name = f"{name} sparse"
+
+    pairs = pairs_from_array(gale_shapley_sparse(sparse))
+    student_optimal = {hospital: student for student, hospital in pairs_from_array(gale_shapley_sparse(to_sparse(n, student_prefs, hospital_prefs))).items()}
+    if gale_shapley(n, hospital_prefs, student_prefs, engine="sparse", validate=False) != pairs:
+        failures.append(f"{name}: gale_shapley(engine='sparse') disagrees with gale_shapley_sparse()")
+    if set(pairs) != set(student_optimal) or set(pairs.values()) != set(student_optimal.values()):
+        failures.append(f"{name}: hospital- and student-optimal matchings pair different agents")
+
+    capacities = dict.fromkeys(range(1, n + 1), 1)
+    assignment = hospital_residents(n, n, capacities, hospital_prefs, student_prefs)
+    if {hospital: student for hospital, students in assignment.items() for student in students} != student_optimal:
+        failures.append(f"{name}: hospital_residents() with capacity 1 disagrees with the student-proposing sparse engine")
+
+    if n <= BRUTE_FORCE_MAX_N:
+        stable = brute_force_stable(n, n, hospital_prefs, student_prefs)
+        rank = {h: {s: position for position, s in enumerate(hospital_prefs[h])} for h in hospital_prefs}
+        best = {h: min((matching[h] for matching in stable if h in matching), key=rank[h].get) for h in pairs}
+        if dict(sorted(pairs.items())) not in stable:
+            failures.append(f"{name}: gale_shapley_sparse() matching is not among the brute-force stable matchings")
+        elif best != pairs:
+            failures.append(f"{name}: gale_shapley_sparse() matching is not hospital-optimal per brute force")
+        if dict(sorted(student_optimal.items())) not in stable:
+            failures.append(f"{name}: student-optimal sparse matching is not among the brute-force stable matchings")
+
+    for kind in PERTURBATIONS:
+        if kind != "stable" and len(pairs) < 2:
+            continue
+        perturbed = perturb(pairs, kind, rng)
+        expected = captured(sparse_verifier, sparse, perturbed)
+        if kind == "stable" and expected != (True, "VALID STABLE"):
+            failures.append(f"{name}: sparse_verifier() rejects the gale_shapley_sparse() matching: {expected[1]}")
+        if kind == "duplicated student" and expected[0]:
+            failures.append(f"{name}: sparse_verifier() accepts a matching with a {kind}")
+        got = captured(hr_verifier, n, n, capacities, hospital_prefs, student_prefs, {h: [s] for h, s in perturbed.items()})
+        failures += compare_verdicts(name, kind, expected, got, "sparse_verifier()", "hr_verifier()")
+    return failures
+
+
+def check_hr(name: str, n: int, seed: int, rng: Random) -> List[str]:
+    """
+    hospital_residents() on a generate_hr_input() instance against gale_shapley_sparse() on its one-to-one clone:
+    every hospital becomes one slot per place with the hospital's list, and every student ranks a hospital's slots
+    in order where it ranked the hospital. Students propose on both sides, so the slots of a hospital must hold
+    exactly the students it admitted. hr_verifier() must agree with sparse_verifier() on the clone, for the
+    assignment and for a copy with two hospitals' students swapped.
+    """
+    from sparse_preferences import gale_shapley_sparse, to_sparse
+    from preference_arrays import pairs_from_array
+    from hospital_residents import hospital_residents
+
+    failures = []
+    n_hospitals, n_students = max(1, n // 4), n
+    n_hospitals, n_students, capacities, hospital_prefs, student_prefs = \
+        generate_hr_input(n_hospitals, n_students, seed, list_length=(0, min(n_hospitals, 6)), capacity=(1, 4))
+    name = f"{name} hr"
+
+    assignment = hospital_residents(n_hospitals, n_students, capacities, hospital_prefs, student_prefs)
+    result = captured(hr_verifier, n_hospitals, n_students, capacities, hospital_prefs, student_prefs, assignment)
+    if result != (True, "VALID STABLE"):
+        failures.append(f"{name}: hr_verifier() rejects the hospital_residents() assignment: {result[1]}")
+
+    # slots[hospital] = its slot numbers, slot_hospital[slot] = the hospital it belongs to
+    slots = {}
+    slot_hospital = [0]
+    for hospital in range(1, n_hospitals + 1):
+        slots[hospital] = list(range(len(slot_hospital), len(slot_hospital) + capacities[hospital]))
+        slot_hospital += [hospital] * capacities[hospital]
+    size = max(len(slot_hospital) - 1, n_students)
+    clone_students = {student: [slot for hospital in student_prefs[student] for slot in slots[hospital]] for student in range(1, n_students + 1)}
+    clone_slots = {slot: hospital_prefs[slot_hospital[slot]] for slot in range(1, len(slot_hospital))}
+    clone = to_sparse(size, clone_students, clone_slots)
+
+    admitted = {hospital: [] for hospital in range(1, n_hospitals + 1)}
+    for student, slot in pairs_from_array(gale_shapley_sparse(clone)).items():
+        admitted[slot_hospital[slot]].append(student)
+    if any(sorted(admitted[hospital]) != sorted(assignment[hospital]) for hospital in admitted):
+        failures.append(f"{name}: hospital_residents() disagrees with gale_shapley_sparse() on the cloned instance")
+
+    def on_clone(assignment: Dict[int, List[int]]) -> Dict[int, int]:
+        """ The clone's matching, a hospital's students in its own order in its slots. """
+        pairs = {}
+        for hospital, students in assignment.items():
+            rank = {student: position for position, student in enumerate(hospital_prefs[hospital])}
+            for slot, student in zip(slots[hospital], sorted(students, key=lambda student: rank.get(student, len(rank)))):
+                pairs[student] = slot
+        return pairs
+
+    kinds = [("stable", assignment)]
+    full = [hospital for hospital in sorted(assignment) if assignment[hospital]]
+    if len(full) >= 2:
+        first, second = rng.sample(full, 2)
+        swapped = {hospital: list(students) for hospital, students in assignment.items()}
+        i, j = rng.randrange(len(swapped[first])), rng.randrange(len(swapped[second]))
+        swapped[first][i], swapped[second][j] = swapped[second][j], swapped[first][i]
+        kinds.append(("swapped pair", swapped))
+    for kind, candidate in kinds:
+        expected = captured(sparse_verifier, clone, on_clone(candidate))
+        got = captured(hr_verifier, n_hospitals, n_students, capacities, hospital_prefs, student_prefs, candidate)
+        if got[0] != expected[0]:
+            failures.append(f"{name}: {kind}: hr_verifier() says {got[1]!r}, sparse_verifier() on the clone says {expected[1]!r}")
+    return failures
+
+
+def check_lattice(name: str, n: int, hospital_prefs, student_prefs, reference: Dict[int, int]) -> List[str]:
+    """
+    RotationPoset against the extreme matchings and its own enumeration: every enumerated matching must be stable
+    and distinct, and when the enumeration completes the egalitarian and minimum regret matchings must be its optima.
+    Up to BRUTE_FORCE_MAX_N the enumeration must be exactly the brute-force set of stable matchings.
+    """
+    from stable_lattice import RotationPoset
+
+    failures = []
+    poset = RotationPoset(n, hospital_prefs, student_prefs)
+    extremes = extreme_matchings(n, hospital_prefs, student_prefs)
+    if poset.hospital_optimal != dict(sorted(reference.items())) or poset.student_optimal != extremes.student_optimal:
+        failures.append(f"{name}: RotationPoset extreme matchings disagree with extreme_matchings()")
+
+    matchings = list(islice(poset.matchings(), LATTICE_MAX_MATCHINGS + 1))
+    complete = len(matchings) <= LATTICE_MAX_MATCHINGS
+    keys = [tuple(matching.items()) for matching in matchings]
+    if len(set(keys)) != len(keys):
+        failures.append(f"{name}: RotationPoset.matchings() yields a matching twice")
+    if matchings and matchings[0] != poset.hospital_optimal:
+        failures.append(f"{name}: RotationPoset.matchings() doesn't start with the hospital-optimal matching")
+    if complete and poset.student_optimal not in matchings:
+        failures.append(f"{name}: RotationPoset.matchings() misses the student-optimal matching")
+    for matching in matchings:
+        result = verdict(n, hospital_prefs, student_prefs, matching, "prefix")
+        if result != (True, "VALID STABLE"):
+            failures.append(f"{name}: RotationPoset.matchings() yields an unstable matching: {result[1]}")
+            break
+
+    if n <= BRUTE_FORCE_MAX_N:
+        stable = brute_force_stable(n, n, hospital_prefs, student_prefs)
+        if sorted(keys) != sorted(tuple(matching.items()) for matching in stable):
+            failures.append(f"{name}: RotationPoset.matchings() found {len(matchings)} stable matchings, brute force {len(stable)}")
+
+    egalitarian, regret = poset.egalitarian(), poset.minimum_regret()
+    for label, matching in (("egalitarian", egalitarian), ("minimum regret", regret)):
+        result = verdict(n, hospital_prefs, student_prefs, matching, "prefix")
+        if result != (True, "VALID STABLE"):
+            failures.append(f"{name}: RotationPoset {label} matching is not stable: {result[1]}")
+    if complete and matchings:
+        costs = [cost(n, hospital_prefs, student_prefs, matching) for matching in matchings]
+        if cost(n, hospital_prefs, student_prefs, egalitarian)[0] != min(total for total, _ in costs):
+            failures.append(f"{name}: RotationPoset egalitarian matching doesn't have the smallest rank sum")
+        if cost(n, hospital_prefs, student_prefs, regret)[1] != min(worst for _, worst in costs):
+            failures.append(f"{name}: RotationPoset minimum regret matching doesn't have the smallest worst rank")
+    return failures
+
+
+def check_instance(n: int, family: str, seed: int, engines: List[str], modes: List[str], checks: Optional[List[str]] = None) -> List[str]:
+    """ Runs one instance through every engine, verifier mode and check in checks, returns a description of every disagreement. """
+    failures = []
+    name = f"n={n} family={family} seed={seed}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        n, hospital_prefs, student_prefs = generate_input(n, seed, family)
+    if n < 1:
+        return [f"{name}: generate_input() failed"]
+
+    # Matchers
+    reference_engine = "classic" if n <= CLASSIC_MAX_N else "rank"
+    reference = gale_shapley(n, hospital_prefs, student_prefs, engine=reference_engine)
+    for engine in engines:
+        if engine == "classic" and n > CLASSIC_MAX_N:
+            continue
+        pairs = gale_shapley(n, hospital_prefs, student_prefs, engine=engine)
+        if dict(sorted(pairs.items())) != dict(sorted(reference.items())):
+            failures.append(f"{name}: engine {engine} disagrees with {reference_engine}")
+
+    extremes = [extreme_matchings(n, hospital_prefs, student_prefs, engine=engine) for engine in ("rank", "array")]
+    if extremes[0] != extremes[1]:
+        failures.append(f"{name}: extreme_matchings() engines disagree")
+    if extremes[0].hospital_optimal != dict(sorted(reference.items())):
+        failures.append(f"{name}: extreme_matchings() hospital-optimal matching disagrees with {reference_engine}")
+
+    # Verifiers, on the reference matching and perturbed copies of it
+    reference_mode = "classic" if n <= CLASSIC_MAX_N else "prefix"
+    rng = Random(seed)
+    for kind in PERTURBATIONS:
+        if kind != "stable" and n < 2:
+            continue
+        pairs = perturb(reference, kind, rng)
+        expected = verdict(n, hospital_prefs, student_prefs, pairs, reference_mode)
+        if kind == "stable" and expected != (True, "VALID STABLE"):
+            failures.append(f"{name}: reference verifier rejects the reference matching: {expected[1]}")
+        if kind in ("duplicated student", "missing hospital") and expected[0]:
+            failures.append(f"{name}: reference verifier accepts a matching with a {kind}")
+        for mode in modes:
+            if mode == "classic" and n > CLASSIC_MAX_N:
+                continue
+            got = verdict(n, hospital_prefs, student_prefs, pairs, mode)
+            if got != expected:
+                failures.append(f"{name}: {kind}: verifier mode {mode} says {got[1]!r}, {reference_mode} says {expected[1]!r}")
+
+    # Stateful matchers, incomplete lists and the lattice, each with its own seeded generator so --checks doesn't change the others
+    checks = checks or []
+    if "incremental" in checks:
+        failures += check_incremental(name, n, hospital_prefs, student_prefs, reference, Random(seed))
+    if "resumable" in checks:
+        failures += check_resumable(name, n, hospital_prefs, student_prefs, Random(seed))
+    if "sparse" in checks:
+        failures += check_sparse(name, n, seed, Random(seed))
+    if "hr" in checks:
+        failures += check_hr(name, n, seed, Random(seed))
+    if "lattice" in checks:
+        failures += check_lattice(name, n, hospital_prefs, student_prefs, reference)
+
+    return failures
+
+
+def check_chunk(cases: List[Tuple[int, str, int]], engines: List[str], modes: List[str], checks: Optional[List[str]] = None) -> List[str]:
+    """ Worker entry point, only the (n, family, seed) triples cross the process boundary. """
+    failures = []
+    for n, family, seed in cases:
+        try:
+            failures += check_instance(n, family, seed, engines, modes, checks)
+        except Exception as e: # a crash is a disagreement too, keep fuzzing the rest
+            failures.append(f"n={n} family={family} seed={seed}: {type(e).__name__}: {e}")
+    return failures
+
+
+def run_fuzz(count: int, seed: int, sizes: List[int], families: List[str], engines: List[str], modes: List[str],
+             workers: int = 0, parallel_every: int = 100, checks: Optional[List[str]] = None) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Checks count instances across a process pool, yielding (instances checked, failures) per completed chunk.
+    The "parallel" verifier mode starts its own process pool, so it only runs on every parallel_every-th instance.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    workers = workers or os.cpu_count() or 1
+    cases = [case(index, seed, sizes, families) for index in range(count)]
+    chunksize = max(1, -(-count // (workers * 8)))
+    serial_modes = [mode for mode in modes if mode != "parallel"]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for start in range(0, count, chunksize):
+            chunk = cases[start:start + chunksize]
+            futures[pool.submit(check_chunk, chunk, engines, serial_modes, checks)] = len(chunk)
+        if "parallel" in modes and parallel_every > 0:
+            # Run here, so the parallel verifier's pool isn't nested inside every fuzzing worker
+            yield 0, check_chunk(cases[::parallel_every], [], ["parallel"])
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def main():
+    """
+    Differential fuzzer, every engine, verifier mode and check against the reference implementations:
+        python fuzz.py --count 5000 --workers 8
+        python fuzz.py --sizes 1,2,3,500 --family uniform,adversarial --seed 42
+        python fuzz.py --sizes 1,2,3,4,5 --checks sparse,lattice
+    Prints every disagreement as it is found, exits with 1 if there was any.
+    """
+    parser = argparse.ArgumentParser(description="Differential fuzzing of gale_shapley() engines and verifier() modes.")
+    parser.add_argument("--count", type=int, default=2000, help="instances to check (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first instance (default: %(default)s)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma separated n, cycled through (default: %(default)s)")
+    parser.add_argument("--family", default=",".join(DEFAULT_FAMILIES), help="comma separated instance families, see preference_arrays.INSTANCE_FAMILIES (default: all)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated gale_shapley() engines (default: %(default)s)")
+    parser.add_argument("--modes", default=",".join(VERIFIER_MODES), help="comma separated verifier() modes (default: %(default)s)")
+    parser.add_argument("--checks", default=",".join(CHECKS), help="comma separated extra checks, see the module docstring (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: CPU count)")
+    parser.add_argument("--parallel-every", type=int, default=100, help="run the parallel verifier on every this many instances (default: %(default)s)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    checked = 0
+    failures = 0
+    for done, found in run_fuzz(args.count, args.seed, [int(n) for n in args.sizes.split(",")], args.family.split(","),
+                                args.engines.split(","), args.modes.split(","), args.workers, args.parallel_every,
+                                [check for check in args.checks.split(",") if check]):
+        checked += done
+        failures += len(found)
+        for failure in found:
+            print(failure, flush=True)
+
+    print(f"Checked {checked} instances in {time.perf_counter() - start:.1f} s, {failures} disagreements.", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
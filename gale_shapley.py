@@ -1,25 +1,447 @@
 #!/usr/bin/env python3
 
-from typing import List, Dict
-from data_helpers import valid_input, read_input
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Dict, Optional, NamedTuple
+from data_helpers import InputFormatError, valid_input, read_input, rank_table, write_pairs
 
 
-def gale_shapley(n: int, hospital_preferences: Dict[int, List[int]], student_preferences: Dict[int, List[int]]) -> Dict[int, int]:
+ENGINES = ("rank", "classic", "array", "sparse")
+
+
+@dataclass
+class MatchStats:
+    """
+    Opt-in work counters and timings, added to by gale_shapley() when passed as stats.
+    Counters are derived from the proposal pointers after the main loop, so the hot path only pays for counting pair breaks.
+    """
+    proposals: int = 0
+    rejections: int = 0
+    pair_breaks: int = 0 # a student left its hospital for a better one (pairings.pop(old_hospital))
+    max_hospital_proposals: int = 0 # most proposals made by any single hospital
+    validation_time: float = 0.0 # seconds
+    init_time: float = 0.0
+    loop_time: float = 0.0
+
+    def record(self, n: int, proposals_per_hospital: List[int], pair_breaks: int):
+        """ Adds one run's counters, every proposal either pairs a free student, breaks a pair, or is rejected. """
+        proposals = sum(proposals_per_hospital)
+        self.proposals += proposals
+        self.pair_breaks += pair_breaks
+        self.rejections += proposals - n - pair_breaks
+        self.max_hospital_proposals = max(self.max_hospital_proposals, max(proposals_per_hospital, default=0))
+
+    def report(self) -> str:
+        return (f"proposals {self.proposals}, rejections {self.rejections}, pair breaks {self.pair_breaks}, "
+                f"max proposals by one hospital {self.max_hospital_proposals}, "
+                f"validation {self.validation_time * 1000:.3f} ms, init {self.init_time * 1000:.3f} ms, main loop {self.loop_time * 1000:.3f} ms")
+
+
+def gale_shapley(n: int, hospital_preferences: Dict[int, List[int]], student_preferences: Dict[int, List[int]], engine: str = "rank", stats: Optional[MatchStats] = None, validate: bool = True) -> Dict[int, int]:
     """ (finn)
     Input:
         n: number of hospitals / students
         hospital_prefs: dict of hospital preferences, associating [hospital, [student preference list]]
-        hospital_prefs: dict of hospital preferences, associating [hospital, [student preference list]]
         student_prefs: same format as hospital_prefs, but for students' preferences of hospitals
+        engine: which implementation to run, one of ENGINES
+            "rank": precomputed student rank tables and per-hospital proposal pointers, O(n^2) worst case
+            "classic": the original list-popping implementation, kept as a reference
+            "array": converts the input to PreferenceArrays and runs gale_shapley_array() (needs numpy)
+            "sparse": converts the input to SparsePreferences and runs gale_shapley_sparse() (needs numpy)
+        stats: optional MatchStats to add this run's counters and timings to
+        validate: check the input with valid_input() first, pass False only for an instance that was just parsed
+            (the parsers validate it) and hasn't been modified since
     Output:
         A dict of formed pairs using hospitals as keys and students as values [hospital, student]
     """
 
     ###### Initialization ######
 
-    if not valid_input(n, hospital_preferences, student_preferences):
+    if engine not in ENGINES:
+        print(f"Input Error: unknown engine '{engine}', expected one of {', '.join(ENGINES)}.")
         return {}
 
+    start = time.perf_counter()
+    if validate and not valid_input(n, hospital_preferences, student_preferences):
+        return {}
+    if stats is not None:
+        stats.validation_time += time.perf_counter() - start
+
+    if engine == "classic":
+        return _gale_shapley_classic(n, hospital_preferences, student_preferences, stats)
+    if engine == "array":
+        from preference_arrays import to_arrays, pairs_from_array
+        start = time.perf_counter()
+        arrays = to_arrays(n, hospital_preferences, student_preferences)
+        if stats is not None:
+            stats.init_time += time.perf_counter() - start
+        return pairs_from_array(gale_shapley_array(arrays, validate=False, stats=stats))
+    if engine == "sparse":
+        from sparse_preferences import to_sparse, gale_shapley_sparse
+        from preference_arrays import pairs_from_array
+        start = time.perf_counter()
+        sparse = to_sparse(n, hospital_preferences, student_preferences)
+        if stats is not None:
+            stats.init_time += time.perf_counter() - start
+        return pairs_from_array(gale_shapley_sparse(sparse, validate=False, stats=stats))
+    return _gale_shapley_rank(n, hospital_preferences, student_preferences, stats)
+
+
+def gale_shapley_array(arrays, validate: bool = True, stats: Optional[MatchStats] = None):
+    """ (finn)
+    Input:
+        arrays: PreferenceArrays (see preference_arrays.py) holding n x n int32 preference and rank matrices
+        validate: check that every preference row is a permutation of 1..n first (skipped if arrays.validated)
+        stats: optional MatchStats to add this run's counters and timings to
+    Output:
+        int32 array of length n where entry h - 1 is the student paired with hospital h
+        (empty array if the input is invalid)
+    """
+    from preference_arrays import valid_arrays
+
+    n = arrays.n
+    start = time.perf_counter()
+    if validate and not arrays.validated and not valid_arrays(n, arrays.hospital_prefs, arrays.student_prefs):
+        import numpy as np
+        return np.zeros(0, dtype=np.int32)
+    validated = time.perf_counter()
+
+    matcher = ResumableMatcher(arrays)
+    if stats is not None:
+        stats.validation_time += validated - start
+        stats.init_time += time.perf_counter() - validated
+    return matcher.run(stats=stats)
+
+
+CHECKPOINT_MAGIC = b"GSK1"
+CHECKPOINT_HEADER = struct.Struct("<4sIIIQQ")
+
+
+class ResumableMatcher:
+    """
+    Hospital-proposing Gale-Shapley on a PreferenceArrays as a stateful object, so a long run can be checkpointed and resumed:
+        matcher = ResumableMatcher.restore(arrays, "run.gsk") if os.path.exists("run.gsk") else ResumableMatcher(arrays)
+        matches = matcher.run(checkpoint="run.gsk", every=10_000_000)
+    The state is the next-proposal pointers, paired_students and the free-hospital stack, and run() produces
+    the same matching however many times it is interrupted and restored.
+
+    G-S checkpoint file format (.gsk), all values little-endian:
+        header           ] 4 byte magic b"GSK1", then n, instance checksum, free hospital count as uint32,
+                           then proposals and pair breaks so far as uint64
+        proposed         ] n int32, number of proposals hospital h has made at index h - 1
+        paired_students  ] n int32, hospital index (0-based) holding student s at index s - 1, -1 = unpaired
+        free_hospitals   ] free hospital count int32, the stack of free hospital indices (0-based), top last
+    The checksum is a CRC-32 of both preference matrices, so a checkpoint can't be resumed on a different instance.
+    """
+
+    def __init__(self, arrays):
+        n = arrays.n
+        self.arrays = arrays
+        self.n = n
+
+        # Proposals made by every hospital, i.e. index of the next student in its preference list
+        self.proposed = [0] * n
+        # paired_students[s - 1] = hospital index (0-based) paired with student s, -1 = unpaired
+        self.paired_students = [-1] * n
+        self.free_hospitals = list(range(n - 1, -1, -1))
+        self.proposals = 0
+        self.pair_breaks = 0
+        self._checksum = None
+
+    @property
+    def done(self) -> bool:
+        return not self.free_hospitals
+
+    def run(self, checkpoint: Optional[str] = None, every: int = 0, stats: Optional[MatchStats] = None):
+        """
+        Runs Gale-Shapley from the current state to the end, returns the matches array (see gale_shapley_array()).
+        With checkpoint, the state is saved there about every `every` proposals (checked between hospitals) and once more at the end.
+        stats gets the loop time of this call and the counters of the whole run, including proposals made before a restore.
+        """
+        n = self.n
+        start = time.perf_counter()
+
+        # Flat int32 views of the matrices, indexing them yields plain Python ints without copying
+        hospital_prefs = memoryview(self.arrays.hospital_prefs).cast("B").cast("i")
+        student_rank = memoryview(self.arrays.student_rank).cast("B").cast("i")
+
+        # Offset into hospital_prefs of the next student each hospital will propose to
+        next_proposal = [offset + proposed for offset, proposed in zip(range(0, n * n, n), self.proposed)]
+        free_hospitals = self.free_hospitals
+        paired_students = self.paired_students
+        proposals = self.proposals
+        pair_breaks = self.pair_breaks
+        next_checkpoint = proposals + every if checkpoint and every > 0 else n * n + 1
+
+
+        ###### Gale-Shapley ######
+
+        while free_hospitals:
+            hospital = free_hospitals.pop()
+            first = position = next_proposal[hospital]
+
+            while True:
+                student = hospital_prefs[position] - 1
+                position += 1
+
+                # If student is free, pair it with hospital
+                old_hospital = paired_students[student]
+                if old_hospital < 0:
+                    paired_students[student] = hospital
+                    break
+
+                # If student prefers this hospital, break the old pair and re-add the old hospital to free hospitals
+                row = student * n
+                if student_rank[row + hospital] < student_rank[row + old_hospital]:
+                    paired_students[student] = hospital
+                    free_hospitals.append(old_hospital)
+                    pair_breaks += 1
+                    break
+
+            next_proposal[hospital] = position
+            proposals += position - first
+
+            # Between hospitals the pointers, pairs and stack are consistent, so this is where a checkpoint can be taken
+            if proposals >= next_checkpoint:
+                self._sync(next_proposal, proposals, pair_breaks)
+                self.save(checkpoint)
+                next_checkpoint = proposals + every
+
+        self._sync(next_proposal, proposals, pair_breaks)
+        if stats is not None:
+            stats.loop_time += time.perf_counter() - start
+            stats.record(n, self.proposed, pair_breaks)
+        if checkpoint:
+            self.save(checkpoint)
+
+        return self.matches()
+
+    def matches(self):
+        """ Current matches array, hospitals that are free right now are left as 0. """
+        import numpy as np
+        matches = np.zeros(self.n, dtype=np.int32)
+        paired_students = np.array(self.paired_students, dtype=np.intp)
+        students = np.flatnonzero(paired_students >= 0)
+        matches[paired_students[students]] = students + 1
+        return matches
+
+    def save(self, filename: str):
+        """ Writes the state to a G-S checkpoint file, replacing it atomically so a kill mid-write leaves the last one intact. """
+        header = CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, self.n, self.checksum(), len(self.free_hospitals), self.proposals, self.pair_breaks)
+        temporary = filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(header)
+            for values in (self.proposed, self.paired_students, self.free_hospitals):
+                row = array("i", values)
+                if sys.byteorder == "big":
+                    row.byteswap()
+                row.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, filename)
+
+    @classmethod
+    def restore(cls, arrays, filename: str) -> "ResumableMatcher":
+        """ Loads a G-S checkpoint file written for arrays. Raises InputFormatError if it's invalid or for another instance. """
+        matcher = cls(arrays)
+        n = arrays.n
+        with open(filename, "rb") as f:
+            header = f.read(CHECKPOINT_HEADER.size)
+            if len(header) != CHECKPOINT_HEADER.size or header[:4] != CHECKPOINT_MAGIC:
+                raise InputFormatError("not a G-S checkpoint file")
+            _, checkpoint_n, checksum, free_count, proposals, pair_breaks = CHECKPOINT_HEADER.unpack(header)
+            if checkpoint_n != n or checksum != matcher.checksum():
+                raise InputFormatError("checkpoint was written for a different instance")
+            if free_count > n:
+                raise InputFormatError("checkpoint state is inconsistent")
+
+            state = array("i")
+            try:
+                state.fromfile(f, 2 * n + free_count)
+            except EOFError:
+                raise InputFormatError("checkpoint file is truncated")
+            if f.read(1):
+                raise InputFormatError("checkpoint file is too long")
+        if sys.byteorder == "big":
+            state.byteswap()
+
+        matcher.proposed = state[:n].tolist()
+        matcher.paired_students = state[n:2 * n].tolist()
+        matcher.free_hospitals = state[2 * n:].tolist()
+        matcher.proposals = proposals
+        matcher.pair_breaks = pair_breaks
+        if sum(matcher.proposed) != proposals or not all(0 <= proposed <= n for proposed in matcher.proposed):
+            raise InputFormatError("checkpoint state is inconsistent")
+
+        # Every hospital either holds exactly one student or is on the free stack (once), and a free one has students left to propose to
+        held = [hospital for hospital in matcher.paired_students if hospital >= 0]
+        if (not all(-1 <= hospital < n for hospital in matcher.paired_students)
+                or not all(0 <= hospital < n for hospital in matcher.free_hospitals)
+                or len(held) + free_count != n or len(set(held).union(matcher.free_hospitals)) != n
+                or any(matcher.proposed[hospital] >= n for hospital in matcher.free_hospitals)):
+            raise InputFormatError("checkpoint state is inconsistent")
+        return matcher
+
+    def checksum(self) -> int:
+        """ CRC-32 of both preference matrices, computed once. """
+        if self._checksum is None:
+            self._checksum = zlib.crc32(self.arrays.student_prefs, zlib.crc32(self.arrays.hospital_prefs))
+        return self._checksum
+
+    def _sync(self, next_proposal: List[int], proposals: int, pair_breaks: int):
+        """ Copies run()'s local pointers and counters back into the object. """
+        self.proposed = [position - offset for position, offset in zip(next_proposal, range(0, self.n * self.n, self.n))]
+        self.proposals = proposals
+        self.pair_breaks = pair_breaks
+
+
+def _gale_shapley_rank(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], stats: Optional[MatchStats]) -> Dict[int, int]:
+    """
+    O(n^2) Gale-Shapley on already validated input.
+    Produces the same pairings (in the same insertion order) as _gale_shapley_classic().
+    """
+    start = time.perf_counter()
+
+    # student_rank[student][hospital] = position of hospital in student's preference list
+    student_rank = rank_table(n, student_prefs)
+    if stats is not None:
+        stats.init_time += time.perf_counter() - start
+
+    return propose(n, hospital_prefs, student_rank, stats)
+
+
+def propose(n: int, proposer_prefs: Dict[int, List[int]], receiver_rank: List[List[int]], stats: Optional[MatchStats] = None) -> Dict[int, int]:
+    """
+    Main loop of the "rank" engine, for either side proposing, on already validated input: proposer_prefs are
+    the proposers' lists and receiver_rank the receivers' rank_table(). Returns the pairings as [proposer, receiver].
+    Students propose with propose(n, student_prefs, rank_table(n, hospital_prefs)), see extreme_matchings().
+    """
+
+    ###### Initialization ######
+
+    start = time.perf_counter()
+
+    # Index of the next receiver each proposer will propose to (replaces popping a copied list)
+    next_proposal = [0] * (n + 1)
+
+    # Free proposers, taken from and returned to the front like the classic engine
+    free_proposers = deque(range(1, n + 1))
+
+    # Initialize a list to keep track of paired receivers (0 = unpaired, x = proposer paired to)
+    paired_receivers = [0] * (n + 1)
+    pair_breaks = 0
+    initialized = time.perf_counter()
+
+
+    ###### Gale-Shapley ######
+
+    pairings = {}
+    while free_proposers:
+
+        # Pick an unmatched proposer, resume its preference list where it left off
+        proposer = free_proposers.popleft()
+        prefs = proposer_prefs[proposer]
+
+        while next_proposal[proposer] < n:
+
+            # Fetch most preferred untested receiver
+            receiver = prefs[next_proposal[proposer]]
+            next_proposal[proposer] += 1
+
+            # If receiver is free, pair it with proposer
+            old_proposer = paired_receivers[receiver]
+            if old_proposer == 0:
+                pairings[proposer] = receiver
+                paired_receivers[receiver] = proposer
+                break
+
+            # If receiver is paired but prefers this proposer, break old pair and create new one
+            rank = receiver_rank[receiver]
+            if rank[proposer] < rank[old_proposer]:
+                pairings.pop(old_proposer) # break prev. pair
+                free_proposers.appendleft(old_proposer) # re-add to free proposers
+                pairings[proposer] = receiver # create new pair
+                paired_receivers[receiver] = proposer
+                pair_breaks += 1
+                break
+
+            # Receiver rejects pairing with this proposer
+
+    if stats is not None:
+        stats.init_time += initialized - start
+        stats.loop_time += time.perf_counter() - initialized
+        stats.record(n, next_proposal[1:], pair_breaks)
+
+    return pairings
+
+
+class ExtremeMatchings(NamedTuple):
+    hospital_optimal: Dict[int, int]
+    student_optimal: Dict[int, int]
+    fixed_pairs: Dict[int, int]
+
+
+def extreme_matchings(n: int, hospital_preferences: Dict[int, List[int]], student_preferences: Dict[int, List[int]], engine: str = "rank", stats: Optional[MatchStats] = None, validate: bool = True) -> ExtremeMatchings:
+    """
+    Input:
+        n, hospital_preferences, student_preferences, validate: as for gale_shapley()
+        engine: "rank" (rank tables) or "array" (PreferenceArrays and ResumableMatcher, needs numpy)
+        stats: optional MatchStats to add both runs' counters and timings to
+    Output:
+        ExtremeMatchings of the hospital-optimal and student-optimal stable matchings, both as [hospital, student] dicts
+        sorted by hospital, and the fixed pairs they share. Every stable matching lies between the two extremes,
+        so the fixed pairs are matched the same way in all of them. All three are empty if the input is invalid.
+    The input is validated and both sides' rank tables are built once, then shared by the two runs.
+    """
+    if engine not in ("rank", "array"):
+        print(f"Input Error: unknown engine '{engine}', expected rank or array.")
+        return ExtremeMatchings({}, {}, {})
+
+    start = time.perf_counter()
+    if validate and not valid_input(n, hospital_preferences, student_preferences):
+        return ExtremeMatchings({}, {}, {})
+    validated = time.perf_counter()
+
+    if engine == "array":
+        from preference_arrays import PreferenceArrays, to_arrays, rank_matrix, pairs_from_array
+        arrays = to_arrays(n, hospital_preferences, student_preferences)
+        swapped = PreferenceArrays(n, arrays.student_prefs, arrays.hospital_prefs, rank_matrix(arrays.hospital_prefs))
+        if stats is not None:
+            stats.validation_time += validated - start
+            stats.init_time += time.perf_counter() - validated
+        hospital_optimal = pairs_from_array(ResumableMatcher(arrays).run(stats=stats))
+        student_proposals = pairs_from_array(ResumableMatcher(swapped).run(stats=stats))
+    else:
+        student_rank = rank_table(n, student_preferences)
+        hospital_rank = rank_table(n, hospital_preferences)
+        if stats is not None:
+            stats.validation_time += validated - start
+            stats.init_time += time.perf_counter() - validated
+        hospital_optimal = dict(sorted(propose(n, hospital_preferences, student_rank, stats).items()))
+        student_proposals = propose(n, student_preferences, hospital_rank, stats)
+
+    student_optimal = dict(sorted((hospital, student) for student, hospital in student_proposals.items()))
+    fixed_pairs = {hospital: student for hospital, student in hospital_optimal.items() if student_optimal[hospital] == student}
+    return ExtremeMatchings(hospital_optimal, student_optimal, fixed_pairs)
+
+
+def _gale_shapley_classic(n: int, hospital_preferences: Dict[int, List[int]], student_preferences: Dict[int, List[int]], stats: Optional[MatchStats]) -> Dict[int, int]:
+    """
+    Original Gale-Shapley implementation on already validated input.
+    Roughly O(n^3) because of list.index() and list.pop(0), kept as the reference engine.
+    """
+
+    ###### Initialization ######
+
+    start = time.perf_counter()
+
     # Copy input lists to avoid modifying them
     hospital_prefs = {i: hospital_preferences[i][:] for i in hospital_preferences}
     student_prefs = {i: student_preferences[i][:] for i in student_preferences}
@@ -29,6 +451,8 @@ def gale_shapley(n: int, hospital_preferences: Dict[int, List[int]], student_pre
     
     # Initialize a list to keep track of paired students (0 = unpaired, x = hospital paired to)
     paired_students = [0] * (n + 1) # index 0 unused, no "0" student
+    pair_breaks = 0
+    initialized = time.perf_counter()
 
 
     ###### Gale-Shapley ######
@@ -58,32 +482,227 @@ def gale_shapley(n: int, hospital_preferences: Dict[int, List[int]], student_pre
                 free_hospitals.insert(0, old_hospital) # re-add to free hospitals
                 pairings[hospital] = student # create new pair
                 paired_students[student] = hospital
+                pair_breaks += 1
                 break
 
             # Student rejects pairing with this hospital
             continue
 
+    if stats is not None:
+        stats.init_time += initialized - start
+        stats.loop_time += time.perf_counter() - initialized
+        stats.record(n, [n - len(hospital_prefs[hospital]) for hospital in range(1, n + 1)], pair_breaks)
+
     return pairings
 
 
+def run_checkpointed(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], checkpoint: str, every: int, stats: Optional[MatchStats] = None, validate: bool = True) -> Dict[int, int]:
+    """ gale_shapley(engine="array") through a ResumableMatcher, resuming from checkpoint if the file exists. """
+    from preference_arrays import to_arrays, pairs_from_array
+
+    if validate and not valid_input(n, hospital_prefs, student_prefs):
+        return {}
+    return pairs_from_array(run_checkpointed_array(to_arrays(n, hospital_prefs, student_prefs), checkpoint, every, stats))
+
+
+def run_checkpointed_array(arrays, checkpoint: str, every: int, stats: Optional[MatchStats] = None):
+    """ run_checkpointed() on an already validated PreferenceArrays, returns the matches array (empty if checkpoint is invalid). """
+    if os.path.exists(checkpoint):
+        try:
+            matcher = ResumableMatcher.restore(arrays, checkpoint)
+        except InputFormatError as e:
+            print(f"Input Error: {checkpoint}: {e}.")
+            import numpy as np
+            return np.zeros(0, dtype=np.int32)
+        print(f"Resuming from {checkpoint} after {matcher.proposals} proposals", file=sys.stderr)
+    else:
+        matcher = ResumableMatcher(arrays)
+    return matcher.run(checkpoint=checkpoint, every=every, stats=stats)
+
+
+def _main_array(args, stats: Optional[MatchStats], stdout):
+    """
+    main() for --engine array (and --checkpoint): the instance is parsed straight into int32 matrices (binary files are
+    memory-mapped), and the matches array is written without building the pairs dict. Exits with 1 on failure.
+    """
+    from data_helpers import output_file
+    from preference_arrays import read_instance_arrays, make_arrays, from_arrays, pack_output_array, pairs_from_array
+
+    n, hospital_prefs, student_prefs = read_instance_arrays(args.input, args.format)
+    if n < 1:
+        sys.exit(1)
+    arrays = make_arrays(n, hospital_prefs, student_prefs, validated=True)
+    if args.checkpoint:
+        matches = run_checkpointed_array(arrays, args.checkpoint, args.checkpoint_every, stats)
+    else:
+        matches = gale_shapley_array(arrays, stats=stats)
+    if matches.size == 0:
+        sys.exit(1)
+
+    with output_file(args.output or stdout, "-") as (f, _):
+        pack_output_array(matches, f)
+
+    if stats is not None:
+        print(f"Stats: {stats.report()}")
+
+    if args.verify:
+        from verifier import VerifierStats, verifier, verifier_array
+        verifier_stats = VerifierStats() if args.stats else None
+        pairs = pairs_from_array(matches)
+        if args.verify_mode in ("array", "parallel"):
+            stable = verifier_array(arrays, pairs, mode=args.verify_mode, stats=verifier_stats)
+        else:
+            stable = verifier(*from_arrays(arrays), pairs, mode=args.verify_mode, stats=verifier_stats)
+        if verifier_stats is not None:
+            print(f"Verifier stats: {verifier_stats.report()}")
+        if not stable:
+            sys.exit(1)
+
+
+def _main_sparse(args, stats: Optional[MatchStats], stdout):
+    """
+    main() for --engine sparse: the instance is read as incomplete lists (text or binary incomplete-list files, or
+    G-S files), matched by gale_shapley_sparse() and checked by sparse_verifier(). Hospitals left unpaired are left
+    out of the pairings. Exits with 1 on failure.
+    """
+    from data_helpers import output_file
+    from preference_arrays import pack_output_array, pairs_from_array
+    from sparse_preferences import read_instance_sparse, gale_shapley_sparse
+
+    n, sparse = read_instance_sparse(args.input, args.format)
+    if n < 1:
+        sys.exit(1)
+    matches = gale_shapley_sparse(sparse, validate=False, stats=stats)
+
+    with output_file(args.output or stdout, "-") as (f, _):
+        pack_output_array(matches, f)
+
+    if stats is not None:
+        print(f"Stats: {stats.report()}")
+
+    if args.verify:
+        from verifier import VerifierStats, sparse_verifier
+        verifier_stats = VerifierStats() if args.stats else None
+        stable = sparse_verifier(sparse, pairs_from_array(matches), stats=verifier_stats)
+        if verifier_stats is not None:
+            print(f"Verifier stats: {verifier_stats.report()}")
+        if not stable:
+            sys.exit(1)
+
+
 def main():
     """ (finn)
-    Runnable from command line:
-        cat input.in | python gale_shapley.py
-        OR
-        python gale-shapley.py
-            which will prompt for input using stdin in the format:
+    Runnable from command line, without prompts:
+        python gale_shapley.py < input.in
+        cat input.gsb | python gale_shapley.py --engine array --verify > input.out
+        python gale_shapley.py input.in -o input.out --stats
+    stdin is read in one bulk read and parsed by the same parser as files: text or binary, told apart by the magic
+    unless --format is given. With --engine array, the instance is parsed straight into int32 matrices instead of dicts.
+    With --engine sparse, preference lists may be incomplete (see the incomplete-list formats in data_helpers.py),
+    unpaired hospitals are left out of the pairings, and --verify uses the sparse verifier.
+    Only the pairings go to stdout, in the G-S output file format (in hospital order). Errors, stats and the
+    verifier's verdict go to stderr, and the exit status is 1 if the input is invalid or --verify fails.
+    If stdin is a terminal and no input file is given, prompts (on stderr) for the input in the format:
             n
             hospital_prefs  ] n lines, n numbers long each
             student_prefs   ] n lines, n numbers long each
+    With --verify, the pairings are checked by verifier() on the instance already in memory (--verify-mode array picks the mode).
+    With --both (rank or array engine), the pairings stay the hospital-optimal ones, and the student-optimal pairings and
+    the pairs both share are printed to stderr under their own headers, or the student-optimal ones to --student-output.
+    With --stats, the matcher's work counters and timings are printed to stderr after the pairings.
+    With --checkpoint run.gsk, the run is checkpointed every --checkpoint-every proposals, and resumed from
+    run.gsk if it already exists (rerun the same command after the job is killed). Checkpoints are taken by the
+    array engine's ResumableMatcher, so --checkpoint with another --engine (or with --both) is an error.
     """
-    n, hospital_prefs, student_prefs = read_input()
+    from contextlib import redirect_stdout
+    from data_helpers import read_instance, output_file, pack_output
+    from verifier import VERIFIER_MODES
+
+    parser = argparse.ArgumentParser(description="Run Gale-Shapley on an instance read from a file or stdin.")
+    parser.add_argument("input", nargs="?", default="-", help="G-S input file, text or binary (default: stdin)")
+    parser.add_argument("-o", "--output", help="write the pairings to this file instead of stdout")
+    parser.add_argument("--format", choices=("text", "binary"), help="input format (default: detected from the binary magic)")
+    parser.add_argument("--engine", choices=ENGINES, help="matcher engine (default: rank, array with --checkpoint)")
+    parser.add_argument("--verify", action="store_true", help="verify the pairings, the verdict goes to stderr")
+    parser.add_argument("--verify-mode", choices=VERIFIER_MODES, help="verifier mode for --verify (default: prefix)")
+    parser.add_argument("--stats", action="store_true", help="print proposal counters and timings to stderr")
+    parser.add_argument("--both", action="store_true", help="also print the student-optimal pairings and the pairs both matchings share, to stderr (engine rank or array)")
+    parser.add_argument("--student-output", help="with --both, write the student-optimal pairings to this file instead of stderr")
+    parser.add_argument("--checkpoint", help="checkpoint file to save progress to and resume from (always runs the array engine)")
+    parser.add_argument("--checkpoint-every", type=int, default=10_000_000, help="proposals between checkpoints (default: %(default)s)")
+    args = parser.parse_args()
+    if args.checkpoint and args.engine not in (None, "array"):
+        parser.error(f"--checkpoint always runs the array engine, not --engine {args.engine}")
+    if args.checkpoint and args.both:
+        parser.error("--checkpoint can't be combined with --both")
+    if args.both and args.engine not in (None, "rank", "array"):
+        parser.error(f"--both needs --engine rank or array, not {args.engine}")
+    if args.student_output and not args.both:
+        parser.error("--student-output needs --both")
+    if args.verify_mode and not args.verify:
+        parser.error("--verify-mode needs --verify")
+    if args.engine == "sparse" and args.verify_mode not in (None, "sparse"):
+        parser.error("--engine sparse reads incomplete lists, only --verify-mode sparse can check them")
+    args.verify_mode = args.verify_mode or "prefix"
+    args.engine = args.engine or ("array" if args.checkpoint else "rank")
+
+    # Everything but the pairings is printed to stderr
+    stdout = sys.stdout
+    with redirect_stdout(sys.stderr):
+        stats = MatchStats() if args.stats else None
+        if args.engine == "array" and not args.both and not (args.input == "-" and sys.stdin.isatty()):
+            _main_array(args, stats, stdout)
+            return
+        if args.engine == "sparse" and not (args.input == "-" and sys.stdin.isatty()):
+            _main_sparse(args, stats, stdout)
+            return
+
+        if args.input == "-" and sys.stdin.isatty():
+            n, hospital_prefs, student_prefs = read_input()
+            if not valid_input(n, hospital_prefs, student_prefs):
+                sys.exit(1)
+        else:
+            n, hospital_prefs, student_prefs = read_instance(args.input, args.format)
+        if n < 1:
+            sys.exit(1)
+
+        # Validated once above (read_instance() validates while parsing), the matchers skip it
+        if args.both:
+            result, student_optimal, fixed_pairs = extreme_matchings(n, hospital_prefs, student_prefs, engine=args.engine, stats=stats, validate=False)
+            matchings = [result, student_optimal]
+        elif args.checkpoint: # typed in at the prompts
+            result = run_checkpointed(n, hospital_prefs, student_prefs, args.checkpoint, args.checkpoint_every, stats, validate=False)
+            matchings = [result]
+        else:
+            result = gale_shapley(n, hospital_prefs, student_prefs, engine=args.engine, stats=stats, validate=False)
+            matchings = [result]
+        if not result:
+            sys.exit(1)
+
+        with output_file(args.output or stdout, "-") as (f, _):
+            pack_output(result, f)
+
+        # The other matchings never go to stdout / -o, so that stays one matching parse_output() can read
+        if args.both:
+            if args.student_output:
+                pack_output(student_optimal, args.student_output)
+            else:
+                print("----- Student-Optimal Pairings -----")
+                pack_output(student_optimal, sys.stderr)
+            print("----- Fixed Pairs -----")
+            write_pairs(fixed_pairs, sys.stderr)
+
+        if stats is not None:
+            print(f"Stats: {stats.report()}")
 
-    # Run algorithm and print results
-    print("----- Gale-Shapley Pairings -----")
-    result = gale_shapley(n, hospital_prefs, student_prefs)
-    for hospital, student in result.items():
-        print(f"{hospital} {student}")
+        if args.verify:
+            from verifier import VerifierStats, verifier
+            verifier_stats = VerifierStats() if args.stats else None
+            stable = [verifier(n, hospital_prefs, student_prefs, pairs, mode=args.verify_mode, stats=verifier_stats) for pairs in matchings]
+            if verifier_stats is not None:
+                print(f"Verifier stats: {verifier_stats.report()}")
+            if not all(stable):
+                sys.exit(1)
 
 
 if __name__ == "__main__":
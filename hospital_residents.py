@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from heapq import heappush, heapreplace
+from typing import List, Dict
+from data_helpers import valid_hr_input, parse_input_hr, pack_output_hr
+
+"""
+Many-to-one matching (hospitals/residents) with hospital capacities and incomplete preference lists.
+An instance is n_hospitals, n_students, capacities, hospital_prefs, student_prefs:
+    capacities      ] dict of [hospital, number of students it can admit]
+    hospital_prefs  ] dict of [hospital, [the students it ranks, best first]]
+    student_prefs   ] dict of [student, [the hospitals it ranks, best first]]
+A hospital and a student can only be matched if both rank each other. Memory and time are proportional to the
+total length of the lists, instead of the n x n of gale_shapley() input.
+"""
+
+
+def hospital_residents(n_hospitals: int, n_students: int, capacities: Dict[int, int], hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], stats=None) -> Dict[int, List[int]]:
+    """
+    Input:
+        n_hospitals, n_students, capacities, hospital_prefs, student_prefs: see the module docstring
+        stats: optional MatchStats (see gale_shapley.py) to add this run's counters and timings to,
+               pair breaks count students evicted from a full hospital
+    Output:
+        A dict associating every hospital with the students it admitted, best first [hospital, [students]]
+        (empty dict if the input is invalid)
+    Students propose (the residency match convention), so the result is the student-optimal stable matching.
+    Every hospital keeps its admitted students in a heap keyed by rank, so the worst one is found in O(1)
+    and replaced in O(log capacity) when a better student applies to a full hospital.
+    """
+
+    ###### Initialization ######
+
+    start = time.perf_counter()
+    if not valid_hr_input(n_hospitals, n_students, capacities, hospital_prefs, student_prefs):
+        return {}
+    validated = time.perf_counter()
+
+    # hospital_rank[hospital][student] = position of student in hospital's list, only for the students it ranks
+    hospital_rank = [None] * (n_hospitals + 1)
+    for hospital in range(1, n_hospitals + 1):
+        hospital_rank[hospital] = {student: position for position, student in enumerate(hospital_prefs[hospital])}
+
+    # admitted[hospital] = min-heap of the negated ranks of its students, so admitted[hospital][0] is minus the worst rank
+    admitted = [[] for _ in range(n_hospitals + 1)]
+    capacity = [0] + [capacities[hospital] for hospital in range(1, n_hospitals + 1)]
+
+    # Index of the next hospital each student will apply to
+    next_proposal = [0] * (n_students + 1)
+    free_students = [student for student in range(n_students, 0, -1) if student_prefs[student]]
+    evictions = 0
+    initialized = time.perf_counter()
+
+
+    ###### Gale-Shapley ######
+
+    while free_students:
+        student = free_students.pop()
+        prefs = student_prefs[student]
+        position = next_proposal[student]
+
+        while position < len(prefs):
+            hospital = prefs[position]
+            position += 1
+
+            # The hospital doesn't consider students it didn't rank
+            rank = hospital_rank[hospital].get(student)
+            if rank is None:
+                continue
+
+            # Admit the student if there's room
+            heap = admitted[hospital]
+            if len(heap) < capacity[hospital]:
+                heappush(heap, -rank)
+                break
+
+            # Full hospital: replace its worst student if this one is better, the worst becomes free again
+            if rank < -heap[0]:
+                worst = -heapreplace(heap, -rank)
+                free_students.append(hospital_prefs[hospital][worst])
+                evictions += 1
+                break
+
+            # Hospital rejects the student
+
+        next_proposal[student] = position
+
+    assignment = {}
+    for hospital in range(1, n_hospitals + 1):
+        prefs = hospital_prefs[hospital]
+        assignment[hospital] = [prefs[-rank] for rank in sorted(admitted[hospital], reverse=True)]
+
+    if stats is not None:
+        stats.validation_time += validated - start
+        stats.init_time += initialized - validated
+        stats.loop_time += time.perf_counter() - initialized
+        stats.record(sum(map(len, admitted)), next_proposal[1:], evictions)
+
+    return assignment
+
+
+def main():
+    """
+    Runnable from command line:
+        python hospital_residents.py market.in [-o market.out] [--stats] [--verify]
+    The input is in the hospitals/residents input file format (text or binary, see data_helpers.py).
+    Writes the assignment in the hospitals/residents output file format to stdout, or to the -o file.
+    With --verify, the assignment is checked by verifier.hr_verifier() on the instance already in memory, the verdict
+    goes to stderr and the exit status is 1 unless it is valid and stable.
+    """
+    from gale_shapley import MatchStats
+
+    parser = argparse.ArgumentParser(description="Run many-to-one Gale-Shapley on a hospitals/residents instance.")
+    parser.add_argument("input", help="hospitals/residents input file")
+    parser.add_argument("-o", "--output", help="write the assignment to this file instead of stdout")
+    parser.add_argument("--stats", action="store_true", help="print proposal counters and timings to stderr")
+    parser.add_argument("--verify", action="store_true", help="verify the assignment, the verdict goes to stderr")
+    args = parser.parse_args()
+
+    instance = parse_input_hr(args.input)
+    if instance[0] < 1:
+        sys.exit(1)
+
+    stats = MatchStats() if args.stats else None
+    assignment = hospital_residents(*instance, stats=stats)
+    pack_output_hr(assignment, args.output or sys.stdout)
+
+    if stats is not None:
+        print(f"Stats: {stats.report()}", file=sys.stderr)
+
+    if args.verify:
+        from contextlib import redirect_stdout
+        from verifier import VerifierStats, hr_verifier
+        verifier_stats = VerifierStats() if args.stats else None
+        with redirect_stdout(sys.stderr):
+            stable = hr_verifier(*instance, assignment, stats=verifier_stats)
+        if verifier_stats is not None:
+            print(f"Verifier stats: {verifier_stats.report()}", file=sys.stderr)
+        if not stable:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+from typing import List, Dict, Optional, Tuple
+from data_helpers import valid_input, rank_table
+
+"""
+Incremental re-matching after small preference edits.
+
+A stable matching alone isn't enough to repair from: hospitals that were rejected along the way have to stay rejected
+only for as long as the rejection is still justified under the new preferences. So IncrementalMatcher keeps a log of
+the Gale-Shapley run it last performed, one event per proposal:
+    proposed_index[h][k]     ] index j of hospital h's k-th proposal in its student's received list
+    received_hospital[s][j]  ] hospital of the j-th proposal student s received
+    received_position[s][j]  ] position k of that proposal in the hospital's list
+    held[s][j]               ] index of the proposal student s holds after deciding on its j-th
+A proposal depends on the hospital's previous proposals, on the student's previous decisions, and on the proposal
+that displaced the hospital's previous pair. An edit invalidates the first event that would now go differently
+(the first changed entry of a hospital list, the first changed decision of a student) and everything that depends on it.
+The remaining events are a valid Gale-Shapley execution prefix under the new preferences, so resuming the proposals from
+that cut gives exactly the hospital-optimal matching a fresh gale_shapley() call would.
+"""
+
+
+class IncrementalMatcher:
+    """
+    Stateful hospital-proposing Gale-Shapley that can repair its matching after preference edits:
+        matcher = IncrementalMatcher(n, hospital_prefs, student_prefs)
+        matcher.pairings                                    # same pairs as gale_shapley()
+        matcher.update(hospital_edits={4: [...]}, student_edits={7: [...]})
+    After every call, invalidated is the number of logged proposals that had to be undone and proposals the number of
+    proposals made (for the constructor, the full run).
+    """
+
+    def __init__(self, n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]):
+        self.n = n
+        self.pairings = {}
+        self.invalidated = 0
+        self.proposals = 0
+        if not valid_input(n, hospital_prefs, student_prefs):
+            self.n = 0
+            return
+
+        # Copy input lists to avoid sharing them with the caller
+        self.hospital_prefs = {h: list(hospital_prefs[h]) for h in range(1, n + 1)}
+        self.student_rank = rank_table(n, student_prefs)
+
+        # Proposal log, see the module docstring
+        self.proposed_index = [[] for _ in range(n + 1)]
+        self.received_hospital = [[] for _ in range(n + 1)]
+        self.received_position = [[] for _ in range(n + 1)]
+        self.held = [[] for _ in range(n + 1)]
+
+        # paired_students[s] = hospital student s holds (0 = unpaired)
+        self.paired_students = [0] * (n + 1)
+
+        self._resume(list(range(n, 0, -1)))
+
+    def update(self, hospital_edits: Optional[Dict[int, List[int]]] = None, student_edits: Optional[Dict[int, List[int]]] = None) -> Dict[int, int]:
+        """
+        Replaces the given hospitals' / students' preference lists and repairs the matching.
+        Returns the new pairings (identical to gale_shapley() on the edited input), or {} if an edit is invalid.
+        """
+        hospital_edits = hospital_edits or {}
+        student_edits = student_edits or {}
+        n = self.n
+        if n == 0:
+            return {}
+
+        valid_keys = set(range(1, n + 1))
+        for side, edits in (("Hospital", hospital_edits), ("Student", student_edits)):
+            for agent, prefs in edits.items():
+                if agent not in valid_keys or len(prefs) != n or set(prefs) != valid_keys:
+                    print(f"Input Error: {side} {agent}'s preference list is not a permutation of 1..n.")
+                    return {}
+
+        # Find the first event each edit changes
+        seeds = []
+        old_prefs = {}
+        for hospital, prefs in hospital_edits.items():
+            old = self.hospital_prefs[hospital]
+            for k in range(len(self.proposed_index[hospital])):
+                if old[k] != prefs[k]:
+                    seeds.append((hospital, k))
+                    break
+            old_prefs[hospital] = old
+            self.hospital_prefs[hospital] = list(prefs)
+
+        for student, prefs in student_edits.items():
+            rank = [0] * (n + 1)
+            for position, hospital in enumerate(prefs):
+                rank[hospital] = position
+            received = self.received_hospital[student]
+            current = -1
+            for j, hospital in enumerate(received):
+                accept = current < 0 or rank[hospital] < rank[received[current]]
+                if accept != (self.held[student][j] == j):
+                    seeds.append((hospital, self.received_position[student][j]))
+                    break
+                if accept:
+                    current = j
+            self.student_rank[student] = rank
+
+        free_hospitals = self._invalidate(seeds, old_prefs)
+        self._resume(free_hospitals)
+        return self.pairings
+
+    def _invalidate(self, seeds: List[Tuple[int, int]], old_prefs: Dict[int, List[int]]) -> List[int]:
+        """
+        Undoes the seed proposals (hospital, k) and every logged proposal depending on them.
+        Returns the hospitals left free, ready for _resume().
+        """
+        hospital_cut = [len(proposed) for proposed in self.proposed_index]
+        student_cut = [len(received) for received in self.received_hospital]
+        touched_hospitals = set()
+        touched_students = set()
+
+        # Pending invalidations, ("h", hospital, k) undoes hospital's proposals k.., ("s", student, j) the student's decisions j..
+        pending = [("h", hospital, k) for hospital, k in seeds]
+        while pending:
+            side, agent, first = pending.pop()
+
+            if side == "h":
+                if first >= hospital_cut[agent]:
+                    continue
+                prefs = old_prefs.get(agent, self.hospital_prefs[agent])
+                for k in range(first, hospital_cut[agent]):
+                    pending.append(("s", prefs[k], self.proposed_index[agent][k]))
+                hospital_cut[agent] = first
+                touched_hospitals.add(agent)
+
+            else:
+                if first >= student_cut[agent]:
+                    continue
+                received = self.received_hospital[agent]
+                positions = self.received_position[agent]
+                held = self.held[agent]
+                for j in range(first, student_cut[agent]):
+                    # The proposal itself is undone, and if it displaced a hospital, so is that hospital's next proposal
+                    pending.append(("h", received[j], positions[j]))
+                    if held[j] == j and j > 0:
+                        displaced = held[j - 1]
+                        pending.append(("h", received[displaced], positions[displaced] + 1))
+                student_cut[agent] = first
+                touched_students.add(agent)
+
+        # Truncate the log to the cut and restore who holds whom
+        self.invalidated = 0
+        for student in touched_students:
+            cut = student_cut[student]
+            self.invalidated += len(self.received_hospital[student]) - cut
+            del self.received_hospital[student][cut:]
+            del self.received_position[student][cut:]
+            del self.held[student][cut:]
+            self.paired_students[student] = self.received_hospital[student][self.held[student][-1]] if cut else 0
+
+        free_hospitals = []
+        for hospital in touched_hospitals:
+            cut = hospital_cut[hospital]
+            del self.proposed_index[hospital][cut:]
+            student = self.hospital_prefs[hospital][cut - 1] if cut else 0
+            if cut and self.paired_students[student] == hospital:
+                self.pairings[hospital] = student
+            else:
+                free_hospitals.append(hospital)
+                self.pairings.pop(hospital, None)
+        return free_hospitals
+
+    def _resume(self, free_hospitals: List[int]):
+        """ Hospital-proposing Gale-Shapley from the logged state, recording every proposal. """
+        student_rank = self.student_rank
+        paired_students = self.paired_students
+        pairings = self.pairings
+        proposals = 0
+
+        while free_hospitals:
+            hospital = free_hospitals.pop()
+            prefs = self.hospital_prefs[hospital]
+            proposed = self.proposed_index[hospital]
+
+            while True:
+                # Propose to the next student and log it
+                k = len(proposed)
+                student = prefs[k]
+                received = self.received_hospital[student]
+                held = self.held[student]
+                proposed.append(len(received))
+                received.append(hospital)
+                self.received_position[student].append(k)
+                proposals += 1
+
+                # Student keeps the better of this hospital and the one it holds
+                old_hospital = paired_students[student]
+                rank = student_rank[student]
+                if old_hospital == 0 or rank[hospital] < rank[old_hospital]:
+                    held.append(len(received) - 1)
+                    paired_students[student] = hospital
+                    pairings[hospital] = student
+                    if old_hospital:
+                        pairings.pop(old_hospital, None)
+                        free_hospitals.append(old_hospital)
+                    break
+
+                held.append(held[-1])
+
+        self.proposals = proposals
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import signal
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from data_helpers import BINARY_MAGIC, parse_input_data, pack_output, percentile
+from gale_shapley import gale_shapley, ENGINES
+from verifier import VERIFIER_MODES
+
+"""
+Long-lived matching service, so callers don't pay interpreter startup per instance:
+    python match_service.py serve --unix /tmp/gs.sock
+    python match_service.py match data/example.in --unix /tmp/gs.sock --verify
+    python match_service.py stats --unix /tmp/gs.sock
+Requests and responses are one JSON header line, followed by a payload of exactly header["length"] bytes:
+    {"op": "match", "length": 42, "engine": "rank", "verify": "prefix"}    payload: G-S input, text or binary
+    -> {"ok": true, "length": 16, "n": 3, "cached": false, "verdict": "VALID STABLE"}    payload: G-S output
+    {"op": "stats", "length": 0}
+    -> {"ok": true, "length": 0, "requests": ..., "latency_ms": {"p50": ..., "p90": ..., "p99": ...}, ...}
+Errors come back as {"ok": false, "error": "..."} with an empty payload. "verify" is optional, one of VERIFIER_MODES.
+Instances are solved in a process pool. Small ones are micro-batched: they wait up to batch_delay seconds for
+others to share one pool task. Results are kept in an LRU cache keyed by a hash of the parsed instance
+(the same for text and binary input, and for every engine), so repeated instances are answered without touching the pool.
+"""
+
+
+# Payloads smaller than this are micro-batched, bigger ones get a pool task of their own
+SMALL_PAYLOAD = 1 << 16
+
+# Latencies kept for the percentiles
+LATENCY_WINDOW = 10_000
+
+
+def instance_key(data: bytes) -> str:
+    """
+    Cache key of a request: a hash of the instance itself, n and the preference values as little-endian int32
+    (the .gsb layout), so the same instance sent as text or binary is one entry. The engine isn't part of it,
+    every engine returns the same hospital-optimal matching.
+    Text that doesn't parse into 1 + 2n^2 int32 numbers can't be a valid instance, it's keyed by its raw bytes (in a separate namespace).
+    """
+    if data[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+        return hashlib.blake2b(data[len(BINARY_MAGIC):], digest_size=20).hexdigest()
+
+    try:
+        values = array("i", map(int, data.split()))
+    except (ValueError, OverflowError):
+        values = None
+    if not values or values[0] < 1 or len(values) != 1 + 2 * values[0] * values[0]:
+        return "raw:" + hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    if sys.byteorder == "big":
+        values.byteswap()
+    digest = hashlib.blake2b(struct.pack("<I", values[0]), digest_size=20)
+    digest.update(memoryview(values)[1:])
+    return digest.hexdigest()
+
+
+def solve(data: bytes, engine: str, verify: Optional[str]) -> Tuple[int, bytes, str]:
+    """
+    Parses, matches and optionally verifies one instance, in a worker process.
+    Returns n, the pairings in the G-S output file format, and the verifier's verdict ("" if not verified).
+    Everything printed is captured, on failure n is -1 and the verdict is the error message.
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            n, hospital_prefs, student_prefs = parse_input_data(data)
+            pairs = gale_shapley(n, hospital_prefs, student_prefs, engine=engine, validate=False) if n >= 1 else {}
+            if not pairs:
+                return -1, b"", log.getvalue().strip() or "no pairings"
+            output = io.BytesIO()
+            pack_output(pairs, output)
+            if not verify:
+                return n, output.getvalue(), ""
+            log.seek(0)
+            log.truncate()
+            _verify(n, hospital_prefs, student_prefs, pairs, verify)
+            return n, output.getvalue(), log.getvalue().strip()
+        except Exception as e: # keep one broken instance from taking the worker down
+            return -1, b"", f"{type(e).__name__}: {e}"
+
+
+def verify_output(data: bytes, output: bytes, verify: str) -> str:
+    """ Verifies cached pairings against their instance in a worker process, returns the verdict. """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        n, hospital_prefs, student_prefs = parse_input_data(data)
+        pairs = {}
+        for line in output.split(b"\n"):
+            if line:
+                hospital, student = map(int, line.split())
+                pairs[hospital] = student
+        log.seek(0)
+        log.truncate()
+        _verify(n, hospital_prefs, student_prefs, pairs, verify)
+    return log.getvalue().strip()
+
+
+def _verify(n, hospital_prefs, student_prefs, pairs, mode):
+    from verifier import verifier
+    verifier(n, hospital_prefs, student_prefs, pairs, mode=mode)
+
+
+def solve_batch(jobs: List[Tuple[bytes, str, Optional[str]]]) -> List[Tuple[int, bytes, str]]:
+    """ Worker entry point for a micro-batch of small instances. """
+    return [solve(*job) for job in jobs]
+
+
+class MatchService:
+    """
+    The service's state: process pool, micro-batch queue, LRU result cache and latency window.
+        service = MatchService(workers=4)
+        await service.serve(unix="/tmp/gs.sock")
+    """
+
+    def __init__(self, workers: int = 0, cache_size: int = 1024, batch_size: int = 64, batch_delay: float = 0.002):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.pool = None
+
+        # key -> (n, pairings, {verifier mode: verdict}), least recently used first
+        self.cache = OrderedDict()
+        # key -> future of a solve already running, so concurrent duplicates share it
+        self.in_flight = {}
+        # Small jobs waiting for the next micro-batch: (job, future)
+        self.queue = []
+        self.flush_handle = None
+
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"requests": 0, "errors": 0, "cache_hits": 0, "cache_misses": 0, "shared_in_flight": 0, "batches": 0, "batched_jobs": 0}
+
+    async def serve(self, unix: Optional[str] = None, host: str = "127.0.0.1", port: int = 8765):
+        """ Runs the server until cancelled, on the Unix socket unix if given, else on host:port. """
+        from concurrent.futures import ProcessPoolExecutor
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            if unix:
+                server = await asyncio.start_unix_server(self.handle_connection, path=unix, limit=SMALL_PAYLOAD)
+            else:
+                server = await asyncio.start_server(self.handle_connection, host, port, limit=SMALL_PAYLOAD)
+            print(f"Serving on {unix or f'{host}:{port}'} with {self.workers} workers", file=sys.stderr)
+            # SIGTERM shuts down cleanly like Ctrl-C, removing the socket
+            with contextlib.suppress(NotImplementedError):
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+            async with server:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            if unix and os.path.exists(unix):
+                os.unlink(unix)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Answers requests on one connection until the client closes it. """
+        try:
+            while True:
+                try:
+                    # readline() raises ValueError too, for a header line longer than the stream limit
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    header = _parse_header(line)
+                    payload = await reader.readexactly(header["length"])
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    await _send(writer, {"ok": False, "error": f"bad request: {e}"})
+                    break
+
+                if header.get("op") == "stats":
+                    await _send(writer, self.stats())
+                elif header.get("op") == "match":
+                    response, output = await self.match(payload, header.get("engine", "rank"), header.get("verify"))
+                    await _send(writer, response, output)
+                else:
+                    await _send(writer, {"ok": False, "error": f"unknown op {header.get('op')!r}, expected match or stats"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def match(self, data: bytes, engine: str = "rank", verify: Optional[str] = None) -> Tuple[Dict, bytes]:
+        """ Solves one instance (from the cache if possible), returns the response header and the pairings. """
+        start = time.perf_counter()
+        self.counters["requests"] += 1
+        if engine not in ENGINES or (verify and verify not in VERIFIER_MODES):
+            self.counters["errors"] += 1
+            return {"ok": False, "error": f"engine must be one of {', '.join(ENGINES)} and verify one of {', '.join(VERIFIER_MODES)}"}, b""
+
+        key = await asyncio.to_thread(instance_key, data) if len(data) >= SMALL_PAYLOAD else instance_key(data)
+        cached = key in self.cache
+        if cached:
+            self.counters["cache_hits"] += 1
+            self.cache.move_to_end(key)
+            n, output, verdicts = self.cache[key]
+        else:
+            self.counters["cache_misses"] += 1
+            if key in self.in_flight:
+                self.counters["shared_in_flight"] += 1
+            else:
+                self.in_flight[key] = asyncio.ensure_future(self._solve(key, data, engine, verify))
+            n, output, verdicts = await asyncio.shield(self.in_flight[key])
+
+        # Pairings cached (or solved for a concurrent request) without this verifier mode are verified now
+        if n >= 1 and verify and verify not in verdicts:
+            verdicts[verify] = await self._run(verify_output, data, output, verify)
+
+        if n < 1:
+            self.counters["errors"] += 1
+            response = {"ok": False, "error": verdicts.get("error", "invalid instance")}
+            output = b""
+        else:
+            response = {"ok": True, "n": n, "cached": cached}
+            if verify:
+                response["verdict"] = verdicts[verify]
+        self.latencies.append(time.perf_counter() - start)
+        return response, output
+
+    async def _solve(self, key: str, data: bytes, engine: str, verify: Optional[str]) -> Tuple[int, bytes, Dict[str, str]]:
+        """ Solves a cache miss and caches it (failures aren't cached). """
+        try:
+            if len(data) < SMALL_PAYLOAD:
+                n, output, verdict = await self._batched((data, engine, verify))
+            else:
+                n, output, verdict = await self._run(solve, data, engine, verify)
+        finally:
+            del self.in_flight[key]
+
+        if n < 1:
+            return n, b"", {"error": verdict}
+        verdicts = {verify: verdict} if verify else {}
+        self.cache[key] = (n, output, verdicts)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return n, output, verdicts
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+
+    def _batched(self, job: Tuple[bytes, str, Optional[str]]) -> asyncio.Future:
+        """ Queues a small job for the next micro-batch, sent when it's full or batch_delay after its first job. """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((job, future))
+        if len(self.queue) >= self.batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_delay, self._flush)
+        return future
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.queue = self.queue, []
+        if not batch:
+            return
+        self.counters["batches"] += 1
+        self.counters["batched_jobs"] += len(batch)
+
+        def deliver(task: asyncio.Future):
+            for i, (_, future) in enumerate(batch):
+                if future.cancelled():
+                    continue
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result()[i])
+
+        task = asyncio.ensure_future(self._run(solve_batch, [job for job, _ in batch]))
+        task.add_done_callback(deliver)
+
+    def stats(self) -> Dict:
+        """ Counters, cache size and latency percentiles (ms) over the last LATENCY_WINDOW requests. """
+        latencies = [seconds * 1000 for seconds in self.latencies]
+        response = {"ok": True, **self.counters, "cached_instances": len(self.cache), "workers": self.workers}
+        if latencies:
+            response["latency_ms"] = {f"p{q}": percentile(latencies, q) for q in (50, 90, 99)}
+            response["latency_ms"]["max"] = max(latencies)
+        return response
+
+
+def _parse_header(line: bytes) -> Dict:
+    """ Decodes a request header line, raises ValueError unless it's a JSON object with a non-negative integer "length" (0 if left out). """
+    header = json.loads(line)
+    if not isinstance(header, dict):
+        raise ValueError("header must be a JSON object")
+    length = header.setdefault("length", 0)
+    if type(length) is not int or length < 0:
+        raise ValueError('"length" must be a non-negative integer')
+    return header
+
+
+async def _send(writer: asyncio.StreamWriter, header: Dict, payload: bytes = b""):
+    header["length"] = len(payload)
+    writer.write(json.dumps(header).encode() + b"\n" + payload)
+    await writer.drain()
+
+
+async def request(header: Dict, payload: bytes = b"", unix: Optional[str] = None, host: str = "127.0.0.1", port: int = 8765) -> Tuple[Dict, bytes]:
+    """ Client side: sends one request to the service and returns the response header and payload. """
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await _send(writer, dict(header), payload)
+        response = json.loads(await reader.readline())
+        return response, await reader.readexactly(response.get("length", 0))
+    finally:
+        writer.close()
+
+
+def main():
+    """
+    Runnable from command line:
+        python match_service.py serve [--unix PATH | --host H --port P] [--workers 4] [--cache-size 1024]
+        python match_service.py match input.in [--engine array] [--verify [--verify-mode MODE]] [--unix PATH | --host H --port P]
+        python match_service.py stats [--unix PATH | --host H --port P]
+    match writes the pairings to stdout and the response header to stderr, "-" reads the instance from stdin.
+    """
+    parser = argparse.ArgumentParser(description="Long-lived Gale-Shapley matching service.")
+    parser.add_argument("command", choices=("serve", "match", "stats"))
+    parser.add_argument("input", nargs="?", default="-", help="G-S input file for match, text or binary (default: stdin)")
+    parser.add_argument("--unix", help="Unix socket path (default: TCP on --host / --port)")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: CPU count)")
+    parser.add_argument("--cache-size", type=int, default=1024, help="instances kept in the result cache (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=64, help="small instances per micro-batch (default: %(default)s)")
+    parser.add_argument("--batch-delay", type=float, default=0.002, help="seconds a micro-batch waits to fill up (default: %(default)s)")
+    parser.add_argument("--engine", choices=ENGINES, default="rank", help="matcher engine for match (default: %(default)s)")
+    parser.add_argument("--verify", action="store_true", help="verify the pairings, the verdict comes back in the response header")
+    parser.add_argument("--verify-mode", choices=VERIFIER_MODES, help="verifier mode for --verify (default: prefix)")
+    args = parser.parse_intermixed_args()
+    if args.verify_mode and not args.verify:
+        parser.error("--verify-mode needs --verify")
+    address = {"unix": args.unix, "host": args.host, "port": args.port}
+
+    if args.command == "serve":
+        service = MatchService(args.workers, args.cache_size, args.batch_size, args.batch_delay)
+        with contextlib.suppress(KeyboardInterrupt):
+            asyncio.run(service.serve(**address))
+        return
+
+    if args.command == "stats":
+        response, _ = asyncio.run(request({"op": "stats"}, **address))
+        print(json.dumps(response, indent=2))
+        return
+
+    if args.input == "-":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(args.input, "rb") as f:
+            data = f.read()
+    header = {"op": "match", "engine": args.engine}
+    if args.verify:
+        header["verify"] = args.verify_mode or "prefix"
+    response, output = asyncio.run(request(header, data, **address))
+    sys.stdout.buffer.write(output)
+    print(json.dumps(response), file=sys.stderr)
+    if not response.get("ok") or response.get("verdict", "VALID STABLE") != "VALID STABLE":
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+import numpy as np
+
+from verifier import VerifierStats, blocking_ranks, scan_hospitals
+
+"""
+Parallel blocking pair search for verifier(mode="parallel").
+The rank matrices from blocking_ranks() are copied once into a shared memory block:
+    [hospital_rank (n x n) | student_rank_t (n x n) | hospital_current (n) | student_current (n)], all int32
+Workers attach to it by name and each scans a contiguous range of hospitals. The lowest hospital with a blocking
+pair found so far is kept in a shared value, so shards after it stop at their next block and queued shards are
+cancelled, while shards before it keep going. The lowest shard's answer is the serial verifier's answer.
+"""
+
+
+# Set in every worker by _attach()
+_shared = None
+_ranks = None
+_found = None
+
+
+def find_blocking_pair_parallel(arrays, matches, workers: int = 0, stats: Optional[VerifierStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Takes a PreferenceArrays and a valid matches array (see preference_arrays.py).
+    Shards hospitals 1..n across worker processes (workers, default: CPU count), about four shards per worker.
+    Returns the first blocking pair (hospital, student) in hospital-major order, or None if the matching is stable.
+    """
+    start = time.perf_counter()
+    n = arrays.n
+    workers = workers or os.cpu_count() or 1
+
+    # Copy the rank matrices into shared memory so workers can read them without pickling
+    ranks = blocking_ranks(arrays, matches)
+    shared = shared_memory.SharedMemory(create=True, size=4 * (2 * n * n + 2 * n))
+    try:
+        for source, target in zip(ranks, _rank_views(shared, n)):
+            target[...] = source
+        del ranks
+
+        # Lowest hospital index (0-based) with a blocking pair so far, n = none found
+        found = multiprocessing.Value("i", n)
+        shard = -(-n // (workers * 4))
+        initialized = time.perf_counter()
+
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shared.name, n, found)) as pool:
+            futures = {pool.submit(_scan_shard, first, min(n, first + shard)): first for first in range(0, n, shard)}
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                blocking, inspected = future.result()
+                results.append((blocking, inspected))
+                if blocking is not None:
+                    # Shards that haven't started yet and come after this pair can't change the answer
+                    for other, first in futures.items():
+                        if first >= blocking[0]:
+                            other.cancel()
+    finally:
+        shared.close()
+        shared.unlink()
+
+    blocking_pairs = [blocking for blocking, _ in results if blocking is not None]
+    if stats is not None:
+        stats.init_time += initialized - start
+        stats.pairs_inspected += sum(inspected for _, inspected in results)
+        stats.search_time += time.perf_counter() - initialized
+    return min(blocking_pairs) if blocking_pairs else None
+
+
+def _rank_views(shared: shared_memory.SharedMemory, n: int) -> List[np.ndarray]:
+    """ Splits the shared block into hospital_rank, student_rank_t, hospital_current and student_current. """
+    flat = np.ndarray((2 * n * n + 2 * n,), dtype=np.int32, buffer=shared.buf)
+    return [flat[:n * n].reshape(n, n), flat[n * n:2 * n * n].reshape(n, n), flat[2 * n * n:2 * n * n + n], flat[2 * n * n + n:]]
+
+
+def _attach(name: str, n: int, found):
+    """ Worker initializer, maps the shared rank matrices. """
+    global _shared, _ranks, _found
+    _shared = shared_memory.SharedMemory(name=name)
+    _ranks = _rank_views(_shared, n)
+    _found = found
+
+
+def _scan_shard(first: int, last: int) -> Tuple[Optional[Tuple[int, int]], int]:
+    """ Scans hospitals first + 1..last, giving up once a lower hospital is known to block. """
+    blocking, inspected = scan_hospitals(*_ranks, first, last, stop=lambda start: _found.value < start)
+    if blocking is not None:
+        with _found.get_lock():
+            _found.value = min(_found.value, blocking[0] - 1)
+    return blocking, inspected
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+from typing import List, Dict, Tuple, NamedTuple, Iterator, Optional
+import numpy as np
+from data_helpers import INPUT_BUFFER_SIZE, BINARY_HEADER, BINARY_MAGIC, InputFormatError, input_rows, row_owner, read_binary_header, first_invalid_matrix_row, output_file, format_lines, VECTORIZE_MIN_VALUES
+
+"""
+Dense NumPy representation of a G-S instance.
+    hospital_prefs  ] n x n int32 matrix, row h - 1 is hospital h's preference list (values 1..n)
+    student_prefs   ] n x n int32 matrix, row s - 1 is student s's preference list (values 1..n)
+    student_rank    ] n x n int32 matrix, student_rank[s - 1, h - 1] = position of hospital h in student s's list
+Matchings are int32 arrays of length n, where matches[h - 1] is the student paired with hospital h (0 = unpaired).
+"""
+
+
+class PreferenceArrays(NamedTuple):
+    n: int
+    hospital_prefs: np.ndarray
+    student_prefs: np.ndarray
+    student_rank: np.ndarray
+    validated: bool = False # checked by validate_arrays(), or built from checked matrices (make_arrays(validated=True))
+
+
+def rank_matrix(prefs: np.ndarray) -> np.ndarray:
+    """
+    Takes an n x n matrix of preference lists (values 1..n).
+    Returns the inverse permutation of every row, so rank[i, j - 1] is the position of j in row i.
+    Equivalent to np.argsort(prefs - 1, axis=1) but scatters in O(n^2) instead of sorting.
+    """
+    n = prefs.shape[0]
+    rank = np.empty((n, n), dtype=np.int32)
+    positions = np.broadcast_to(np.arange(n, dtype=np.int32), (n, n))
+    np.put_along_axis(rank, prefs.astype(np.intp) - 1, positions, axis=1)
+    return rank
+
+
+def valid_arrays(n: int, hospital_prefs: np.ndarray, student_prefs: np.ndarray) -> bool:
+    """ Array counterpart of valid_input(): both matrices must be n x n with every row a permutation of 1..n. """
+    if n < 1:
+        print("Input Error: n must be at least 1.")
+        return False
+
+    if hospital_prefs.shape != (n, n) or student_prefs.shape != (n, n):
+        print("Input Error: Hospital/student count not equal to n.")
+        return False
+
+    for side, prefs in (("Hospital", hospital_prefs), ("Student", student_prefs)):
+        bad_row = first_invalid_matrix_row(n, prefs)
+        if bad_row is not None:
+            print(f"Input Error: {side} {bad_row + 1}'s preference list is not a permutation of 1..n.")
+            return False
+
+    return True
+
+
+def validate_arrays(arrays: PreferenceArrays) -> Optional[PreferenceArrays]:
+    """ Checks a PreferenceArrays once with valid_arrays(), returns it marked validated (so gale_shapley_array() skips it), or None. """
+    if arrays.validated:
+        return arrays
+    if not valid_arrays(arrays.n, arrays.hospital_prefs, arrays.student_prefs):
+        return None
+    return arrays._replace(validated=True)
+
+
+def make_arrays(n: int, hospital_prefs: np.ndarray, student_prefs: np.ndarray, validated: bool = False) -> PreferenceArrays:
+    """
+    Builds a PreferenceArrays from two n x n matrices of preference lists.
+    The matrices are converted to contiguous int32 (without copying if they already are) and the student rank matrix is computed.
+    Pass validated=True only for matrices that have already been checked.
+    """
+    hospital_prefs = np.ascontiguousarray(hospital_prefs, dtype=np.int32)
+    student_prefs = np.ascontiguousarray(student_prefs, dtype=np.int32)
+    return PreferenceArrays(n, hospital_prefs, student_prefs, rank_matrix(student_prefs), validated)
+
+
+def to_arrays(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> PreferenceArrays:
+    """ Converts gale_shapley() input into a PreferenceArrays. """
+    hospital_matrix = np.array([hospital_prefs[i] for i in range(1, n + 1)], dtype=np.int32).reshape(n, n)
+    student_matrix = np.array([student_prefs[i] for i in range(1, n + 1)], dtype=np.int32).reshape(n, n)
+    return make_arrays(n, hospital_matrix, student_matrix)
+
+
+def from_arrays(arrays: PreferenceArrays) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """ Converts a PreferenceArrays back into n, hospital_prefs, student_prefs matching gale_shapley() input. """
+    hospital_prefs = {i + 1: row for i, row in enumerate(arrays.hospital_prefs.tolist())}
+    student_prefs = {i + 1: row for i, row in enumerate(arrays.student_prefs.tolist())}
+    return arrays.n, hospital_prefs, student_prefs
+
+
+def pairs_to_array(n: int, pairs: Dict[int, int]) -> np.ndarray:
+    """ Converts gale_shapley() output into a matches array (hospitals missing from pairs are left as 0). """
+    matches = np.zeros(n, dtype=np.int32)
+    for hospital, student in pairs.items():
+        if 1 <= hospital <= n:
+            matches[hospital - 1] = student
+    return matches
+
+
+def pairs_from_array(matches: np.ndarray) -> Dict[int, int]:
+    """ Converts a matches array into gale_shapley() output, skipping unpaired hospitals. """
+    return {hospital: student for hospital, student in enumerate(matches.tolist(), start=1) if student != 0}
+
+
+def parse_input_arrays(input_file: str) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Array counterpart of parse_input(): streams the file and writes each row straight into preallocated n x n int32 matrices.
+    Every row is checked to be a permutation of 1..n as it is converted, errors carry the line number.
+    Returns n, hospital_prefs, student_prefs matrices, or -1, None, None on error.
+    """
+    try:
+        f = open(input_file, 'rb', buffering=INPUT_BUFFER_SIZE)
+    except FileNotFoundError:
+        print("Parse_Input Error: input file not found")
+        return -1, None, None
+    except OSError as e:
+        print(f"Parse_Input Error opening file: {e}")
+        return -1, None, None
+
+    try:
+        with f:
+            return _read_input_arrays_text(f)
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return -1, None, None
+
+
+def _read_input_arrays_text(f) -> Tuple[int, np.ndarray, np.ndarray]:
+    """ Reads a G-S input file from an open binary file object into int32 matrices, raises InputFormatError. """
+    rows = input_rows(f)
+    n = next(rows)
+    prefs = np.empty((2 * n, n), dtype=np.int32)
+
+    for row, (number, line) in enumerate(rows):
+        # Parse as int64 so out of range values can't wrap around into 1..n
+        try:
+            values = np.fromstring(line, dtype=np.int64, sep=" ")
+        except ValueError:
+            raise InputFormatError(f"line {number}: preferences must contain integers only")
+        if values.size != n or values.min() < 1 or values.max() > n or not np.bincount(values, minlength=n + 1)[1:].all():
+            raise InputFormatError(f"line {number}: {row_owner(n, row)}'s preference list is not a permutation of 1..n")
+        prefs[row] = values
+
+    return n, prefs[:n], prefs[n:]
+
+
+def load_input_binary(input_file: str, validate: bool = True) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Memory-maps a file in the G-S binary input file format (see data_helpers.py).
+    The returned matrices are read-only views of the file, nothing is copied or parsed.
+    Returns n, hospital_prefs, student_prefs matrices, or -1, None, None on error.
+    """
+    try:
+        with open(input_file, "rb") as f:
+            n = read_binary_header(f)
+        expected_size = BINARY_HEADER.size + 2 * n * n * 4
+        if os.path.getsize(input_file) != expected_size:
+            raise InputFormatError(f"expected {expected_size} bytes for n = {n}, got {os.path.getsize(input_file)}")
+        prefs = np.memmap(input_file, dtype="<i4", mode="r", offset=BINARY_HEADER.size, shape=(2 * n, n))
+    except FileNotFoundError:
+        print("Parse_Input Error: input file not found")
+        return -1, None, None
+    except OSError as e:
+        print(f"Parse_Input Error opening file: {e}")
+        return -1, None, None
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return -1, None, None
+
+    if validate and not valid_arrays(n, prefs[:n], prefs[n:]):
+        return -1, None, None
+
+    return n, prefs[:n], prefs[n:]
+
+
+def parse_input_arrays_data(data: bytes, fmt: Optional[str] = None) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Array counterpart of parse_input_data(), for a whole G-S input already in memory (e.g. all of stdin).
+    Binary input is viewed in place with np.frombuffer(), text is parsed by the same code as parse_input_arrays().
+    fmt is "text" or "binary", or None to tell them apart by the binary magic.
+    Returns n, hospital_prefs, student_prefs matrices (validated), or -1, None, None after printing the error.
+    """
+    if fmt is None:
+        fmt = "binary" if data[:len(BINARY_MAGIC)] == BINARY_MAGIC else "text"
+    if fmt not in ("text", "binary"):
+        print(f"Parse_Input Error: unknown format '{fmt}', expected text or binary")
+        return -1, None, None
+
+    try:
+        if fmt == "text":
+            return _read_input_arrays_text(io.BytesIO(data))
+        n = read_binary_header(io.BytesIO(data[:BINARY_HEADER.size]))
+        expected_size = BINARY_HEADER.size + 2 * n * n * 4
+        if len(data) != expected_size:
+            raise InputFormatError(f"expected {expected_size} bytes for n = {n}, got {len(data)}")
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return -1, None, None
+
+    prefs = np.frombuffer(data, dtype="<i4", count=2 * n * n, offset=BINARY_HEADER.size).reshape(2 * n, n)
+    if not valid_arrays(n, prefs[:n], prefs[n:]):
+        return -1, None, None
+    return n, prefs[:n], prefs[n:]
+
+
+def read_instance_arrays(source: str = "-", fmt: Optional[str] = None) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Array counterpart of read_instance(), for the command line tools' array paths: source is a file name
+    (binary files are memory-mapped by load_input_binary(), text ones parsed by parse_input_arrays()), or "-" to read
+    all of stdin in one bulk read. fmt is "text" or "binary", or None to tell them apart by the binary magic.
+    Returns n, hospital_prefs, student_prefs matrices (validated), or -1, None, None after printing the error.
+    """
+    if source == "-":
+        return parse_input_arrays_data(sys.stdin.buffer.read(), fmt)
+
+    if fmt is None:
+        try:
+            with open(source, "rb") as f:
+                fmt = "binary" if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC else "text"
+        except OSError:
+            fmt = "text" # parse_input_arrays() reports it
+    if fmt == "binary":
+        return load_input_binary(source)
+    return parse_input_arrays(source)
+
+
+def pack_input_binary(n: int, hospital_prefs: np.ndarray, student_prefs: np.ndarray, filename) -> str:
+    """
+    Writes two n x n preference matrices in the G-S binary input file format to filename
+    (a file name, "-" for stdout or an open file object, see output_file()), returns the file name.
+    """
+    with output_file(filename, filename) as (f, name):
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, n))
+        f.write(np.ascontiguousarray(hospital_prefs, dtype="<i4").data)
+        f.write(np.ascontiguousarray(student_prefs, dtype="<i4").data)
+    return name
+
+
+def format_rows(matrix: np.ndarray) -> Iterator[bytes]:
+    """
+    Formats a matrix of non-negative ints as lines of space separated numbers, a block of rows at a time.
+    Every number is looked up in a table of NUL-padded digit strings, laid out with its separator, and the padding is dropped,
+    so no per-number Python formatting happens. The table has an entry per value up to the largest number, so when that
+    is far above the number of values written (a few huge ids), the rows are joined by format_lines() instead.
+    """
+    rows, cols = matrix.shape
+    if rows == 0 or cols == 0:
+        return
+
+    # Blocks of roughly 4M numbers keep the byte buffers small
+    block = max(1, (1 << 22) // cols)
+    top = int(matrix.max())
+    if top >= max(matrix.size, VECTORIZE_MIN_VALUES):
+        for start in range(0, rows, block):
+            yield from format_lines(matrix[start:start + block].tolist())
+        return
+
+    table = np.array([str(i).encode() for i in range(top + 1)])
+    width = table.itemsize
+
+    for start in range(0, rows, block):
+        digits = table[matrix[start:start + block]].view(np.uint8).reshape(-1, cols, width)
+        out = np.empty((digits.shape[0], cols, width + 1), dtype=np.uint8)
+        out[:, :, :width] = digits
+        out[:, :, width] = ord(" ")
+        out[:, -1, width] = ord("\n")
+        yield out[out != 0].tobytes()
+
+
+def pack_input_text(n: int, hospital_prefs: np.ndarray, student_prefs: np.ndarray, filename) -> str:
+    """
+    Writes two n x n preference matrices in the G-S input file format to filename
+    (a file name, "-" for stdout or an open file object, see output_file()), returns the file name.
+    """
+    with output_file(filename, filename) as (f, name):
+        f.write(f"{n}\n".encode())
+        for prefs in (hospital_prefs, student_prefs):
+            for chunk in format_rows(prefs):
+                f.write(chunk)
+    return name
+
+
+def pack_output_array(matches: np.ndarray, filename=None) -> str:
+    """
+    Writes a matches array (see gale_shapley_array()) in the G-S output file format, skipping unpaired hospitals,
+    without building the pairs dict. Creates "data/n.out", or writes to filename instead if given
+    (a file name, "-" for stdout or an open file object, see output_file()). Returns the file name.
+    """
+    hospitals = np.flatnonzero(matches)
+    pairs = np.empty((len(hospitals), 2), dtype=np.int64)
+    pairs[:, 0] = hospitals + 1
+    pairs[:, 1] = matches[hospitals]
+
+    with output_file(filename, f"data/{len(matches)}.out") as (f, name):
+        for chunk in format_rows(pairs):
+            f.write(chunk)
+    return name
+
+
+def generate_input_arrays(n: int, seed: Optional[int] = None) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Array counterpart of generate_input(): all 2n random permutations of 1..n are drawn in one batched
+    numpy.random.Generator.permuted() call. The same seed always gives the same instance.
+    Returns n, hospital_prefs, student_prefs matrices.
+    """
+    rng = np.random.default_rng(seed)
+    prefs = np.tile(np.arange(1, n + 1, dtype=np.int32), (2 * n, 1))
+    rng.permuted(prefs, axis=1, out=prefs)
+    return n, prefs[:n], prefs[n:]
+
+
+INSTANCE_FAMILIES = ("uniform", "master", "noisy", "tiered", "adversarial")
+
+
+def generate_family_arrays(n: int, family: str = "uniform", seed: Optional[int] = None) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Generates an instance from one of INSTANCE_FAMILIES:
+        "uniform": independent random permutations, about n ln n proposals
+        "master": every hospital ranks students by one shared master list and vice versa, about n^2 / 2 proposals
+        "noisy": the master lists perturbed per agent with Gaussian noise (a cheap vectorized stand-in for Mallows)
+        "tiered": agents are split into popularity tiers, ranked tier by tier and randomly within a tier
+        "adversarial": the Gale-Shapley worst case, exactly n(n - 1) + 1 proposals
+    Returns n, hospital_prefs, student_prefs matrices, or -1, None, None for an unknown family.
+    """
+    if family == "uniform":
+        return generate_input_arrays(n, seed)
+    if family == "master":
+        return generate_master_list_arrays(n, seed)
+    if family == "noisy":
+        return generate_noisy_arrays(n, seed)
+    if family == "tiered":
+        return generate_tiered_arrays(n, seed)
+    if family == "adversarial":
+        return generate_adversarial_arrays(n, seed)
+
+    print(f"Input Error: unknown instance family '{family}', expected one of {', '.join(INSTANCE_FAMILIES)}.")
+    return -1, None, None
+
+
+def generate_master_list_arrays(n: int, seed: Optional[int] = None) -> Tuple[int, np.ndarray, np.ndarray]:
+    """ Every hospital shares one random ranking of the students, and every student one random ranking of the hospitals. """
+    rng = np.random.default_rng(seed)
+    hospital_master = rng.permutation(np.arange(1, n + 1, dtype=np.int32))
+    student_master = rng.permutation(np.arange(1, n + 1, dtype=np.int32))
+    return n, np.tile(hospital_master, (n, 1)), np.tile(student_master, (n, 1))
+
+
+def generate_noisy_arrays(n: int, seed: Optional[int] = None, noise: float = 0.1) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Master lists perturbed independently for every agent: an agent at position p of the master list gets
+    the sort key p + N(0, (noise * n)^2). noise = 0 gives "master", large noise approaches "uniform".
+    """
+    rng = np.random.default_rng(seed)
+    scale = noise * n
+    hospital_prefs = _rank_by_noisy_keys(n, rng.permutation(n).astype(np.float32), lambda shape: rng.standard_normal(shape, dtype=np.float32) * scale)
+    student_prefs = _rank_by_noisy_keys(n, rng.permutation(n).astype(np.float32), lambda shape: rng.standard_normal(shape, dtype=np.float32) * scale)
+    return n, hospital_prefs, student_prefs
+
+
+def generate_tiered_arrays(n: int, seed: Optional[int] = None, tiers: int = 4) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Agents are randomly split into equally sized popularity tiers. Every agent on the other side ranks
+    all of tier 0 first, then tier 1 and so on, in an independent random order within each tier.
+    """
+    rng = np.random.default_rng(seed)
+    tiers = max(1, min(tiers, n))
+    hospital_prefs = _rank_by_noisy_keys(n, (rng.permutation(n) * tiers // n).astype(np.float32), lambda shape: rng.random(shape, dtype=np.float32))
+    student_prefs = _rank_by_noisy_keys(n, (rng.permutation(n) * tiers // n).astype(np.float32), lambda shape: rng.random(shape, dtype=np.float32))
+    return n, hospital_prefs, student_prefs
+
+
+def generate_adversarial_arrays(n: int, seed: Optional[int] = None) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Worst case for hospital-proposing Gale-Shapley, every hospital but one is rejected by all students but its last choice.
+    With m = n - 1 and 0-based ids, hospital i < m ranks students i, i + 1, ..., (mod m) then student m, hospital m ranks like hospital 0,
+    and student j ranks hospitals j + 1, j + 2, ... (mod n). The seed relabels hospitals and students at random.
+    """
+    rng = np.random.default_rng(seed)
+    if n == 1:
+        return n, np.ones((1, 1), dtype=np.int32), np.ones((1, 1), dtype=np.int32)
+
+    m = n - 1
+    columns = np.arange(n)
+    shifts = np.arange(n)
+    shifts[m] = 0
+    hospital_prefs = np.where(columns < m, (shifts[:, None] + columns) % m, m)
+    student_prefs = (np.arange(n)[:, None] + 1 + columns) % n
+
+    # Relabel both sides, row i of the result belongs to agent relabel[i]
+    hospital_labels = rng.permutation(n)
+    student_labels = rng.permutation(n)
+    relabeled_hospitals = np.empty((n, n), dtype=np.int32)
+    relabeled_students = np.empty((n, n), dtype=np.int32)
+    relabeled_hospitals[hospital_labels] = student_labels[hospital_prefs] + 1
+    relabeled_students[student_labels] = hospital_labels[student_prefs] + 1
+    return n, relabeled_hospitals, relabeled_students
+
+
+def _rank_by_noisy_keys(n: int, base_keys: np.ndarray, noise) -> np.ndarray:
+    """
+    Builds n preference lists over agents 1..n, each sorting the agents by base_keys plus noise(shape) drawn fresh for every row.
+    Rows are generated in blocks so the float keys never take more than a few MB.
+    """
+    prefs = np.empty((n, n), dtype=np.int32)
+    block = max(1, (1 << 20) // n)
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        keys = base_keys + noise((stop - start, n))
+        prefs[start:stop] = np.argsort(keys, axis=1) + 1
+    return prefs
@@ -1,67 +1,231 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
 import time
-import matplotlib.pyplot as plt
+import tracemalloc
+from typing import List, Dict, Callable, Optional
 
-from verifier import verifier
-from gale_shapley import gale_shapley
-from data_helpers import generate_input
+from dataclasses import asdict
+from verifier import verifier, VERIFIER_MODES, VerifierStats
+from gale_shapley import gale_shapley, ENGINES, MatchStats
+from data_helpers import generate_input, percentile
+
+
+# n used by the original Task C graph
+DEFAULT_N = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+# The classic implementations are O(n^3), past this n they'd dominate the whole run
+CLASSIC_MAX_N = 256
+
+# Modules behind the command line tools, timed by --startup
+ENTRY_POINTS = ["gale_shapley", "verifier", "hospital_residents", "stable_lattice", "batch", "convert_input", "scalability"]
+
+# Dependencies that should only be imported when the selected engine or command needs them
+HEAVY_MODULES = ("numpy", "matplotlib", "multiprocessing")
+
+
+def measure(run: Callable[[], object], repeats: int, warmup: int) -> Dict[str, float]:
+    """
+    Times run() with time.perf_counter_ns after warmup untimed calls, then measures its peak memory
+    in one extra call under tracemalloc (kept out of the timed calls since tracing slows everything down).
+    Anything run() prints is swallowed so it doesn't end up in the timings or the report.
+    """
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(warmup):
+            run()
+
+        samples = []
+        for _ in range(repeats):
+            sink.seek(0)
+            sink.truncate()
+            start = time.perf_counter_ns()
+            run()
+            samples.append(time.perf_counter_ns() - start)
+
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(samples) / 1e6,
+        "p10_ms": percentile(samples, 10) / 1e6,
+        "p90_ms": percentile(samples, 90) / 1e6,
+        "min_ms": min(samples) / 1e6,
+        "peak_kib": peak / 1024,
+    }
+
+
+def collect_stats(run: Callable[[object], object], stats) -> Dict[str, float]:
+    """ Runs run(stats) once more with a fresh stats object and returns its counters and phase timings (in ms). """
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(stats)
+    counters = {}
+    for name, value in asdict(stats).items():
+        if isinstance(value, float):
+            counters[name.replace("_time", "_ms")] = value * 1000
+        else:
+            counters[name] = value
+    return counters
+
+
+def run_benchmarks(listN: List[int], families: List[str], engines: List[str], modes: List[str], repeats: int, warmup: int, seed: int, classic_max_n: int) -> List[Dict]:
+    """
+    Benchmarks every engine and verifier mode on one seeded instance per (family, n), returns one result row per measurement.
+    Every row also carries the MatchStats / VerifierStats of the measured call, with the phase timings in ms.
+    """
+    results = []
+    for family in families:
+        for n in listN:
+            n, hospital_prefs, student_prefs = generate_input(n, seed, family)
+            pairs = gale_shapley(n, hospital_prefs, student_prefs)
+
+            implementations = [("matcher", engine, MatchStats, lambda stats=None, engine=engine: gale_shapley(n, hospital_prefs, student_prefs, engine=engine, stats=stats)) for engine in engines]
+            implementations += [("verifier", mode, VerifierStats, lambda stats=None, mode=mode: verifier(n, hospital_prefs, student_prefs, pairs, mode=mode, stats=stats)) for mode in modes]
+
+            for kind, name, stats_type, run in implementations:
+                if name == "classic" and n > classic_max_n:
+                    continue
+                row = {"family": family, "n": n, "kind": kind, "implementation": name, "repeats": repeats}
+                row.update(measure(run, repeats, warmup))
+                counters = collect_stats(run, stats_type())
+                row.update(counters)
+                results.append(row)
+                work = f"proposals {counters['proposals']}" if kind == "matcher" else f"inspected {counters['pairs_inspected']}"
+                print(f"{family:>12} n={n:<6} {kind:>8} {name:<8} median {row['median_ms']:10.3f} ms  p90 {row['p90_ms']:10.3f} ms  peak {row['peak_kib']:10.0f} KiB  {work}")
+    return results
+
+
+def measure_startup(modules: List[str], repeats: int) -> List[Dict]:
+    """
+    Times a fresh interpreter importing each entry point module (python -X importtime -c "import module"),
+    plus an empty interpreter and a full matcher run on data/example.in for reference. Returns one result row per
+    measurement with the median / p90 wall time, the median import time and the heavy modules that got imported.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    example = os.path.join(here, "data", "example.in")
+    commands = [("interpreter", [sys.executable, "-X", "importtime", "-c", "pass"])]
+    commands += [(module, [sys.executable, "-X", "importtime", "-c", f"import {module}"]) for module in modules]
+    commands += [("gale_shapley.py example.in", [sys.executable, "-X", "importtime", os.path.join(here, "gale_shapley.py"), example])]
+
+    results = []
+    for name, command in commands:
+        wall = []
+        imports = []
+        for _ in range(repeats):
+            start = time.perf_counter_ns()
+            run = subprocess.run(command, cwd=here, capture_output=True, text=True)
+            wall.append(time.perf_counter_ns() - start)
+
+            # "import time: self [us] | cumulative | imported package", nested imports are indented under their importer
+            loaded = set()
+            total = 0
+            for line in run.stderr.splitlines():
+                if line.startswith("import time:") and not line.endswith("imported package"):
+                    _, cumulative, package = line[len("import time:"):].split("|")
+                    loaded.add(package.strip())
+                    if not package[1:].startswith(" "):
+                        total += int(cumulative)
+            imports.append(total / 1000)
+
+        heavy = sorted(module for module in HEAVY_MODULES if module in loaded)
+        row = {"kind": "startup", "implementation": name, "repeats": repeats,
+               "median_ms": statistics.median(wall) / 1e6, "p90_ms": percentile(wall, 90) / 1e6,
+               "import_ms": statistics.median(imports), "heavy_modules": " ".join(heavy)}
+        results.append(row)
+        print(f"{name:>28}  median {row['median_ms']:8.1f} ms  p90 {row['p90_ms']:8.1f} ms  imports {row['import_ms']:7.1f} ms  {row['heavy_modules'] or '-'}")
+    return results
+
+
+def plot_results(results: List[Dict], filename: str):
+    """ Saves a log-log plot of median runtime against n, one panel each for the matchers and verifiers. """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(1, 2, figsize=(12, 5))
+    for axis, kind in zip(axes, ("matcher", "verifier")):
+        lines = {}
+        for row in results:
+            if row["kind"] == kind:
+                lines.setdefault((row["implementation"], row["family"]), []).append((row["n"], row["median_ms"]))
+        for (name, family), points in sorted(lines.items()):
+            axis.plot([n for n, _ in points], [ms for _, ms in points], marker='o', label=f"{name} ({family})")
+        axis.set_xscale("log")
+        axis.set_yscale("log")
+        axis.grid(True)
+        axis.set_title("Runtimes of gale_shapley()" if kind == "matcher" else "Runtimes of verifier()")
+        axis.set_xlabel("Input \"n\"")
+        axis.set_ylabel("Median runtime (ms)")
+        axis.legend(fontsize="small")
+
+    figure.suptitle("Runtimes for gale_shapley() and verifier()")
+    figure.savefig(filename, dpi=120, bbox_inches="tight")
+    plt.close(figure)
+
+
+def write_results(results: List[Dict], json_path: Optional[str], csv_path: Optional[str]):
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if csv_path and results:
+        # Matcher and verifier rows carry different stats, the CSV gets the union of the columns
+        fieldnames = list(dict.fromkeys(name for row in results for name in row))
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(results)
 
 
 def main():
     """ (sara)
     Measures the running time of gale_shapley() and verifier() on progressively increasing n.
-    Graphs the run time of each function using matplotlib line graph, with n on the x-axis and run time on the y-axis.
+    Every engine and verifier mode is run on the same seeded instances, with warmup runs, repeated timings
+    (median / p10 / p90), peak memory and the MatchStats / VerifierStats counters reported per (family, n).
+    Runs headless: results go to stdout and optionally JSON / CSV, the graph is saved to a file.
+        python scalability.py --n 256,1024,4096,10000 --family uniform,master --json bench.json --plot bench.png
+    With --startup, times a fresh interpreter importing each command line tool instead (the cost every short-lived
+    matcher subprocess pays before reading its input), and reports which heavy dependencies got imported:
+        python scalability.py --startup --repeats 20
     """
-    
+    parser = argparse.ArgumentParser(description="Benchmark gale_shapley() engines and verifier() modes.")
+    parser.add_argument("--n", default=",".join(map(str, DEFAULT_N)), help="comma separated list of n (default: %(default)s)")
+    parser.add_argument("--family", default="uniform", help="comma separated instance families, see preference_arrays.INSTANCE_FAMILIES (default: %(default)s)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated gale_shapley() engines (default: %(default)s)")
+    parser.add_argument("--modes", default=",".join(VERIFIER_MODES), help="comma separated verifier() modes (default: %(default)s)")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per measurement (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before timing (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated instances (default: %(default)s)")
+    parser.add_argument("--classic-max-n", type=int, default=CLASSIC_MAX_N, help="skip the O(n^3) classic implementations above this n (default: %(default)s)")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--csv", help="write results to this CSV file")
+    parser.add_argument("--plot", help="save the runtime graph to this image file")
+    parser.add_argument("--startup", action="store_true", help="time interpreter startup and imports per entry point instead (uses --repeats)")
+    args = parser.parse_args()
+
+    if args.startup:
+        write_results(measure_startup(ENTRY_POINTS, args.repeats), args.json, args.csv)
+        return
+
     # Create a list of n to test.
-    listN = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
-
-    # Create lists to record runtimes of gale_shapley() and verifier().
-    listRunTimeGS = []
-    listRunTimeV = []
-
-    # Test each n and see how it affects runtime in gale_shapley() and verifier().
-    for n in listN:
-        # Get inputs for gale_shapley() and verifier().
-        tempTuple = generate_input(n)
-        hospitalPref = tempTuple[1]
-        studentPref = tempTuple[2]
-
-        dictGS = {}
-
-        # Start and stop timer for running gale_shapley() with specific input.
-        startGS = time.time()
-        dictGS = gale_shapley(n, hospitalPref, studentPref)
-        endGS = time.time()
-
-        # Start and stop timer for running verifier() with specific input.
-        startV = time.time()
-        verifier(n, hospitalPref, studentPref, dictGS)
-        endV = time.time()
-
-        # Calculate running time and store in listRunTimeGS and listRunTimeV.
-        runtimeGS = endGS - startGS
-        runtimeV = endV - startV
-        listRunTimeGS.append(runtimeGS)
-        listRunTimeV.append(runtimeV)
-
-    # Plot line graph of gale_shapley() runtimes.
-    plt.subplot(1, 2, 1)
-    plt.plot(listN, listRunTimeGS, color='blue', marker='o')
-    plt.grid(True)
-    plt.title("Runtimes of gale_shapley()")
-    plt.xlabel("Input \"n\"")
-    plt.ylabel("Runtime")
-
-    # Plot line graph of verifier() runtimes.
-    plt.subplot(1, 2, 2)
-    plt.plot(listN, listRunTimeV, color='red', marker='o')
-    plt.grid(True)
-    plt.title("Runtimes of verifier()")
-    plt.xlabel("Input \"n\"")
-    plt.ylabel("Runtime")
-
-    plt.suptitle("Runtimes for gale_shapley() and verifier()")
-    plt.show()
+    listN = [int(n) for n in args.n.split(",")]
+
+    results = run_benchmarks(listN, args.family.split(","), args.engines.split(","), args.modes.split(","),
+                             args.repeats, args.warmup, args.seed, args.classic_max_n)
+
+    write_results(results, args.json, args.csv)
+    if args.plot:
+        plot_results(results, args.plot)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import time
+from itertools import islice
+from typing import List, Dict, Tuple, NamedTuple, Optional
+import numpy as np
+from data_helpers import INPUT_BUFFER_SIZE, BINARY_MAGIC, SPARSE_BINARY_HEADER, SPARSE_BINARY_MAGIC, InputFormatError, row_owner, output_file, format_lines
+
+"""
+Sparse (CSR) representation of a G-S instance with incomplete preference lists.
+    hospital_offsets  ] n + 1 int64, hospital h's list is hospital_prefs[hospital_offsets[h - 1]:hospital_offsets[h]]
+    hospital_prefs    ] int32, every hospital's list (values 1..n) concatenated
+    student_offsets   ] n + 1 int64, same for students
+    student_prefs     ] int32, every student's list concatenated
+Memory and time are proportional to the number of ranked pairs instead of n^2. A hospital and a student can only be
+matched if both rank each other, so some agents may stay unpaired (0 in a matches array, see preference_arrays.py).
+Ranks are looked up in a RankIndex, the (row, value) keys of all entries in sorted order, by binary search.
+"""
+
+
+# Lines parsed per np.fromstring() call by the text parser
+SPARSE_TEXT_BLOCK = 1 << 16
+
+
+class SparsePreferences(NamedTuple):
+    n: int
+    hospital_offsets: np.ndarray
+    hospital_prefs: np.ndarray
+    student_offsets: np.ndarray
+    student_prefs: np.ndarray
+
+
+class RankIndex(NamedTuple):
+    """ keys[i] = row * (n + 1) + value for every list entry in sorted order, ranks[i] = its position in the row. """
+    n: int
+    keys: np.ndarray
+    ranks: np.ndarray
+
+
+def make_sparse(n: int, hospital_lengths: np.ndarray, hospital_prefs: np.ndarray, student_lengths: np.ndarray, student_prefs: np.ndarray) -> SparsePreferences:
+    """ Builds a SparsePreferences from per-row list lengths and the concatenated lists of both sides. """
+    return SparsePreferences(n, _offsets(hospital_lengths), np.ascontiguousarray(hospital_prefs, dtype=np.int32),
+                             _offsets(student_lengths), np.ascontiguousarray(student_prefs, dtype=np.int32))
+
+
+def to_sparse(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> SparsePreferences:
+    """ Converts gale_shapley()-style input, whose lists may be incomplete here, into a SparsePreferences. """
+    sides = []
+    for prefs in (hospital_prefs, student_prefs):
+        rows = [prefs.get(i, []) for i in range(1, n + 1)]
+        sides += [np.fromiter(map(len, rows), dtype=np.int64, count=n), np.fromiter((j for row in rows for j in row), dtype=np.int32)]
+    return make_sparse(n, *sides)
+
+
+def from_sparse(sparse: SparsePreferences) -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]]]:
+    """ Converts a SparsePreferences back into n, hospital_prefs, student_prefs dicts of (possibly incomplete) lists. """
+    sides = []
+    for offsets, prefs in ((sparse.hospital_offsets, sparse.hospital_prefs), (sparse.student_offsets, sparse.student_prefs)):
+        rows = np.split(prefs, offsets[1:-1])
+        sides.append({i + 1: row.tolist() for i, row in enumerate(rows)})
+    return sparse.n, sides[0], sides[1]
+
+
+def sparse_from_arrays(arrays) -> SparsePreferences:
+    """ Converts a PreferenceArrays (complete lists) into a SparsePreferences. """
+    return sparse_from_matrices(arrays.n, arrays.hospital_prefs, arrays.student_prefs)
+
+
+def sparse_from_matrices(n: int, hospital_prefs: np.ndarray, student_prefs: np.ndarray) -> SparsePreferences:
+    """ Converts two n x n preference matrices (complete lists) into a SparsePreferences, without copying int32 ones. """
+    lengths = np.full(n, n, dtype=np.int64)
+    return make_sparse(n, lengths, hospital_prefs.reshape(-1), lengths, student_prefs.reshape(-1))
+
+
+def _offsets(lengths: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def row_ids(offsets: np.ndarray) -> np.ndarray:
+    """ Row (0-based) of every entry of a CSR list. """
+    return np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+
+
+def rank_index(n: int, offsets: np.ndarray, prefs: np.ndarray) -> RankIndex:
+    """ Builds the RankIndex of one side's lists. """
+    rows = row_ids(offsets)
+    keys = rows * (n + 1) + prefs
+    order = np.argsort(keys, kind="stable")
+    positions = np.arange(prefs.size, dtype=np.int64) - offsets[rows]
+    return RankIndex(n, keys[order], positions[order].astype(np.int32))
+
+
+def lookup_ranks(index: RankIndex, rows: np.ndarray, values: np.ndarray, missing: int = -1) -> np.ndarray:
+    """ Position of values[i] in row rows[i] (0-based) for every i, or missing where the row doesn't rank it. """
+    keys = rows.astype(np.int64) * (index.n + 1) + values
+    ranks = np.full(keys.shape, missing, dtype=np.int32)
+    if index.keys.size == 0:
+        return ranks
+
+    # Searching in sorted order walks the index sequentially instead of jumping around it, over 10x faster on large inputs
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    found = np.minimum(np.searchsorted(index.keys, sorted_keys), index.keys.size - 1)
+    hit = index.keys[found] == sorted_keys
+    ranks[order[hit]] = index.ranks[found[hit]]
+    return ranks
+
+
+def valid_sparse(sparse: SparsePreferences) -> bool:
+    """ valid_input() for a SparsePreferences: well formed offsets, and every list free of duplicates and of values outside 1..n. """
+    n = sparse.n
+    if n < 1:
+        print("Input Error: n must be at least 1.")
+        return False
+
+    for side, offsets, prefs in (("Hospital", sparse.hospital_offsets, sparse.hospital_prefs), ("Student", sparse.student_offsets, sparse.student_prefs)):
+        if offsets.shape != (n + 1,) or offsets[0] != 0 or offsets[-1] != prefs.size or (np.diff(offsets) < 0).any():
+            print(f"Input Error: {side} list offsets don't match the {side.lower()} preferences.")
+            return False
+
+        bad = (prefs < 1) | (prefs > n)
+        if not bad.any():
+            keys = np.sort(row_ids(offsets) * (n + 1) + prefs)
+            duplicates = np.flatnonzero(keys[1:] == keys[:-1])
+            if duplicates.size == 0:
+                continue
+            bad_row = int(keys[duplicates[0]] // (n + 1))
+        else:
+            bad_row = int(np.searchsorted(offsets, np.flatnonzero(bad)[0], side="right")) - 1
+        print(f"Input Error: {side} {bad_row + 1}'s preference list contains duplicates or invalid entries.")
+        return False
+
+    return True
+
+
+def gale_shapley_sparse(sparse: SparsePreferences, validate: bool = True, stats=None) -> np.ndarray:
+    """ (finn)
+    Input:
+        sparse: SparsePreferences holding both sides' (possibly incomplete) lists
+        validate: check the lists with valid_sparse() first
+        stats: optional MatchStats (see gale_shapley.py) to add this run's counters and timings to
+    Output:
+        int32 array of length n where entry h - 1 is the student paired with hospital h (0 = unpaired),
+        the hospital-optimal stable matching (empty array if the input is invalid)
+    The rank every student gives every hospital proposing to it is looked up once, in bulk, before the main loop.
+    """
+
+    ###### Initialization ######
+
+    n = sparse.n
+    start = time.perf_counter()
+    if validate and not valid_sparse(sparse):
+        return np.zeros(0, dtype=np.int32)
+    validated = time.perf_counter()
+
+    # proposal_rank[k] = rank the student of hospital list entry k gives that hospital, n if it doesn't rank it
+    student_index = rank_index(n, sparse.student_offsets, sparse.student_prefs)
+    proposal_rank = lookup_ranks(student_index, sparse.hospital_prefs - 1, row_ids(sparse.hospital_offsets) + 1, missing=n)
+    del student_index
+
+    # Flat int32 views, indexing them yields plain Python ints without copying
+    hospital_prefs = memoryview(sparse.hospital_prefs).cast("B").cast("i")
+    ranks = memoryview(proposal_rank).cast("B").cast("i")
+
+    offsets = sparse.hospital_offsets.tolist()
+    next_proposal = offsets[:-1]
+    list_end = offsets[1:]
+    free_hospitals = list(range(n - 1, -1, -1))
+
+    # paired_students[s - 1] = hospital index (0-based) paired with student s, held_rank[s - 1] = the rank s gives it (n = unpaired)
+    paired_students = [-1] * n
+    held_rank = [n] * n
+    pair_breaks = 0
+    initialized = time.perf_counter()
+
+
+    ###### Gale-Shapley ######
+
+    while free_hospitals:
+        hospital = free_hospitals.pop()
+        position = next_proposal[hospital]
+        end = list_end[hospital]
+
+        # Hospitals that run out of students stay unpaired
+        while position < end:
+            student = hospital_prefs[position] - 1
+            rank = ranks[position]
+            position += 1
+
+            # Student takes the hospital if it ranks it above its current one (unranked hospitals never pass)
+            if rank < held_rank[student]:
+                old_hospital = paired_students[student]
+                paired_students[student] = hospital
+                held_rank[student] = rank
+                if old_hospital >= 0:
+                    free_hospitals.append(old_hospital)
+                    pair_breaks += 1
+                break
+
+        next_proposal[hospital] = position
+
+    paired = np.array(paired_students, dtype=np.int64)
+    students = np.flatnonzero(paired >= 0)
+    matches = np.zeros(n, dtype=np.int32)
+    matches[paired[students]] = students + 1
+
+    if stats is not None:
+        stats.validation_time += validated - start
+        stats.init_time += initialized - validated
+        stats.loop_time += time.perf_counter() - initialized
+        stats.record(students.size, [position - offset for position, offset in zip(next_proposal, offsets)], pair_breaks)
+
+    return matches
+
+
+def find_blocking_pair_sparse(sparse: SparsePreferences, matches: np.ndarray, stats=None) -> Optional[Tuple[int, int]]:
+    """
+    Takes a valid SparsePreferences and a matches array of mutually ranked pairs (0 = unpaired).
+    Every hospital list entry is tested at once: it blocks if the hospital ranks the student above its partner (or is unpaired)
+    and the student ranks the hospital above its partner (or is unpaired and ranks it at all).
+    Returns the first blocking pair (hospital, student) in hospital-major order, or None if the matching is stable.
+    """
+    start = time.perf_counter()
+    n = sparse.n
+
+    hospitals = row_ids(sparse.hospital_offsets)
+    students = sparse.hospital_prefs.astype(np.int64) - 1
+    positions = np.arange(students.size, dtype=np.int64) - sparse.hospital_offsets[hospitals]
+    proposal_rank = lookup_ranks(rank_index(n, sparse.student_offsets, sparse.student_prefs), students, hospitals + 1, missing=n)
+
+    # Rank each agent gives its partner (n = unpaired), read off the list entries of the matched pairs
+    matched = sparse.hospital_prefs == matches[hospitals]
+    hospital_current = np.full(n, n, dtype=np.int64)
+    hospital_current[hospitals[matched]] = positions[matched]
+    student_current = np.full(n, n, dtype=np.int64)
+    student_current[students[matched]] = proposal_rank[matched]
+    initialized = time.perf_counter()
+
+    blocking = np.flatnonzero((positions < hospital_current[hospitals]) & (proposal_rank < student_current[students]))
+    found = None
+    if blocking.size:
+        first = int((hospitals[blocking] * n + students[blocking]).min())
+        found = first // n + 1, first % n + 1
+
+    if stats is not None:
+        stats.init_time += initialized - start
+        stats.pairs_inspected += students.size
+        stats.search_time += time.perf_counter() - initialized
+    return found
+
+
+def parse_input_sparse(input_file: str, fmt: Optional[str] = None) -> Tuple[int, Optional[SparsePreferences]]:
+    """
+    Parses a file in the incomplete-list input file format, text or binary (told apart by the magic unless fmt is
+    "text" or "binary", see data_helpers.py). Rows are converted straight into the flat int32 lists, nothing n x n
+    is ever allocated. Returns n, SparsePreferences, or -1, None on error.
+    """
+    try:
+        f = open(input_file, 'rb', buffering=INPUT_BUFFER_SIZE)
+    except FileNotFoundError:
+        print("Parse_Input Error: input file not found")
+        return -1, None
+    except OSError as e:
+        print(f"Parse_Input Error opening file: {e}")
+        return -1, None
+
+    try:
+        with f:
+            if fmt is None:
+                fmt = "binary" if f.peek(len(SPARSE_BINARY_MAGIC))[:len(SPARSE_BINARY_MAGIC)] == SPARSE_BINARY_MAGIC else "text"
+            if fmt == "binary":
+                sparse = _read_sparse_binary(f, os.path.getsize(input_file))
+            else:
+                sparse = _read_sparse_text(f)
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return -1, None
+
+    if not valid_sparse(sparse):
+        return -1, None
+    return sparse.n, sparse
+
+
+def parse_input_sparse_data(data: bytes, fmt: Optional[str] = None) -> Tuple[int, Optional[SparsePreferences]]:
+    """
+    parse_input_sparse() for a whole input already in memory (e.g. all of stdin). A G-S binary file (complete lists)
+    is accepted too, and viewed as a SparsePreferences without copying.
+    Returns n, SparsePreferences (validated), or -1, None after printing the error.
+    """
+    if fmt is None:
+        fmt = "binary" if data[:len(SPARSE_BINARY_MAGIC)] in (SPARSE_BINARY_MAGIC, BINARY_MAGIC) else "text"
+    if fmt not in ("text", "binary"):
+        print(f"Parse_Input Error: unknown format '{fmt}', expected text or binary")
+        return -1, None
+
+    if fmt == "binary" and data[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+        from preference_arrays import parse_input_arrays_data
+        n, hospital_prefs, student_prefs = parse_input_arrays_data(data, fmt)
+        return (n, sparse_from_matrices(n, hospital_prefs, student_prefs)) if n >= 1 else (-1, None)
+
+    try:
+        if fmt == "binary":
+            sparse = _read_sparse_binary(io.BytesIO(data), len(data))
+        else:
+            sparse = _read_sparse_text(io.BytesIO(data))
+    except InputFormatError as e:
+        print(f"Parse_Input Error: {e}")
+        return -1, None
+
+    if not valid_sparse(sparse):
+        return -1, None
+    return sparse.n, sparse
+
+
+def read_instance_sparse(source: str = "-", fmt: Optional[str] = None) -> Tuple[int, Optional[SparsePreferences]]:
+    """
+    read_instance() for the command line tools' sparse paths: source is a file name, or "-" to read all of stdin
+    in one bulk read. Reads the incomplete-list formats, text or binary, and G-S binary files (complete lists,
+    memory-mapped by load_input_binary()). fmt is "text" or "binary", or None to tell them apart by the magic.
+    Returns n, SparsePreferences (validated), or -1, None after printing the error.
+    """
+    if source == "-":
+        return parse_input_sparse_data(sys.stdin.buffer.read(), fmt)
+
+    try:
+        with open(source, "rb") as f:
+            magic = f.read(len(BINARY_MAGIC))
+    except OSError:
+        magic = b"" # parse_input_sparse() reports it
+    if magic == BINARY_MAGIC and fmt != "text":
+        from preference_arrays import load_input_binary
+        n, hospital_prefs, student_prefs = load_input_binary(source)
+        return (n, sparse_from_matrices(n, hospital_prefs, student_prefs)) if n >= 1 else (-1, None)
+    return parse_input_sparse(source, fmt)
+
+
+def _read_sparse_text(f) -> SparsePreferences:
+    """
+    Reads the text incomplete-list format, blank lines after the first line are empty lists.
+    Rows are parsed a block of lines at a time: one np.fromstring() call for all the numbers, and the numbers per line
+    counted from where tokens start, so there's no per-line Python work unless a block has an error to report.
+    """
+    lines = enumerate(f, start=1)
+    header = next(((number, line) for number, line in lines if not line.isspace()), None)
+    if header is None:
+        raise InputFormatError("input file is empty")
+    try:
+        n = int(header[1])
+    except ValueError:
+        raise InputFormatError("first line must be an integer (n)")
+    if n <= 0:
+        raise InputFormatError("n must be positive")
+
+    lengths = []
+    blocks = []
+    rows = 0
+    while True:
+        block = list(islice(lines, SPARSE_TEXT_BLOCK))
+        if not block:
+            break
+        if rows + len(block) > 2 * n:
+            # Only blank lines may follow the last row
+            for number, line in block[2 * n - rows:]:
+                if not line.isspace():
+                    raise InputFormatError(f"line {number}: expected {2 * n} preference rows, got more")
+            block = block[:2 * n - rows]
+        if block:
+            block_lengths, values = _parse_rows(n, rows, block)
+            lengths.append(block_lengths)
+            blocks.append(values)
+            rows += len(block)
+
+    if rows != 2 * n:
+        raise InputFormatError(f"expected {2 * n} preference rows, got {rows}")
+    lengths = np.concatenate(lengths)
+    prefs = np.concatenate(blocks).astype(np.int32)
+    split = int(lengths[:n].sum())
+    return make_sparse(n, lengths[:n], prefs[:split], lengths[n:], prefs[split:])
+
+
+def _parse_rows(n: int, first_row: int, block: List[Tuple[int, bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Parses (line number, line) pairs of rows first_row.., returns the number of values per row and all values (int64). """
+    text = b"".join(line for _, line in block) + b"\n"
+    chars = np.frombuffer(text, dtype=np.uint8)
+    whitespace = (chars == ord(" ")) | (chars == ord("\t")) | (chars == ord("\r")) | (chars == ord("\n"))
+    token_starts = np.flatnonzero(~whitespace & np.concatenate(([True], whitespace[:-1])))
+    line_ends = np.flatnonzero(chars == ord("\n"))[:len(block)]
+    lengths = np.bincount(np.searchsorted(line_ends, token_starts), minlength=len(block))
+
+    # Parse as int64 so out of range values can't wrap around into 1..n
+    try:
+        values = np.fromstring(text, dtype=np.int64, sep=" ")
+    except ValueError:
+        values = None
+    if values is None or values.size != token_starts.size:
+        for number, line in block:
+            try:
+                np.fromstring(line, dtype=np.int64, sep=" ")
+            except ValueError:
+                raise InputFormatError(f"line {number}: preferences must contain integers only")
+        raise InputFormatError(f"line {block[0][0]}: preferences must contain integers only")
+
+    bad = np.flatnonzero((values < 1) | (values > n))
+    if bad.size:
+        row = int(np.searchsorted(np.cumsum(lengths), bad[0], side="right"))
+        raise InputFormatError(f"line {block[row][0]}: {row_owner(n, first_row + row)}'s preference list contains values outside 1..n")
+    return lengths, values
+
+
+def _read_sparse_binary(f, size: int) -> SparsePreferences:
+    """ Reads the binary incomplete-list format. """
+    header = f.read(SPARSE_BINARY_HEADER.size)
+    if len(header) != SPARSE_BINARY_HEADER.size:
+        raise InputFormatError("input file is too short for an incomplete-list binary header")
+    magic, n = SPARSE_BINARY_HEADER.unpack(header)
+    if magic != SPARSE_BINARY_MAGIC:
+        raise InputFormatError("not an incomplete-list binary file (bad magic)")
+    if n <= 0:
+        raise InputFormatError("n must be positive")
+
+    lengths = f.read(8 * n)
+    if len(lengths) != 8 * n:
+        raise InputFormatError(f"expected {2 * n} non-negative list lengths")
+    lengths = np.frombuffer(lengths, dtype="<i4").astype(np.int64)
+    if (lengths < 0).any():
+        raise InputFormatError(f"expected {2 * n} non-negative list lengths")
+    expected_size = SPARSE_BINARY_HEADER.size + 4 * (2 * n + int(lengths.sum()))
+    if size != expected_size:
+        raise InputFormatError(f"expected {expected_size} bytes for these list lengths, got {size}")
+
+    prefs = np.frombuffer(f.read(), dtype="<i4")
+    split = int(lengths[:n].sum())
+    return make_sparse(n, lengths[:n], prefs[:split], lengths[n:], prefs[split:])
+
+
+def pack_input_sparse(sparse: SparsePreferences, filename, fmt: str = "text") -> str:
+    """
+    Writes a SparsePreferences in the incomplete-list input file format (or binary with fmt="binary") to filename
+    (a file name, "-" for stdout or an open file object, see output_file()), returns the file name.
+    """
+    n = sparse.n
+    if fmt == "binary":
+        with output_file(filename, filename) as (f, name):
+            f.write(SPARSE_BINARY_HEADER.pack(SPARSE_BINARY_MAGIC, n))
+            f.write(np.concatenate([np.diff(sparse.hospital_offsets), np.diff(sparse.student_offsets)]).astype("<i4").data)
+            f.write(sparse.hospital_prefs.astype("<i4").data)
+            f.write(sparse.student_prefs.astype("<i4").data)
+        return name
+
+    with output_file(filename, filename) as (f, name):
+        f.write(f"{n}\n".encode())
+        for offsets, prefs in ((sparse.hospital_offsets, sparse.hospital_prefs), (sparse.student_offsets, sparse.student_prefs)):
+            for chunk in format_lines(row.tolist() for row in np.split(prefs, offsets[1:-1])):
+                f.write(chunk)
+    return name
+
+
+def generate_sparse(n: int, list_length: int = 20, seed: Optional[int] = None) -> SparsePreferences:
+    """
+    Random instance where every hospital ranks list_length random students (at most n), and every student ranks
+    exactly the hospitals that ranked it, in random order. The same seed always gives the same instance.
+    """
+    rng = np.random.default_rng(seed)
+    length = min(n, list_length)
+
+    # Random distinct students per hospital, redrawing the rows that picked a student twice
+    if 4 * length > n:
+        hospital_prefs = np.argsort(rng.random((n, n)), axis=1)[:, :length] + 1
+    else:
+        hospital_prefs = rng.integers(1, n + 1, size=(n, length), dtype=np.int64)
+        while True:
+            ordered = np.sort(hospital_prefs, axis=1)
+            clash = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+            if not clash.any():
+                break
+            hospital_prefs[clash] = rng.integers(1, n + 1, size=(int(clash.sum()), length), dtype=np.int64)
+    hospital_prefs = hospital_prefs.ravel()
+
+    # Students rank their applicants in random order
+    hospitals = np.repeat(np.arange(1, n + 1, dtype=np.int64), length)
+    order = np.lexsort((rng.random(hospitals.size), hospital_prefs))
+    student_prefs = hospitals[order]
+    student_lengths = np.bincount(hospital_prefs - 1, minlength=n)
+
+    return make_sparse(n, np.full(n, length, dtype=np.int64), hospital_prefs, student_lengths, student_prefs)
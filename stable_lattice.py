@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from bisect import bisect_left
+from collections import deque
+from typing import List, Dict, Iterator, NamedTuple, Optional, Tuple
+from gale_shapley import propose
+from data_helpers import valid_input, read_input, rank_table
+
+"""
+The lattice of all stable matchings of a G-S instance, through its rotation poset.
+Starting from the hospital-optimal matching, a rotation (h_0, s_0), ..., (h_k-1, s_k-1) moves every h_i to s_i+1
+(indices mod k), each hospital to its next stable partner and each student to a better one, and ends at the
+student-optimal matching. Every stable matching is the hospital-optimal one with exactly the rotations of a
+down-set of the poset applied (a set that holds every predecessor of each of its rotations), so:
+    - the stable matchings are enumerated by walking the down-sets, one rotation decision at a time
+    - the egalitarian matching is a minimum weight down-set, i.e. a minimum cut
+    - the minimum regret matching is the smallest down-set that keeps every agent within some rank, binary searched
+Finding the rotations and their precedences takes O(n^2) (Gusfield & Irving, "The Stable Marriage Problem", ch. 3).
+Ranks are positions in preference lists (0 = first choice).
+"""
+
+
+class Rotation(NamedTuple):
+    pairs: List[Tuple[int, int]] # (hospital, student) pairs before the rotation, hospital i moves to the student of pair i + 1
+    weight: int # change of the egalitarian cost (sum of both sides' ranks) when the rotation is applied
+
+
+class RotationPoset:
+    """
+    Rotations of one instance and how they depend on each other:
+        poset = RotationPoset(n, hospital_prefs, student_prefs)
+        for matching in poset.matchings():   # lazily, hospital-optimal first
+            ...
+        poset.egalitarian(), poset.minimum_regret()
+    rotations are in the order they were found, which is a topological order of the poset, and
+    predecessors[r] are the indices of the rotations that have to be applied before rotations[r].
+    All matchings are [hospital, student] dicts sorted by hospital, like extreme_matchings() output.
+    """
+
+    def __init__(self, n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]):
+        self.n = n
+        self.rotations = []
+        self.predecessors = []
+        self.hospital_optimal = {}
+        self.student_optimal = {}
+        if not valid_input(n, hospital_prefs, student_prefs):
+            self.n = 0
+            return
+
+        self.hospital_prefs = hospital_prefs
+        self.student_prefs = student_prefs
+        self.hospital_rank = rank_table(n, hospital_prefs)
+        self.student_rank = rank_table(n, student_prefs)
+
+        self.hospital_optimal = dict(sorted(propose(n, hospital_prefs, self.student_rank).items()))
+        self.student_optimal = dict(sorted((hospital, student) for student, hospital in propose(n, student_prefs, self.hospital_rank).items()))
+
+        self._find_rotations()
+        self._find_predecessors()
+
+    def _find_rotations(self):
+        """
+        Walks from the hospital-optimal matching to the student-optimal one, eliminating one exposed rotation at a time.
+        A hospital h's next student s(h) is the first student after its partner that prefers h to her own partner,
+        and next(h) is that student's partner. Following next() from any hospital not yet at its student-optimal partner
+        runs into a cycle, which is an exposed rotation. The walk is kept on a stack, so after eliminating the cycle
+        it continues from what's left of it, and candidate pointers only ever move forward: O(n^2) in total.
+        """
+        n = self.n
+        hospital_prefs = self.hospital_prefs
+        student_rank = self.student_rank
+        last = [0] + [self.student_optimal[hospital] for hospital in range(1, n + 1)]
+
+        # Current matching both ways, and the position in hospital h's list where the search for s(h) resumes
+        partner = [0] + [self.hospital_optimal[hospital] for hospital in range(1, n + 1)]
+        held_by = [0] * (n + 1)
+        for hospital in range(1, n + 1):
+            held_by[partner[hospital]] = hospital
+        candidate = [0] + [self.hospital_rank[hospital][partner[hospital]] + 1 for hospital in range(1, n + 1)]
+
+        def next_student(hospital: int) -> int:
+            # Students skipped here preferred their partner, and students' partners only get better, so they stay skipped
+            prefs = hospital_prefs[hospital]
+            position = candidate[hospital]
+            while True:
+                student = prefs[position]
+                rank = student_rank[student]
+                if rank[hospital] < rank[held_by[student]]:
+                    candidate[hospital] = position
+                    return student
+                position += 1
+
+        stack = []
+        on_stack = [False] * (n + 1)
+        for first in range(1, n + 1):
+            while True:
+                if not stack:
+                    if partner[first] == last[first]:
+                        break
+                    stack.append(first)
+                    on_stack[first] = True
+
+                hospital = stack[-1]
+                following = held_by[next_student(hospital)]
+                if not on_stack[following]:
+                    stack.append(following)
+                    on_stack[following] = True
+                    continue
+
+                # The walk closed a cycle: stack[start:] is an exposed rotation, eliminate it
+                start = len(stack) - 1
+                while stack[start] != following:
+                    start -= 1
+                members = stack[start:]
+                del stack[start:]
+
+                pairs = [(member, partner[member]) for member in members]
+                for i, (member, _) in enumerate(pairs):
+                    on_stack[member] = False
+                    student = pairs[(i + 1) % len(pairs)][1]
+                    partner[member] = student
+                    held_by[student] = member
+                    candidate[member] = self.hospital_rank[member][student] + 1
+                self.rotations.append(Rotation(pairs, self._weight(pairs)))
+
+    def _weight(self, pairs: List[Tuple[int, int]]) -> int:
+        """ Change of the sum of both sides' ranks when the rotation is applied. """
+        weight = 0
+        for i, (hospital, student) in enumerate(pairs):
+            next_hospital, next_student = pairs[(i + 1) % len(pairs)]
+            weight += self.hospital_rank[hospital][next_student] - self.hospital_rank[hospital][student]
+            weight += self.student_rank[next_student][hospital] - self.student_rank[next_student][next_hospital]
+        return weight
+
+    def _find_predecessors(self):
+        """
+        Explicit precedences, whose transitive closure is the rotation poset:
+            - rotations moving the same hospital are ordered the way they move it
+            - if a rotation moves h past a student s, the rotation that took s to a partner she prefers to h comes first
+        Each student's moves are kept as (rank of her new partner, rotation), so the second kind is one binary search.
+        """
+        n = self.n
+        predecessors = [set() for _ in self.rotations]
+
+        # Rotations that moved each hospital / student, in order, and the ranks of the partners students moved to
+        hospital_moves = [[] for _ in range(n + 1)]
+        student_moves = [[] for _ in range(n + 1)]
+        student_ranks = [[] for _ in range(n + 1)]
+        for index, rotation in enumerate(self.rotations):
+            for i, (hospital, _) in enumerate(rotation.pairs):
+                hospital_moves[hospital].append(index)
+                student = rotation.pairs[(i + 1) % len(rotation.pairs)][1]
+                student_moves[student].append(index)
+                student_ranks[student].append(-self.student_rank[student][hospital])
+
+        initial = {student: hospital for hospital, student in self.hospital_optimal.items()}
+        for moves in hospital_moves:
+            for earlier, later in zip(moves, moves[1:]):
+                predecessors[later].add(earlier)
+
+        for index, rotation in enumerate(self.rotations):
+            for i, (hospital, student) in enumerate(rotation.pairs):
+                prefs = self.hospital_prefs[hospital]
+                stop = self.hospital_rank[hospital][rotation.pairs[(i + 1) % len(rotation.pairs)][1]]
+                for skipped in prefs[self.hospital_rank[hospital][student] + 1:stop]:
+                    # First move that took the skipped student above this hospital, unless she started out above it
+                    rank = self.student_rank[skipped]
+                    if rank[initial[skipped]] < rank[hospital]:
+                        continue
+                    move = bisect_left(student_ranks[skipped], -rank[hospital])
+                    predecessors[index].add(student_moves[skipped][move])
+
+        predecessors = [sorted(earlier - {index}) for index, earlier in enumerate(predecessors)]
+        self.predecessors = predecessors
+
+    def apply(self, rotations) -> Dict[int, int]:
+        """ The stable matching reached by applying the given rotations (indices of a down-set) to the hospital-optimal matching. """
+        partner = dict(self.hospital_optimal)
+        for index in sorted(rotations):
+            pairs = self.rotations[index].pairs
+            for i, (hospital, _) in enumerate(pairs):
+                partner[hospital] = pairs[(i + 1) % len(pairs)][1]
+        return partner
+
+    def matchings(self) -> Iterator[Dict[int, int]]:
+        """
+        Yields every stable matching exactly once, starting with the hospital-optimal one.
+        Rotations are decided in topological order, left out first, and one is only applied when its predecessors are,
+        so every branch ends in a down-set. Memory stays O(n^2) however many matchings there are.
+        """
+        if self.n == 0:
+            return
+
+        k = len(self.rotations)
+        successors = [[] for _ in range(k)]
+        for index, earlier in enumerate(self.predecessors):
+            for predecessor in earlier:
+                successors[predecessor].append(index)
+        missing = [len(earlier) for earlier in self.predecessors]
+
+        partner = [0] + [self.hospital_optimal[hospital] for hospital in range(1, self.n + 1)]
+        hospitals = range(1, self.n + 1)
+
+        # state[i]: 0 = undecided, 1 = left out, 2 = applied
+        state = [0] * (k + 1)
+        depth = 0
+        while depth >= 0:
+            if depth == k:
+                yield {hospital: partner[hospital] for hospital in hospitals}
+                depth -= 1
+            elif state[depth] == 0:
+                state[depth] = 1
+                depth += 1
+            elif state[depth] == 1 and missing[depth] == 0:
+                state[depth] = 2
+                pairs = self.rotations[depth].pairs
+                for i, (hospital, _) in enumerate(pairs):
+                    partner[hospital] = pairs[(i + 1) % len(pairs)][1]
+                for successor in successors[depth]:
+                    missing[successor] -= 1
+                depth += 1
+            else:
+                if state[depth] == 2:
+                    for hospital, student in self.rotations[depth].pairs:
+                        partner[hospital] = student
+                    for successor in successors[depth]:
+                        missing[successor] += 1
+                state[depth] = 0
+                depth -= 1
+
+    def egalitarian(self) -> Dict[int, int]:
+        """ Stable matching with the smallest sum of both sides' ranks, from a minimum weight down-set. """
+        if self.n == 0:
+            return {}
+        return self.apply(_minimum_closure([rotation.weight for rotation in self.rotations], self.predecessors))
+
+    def minimum_regret(self) -> Dict[int, int]:
+        """
+        Stable matching minimizing the worst rank any agent gives its partner.
+        Keeping every rank within t means applying, for every student, the rotation that takes her within t (with its
+        predecessors), while applying no rotation that takes a hospital past t. The smallest such down-set exists
+        exactly when t is feasible, and feasibility is monotone in t, so t is binary searched.
+        """
+        if self.n == 0:
+            return {}
+        low, high = 0, self.n - 1
+        best = None
+        while low <= high:
+            t = (low + high) // 2
+            rotations = self._within(t)
+            if rotations is None:
+                low = t + 1
+            else:
+                best, high = rotations, t - 1
+        return self.apply(best)
+
+    def _within(self, t: int) -> Optional[set]:
+        """ Smallest down-set whose matching keeps every rank within t, or None if there's none. """
+        required = []
+        forbidden = set()
+
+        # Students: the first rotation taking each one to a partner ranked within t has to be applied
+        if any(self.student_rank[student][hospital] > t for hospital, student in self.student_optimal.items()):
+            return None
+        if any(self.hospital_rank[hospital][student] > t for hospital, student in self.hospital_optimal.items()):
+            return None
+
+        student_partner = {student: hospital for hospital, student in self.hospital_optimal.items()}
+        for index, rotation in enumerate(self.rotations):
+            for i, (hospital, student) in enumerate(rotation.pairs):
+                next_student = rotation.pairs[(i + 1) % len(rotation.pairs)][1]
+                if self.hospital_rank[hospital][next_student] > t:
+                    forbidden.add(index)
+                if self.student_rank[next_student][student_partner[next_student]] > t >= self.student_rank[next_student][hospital]:
+                    required.append(index)
+                student_partner[next_student] = hospital
+
+        # Close the required rotations under predecessors
+        chosen = set(required)
+        pending = list(required)
+        while pending:
+            for predecessor in self.predecessors[pending.pop()]:
+                if predecessor not in chosen:
+                    chosen.add(predecessor)
+                    pending.append(predecessor)
+        return None if chosen & forbidden else chosen
+
+
+def _minimum_closure(weights: List[int], predecessors: List[List[int]]) -> set:
+    """
+    Minimum weight set of nodes closed under predecessors, as the source side of a minimum cut (Picard's reduction):
+    source -> node with capacity -weight for negative weights, node -> sink with capacity weight for positive ones,
+    and an uncuttable node -> predecessor edge. Max flow by Dinic's algorithm.
+    """
+    k = len(weights)
+    source, sink = k, k + 1
+    infinity = sum(abs(weight) for weight in weights) + 1
+
+    # Edge i and i ^ 1 are each other's reverse
+    head = [-1] * (k + 2)
+    to = []
+    capacity = []
+    link = []
+
+    def add_edge(u: int, v: int, c: int):
+        for a, b, cap in ((u, v, c), (v, u, 0)):
+            to.append(b)
+            capacity.append(cap)
+            link.append(head[a])
+            head[a] = len(to) - 1
+
+    for node, weight in enumerate(weights):
+        if weight < 0:
+            add_edge(source, node, -weight)
+        elif weight > 0:
+            add_edge(node, sink, weight)
+        for predecessor in predecessors[node]:
+            add_edge(node, predecessor, infinity)
+
+    while True:
+        # BFS levels from the source over edges with capacity left
+        level = [-1] * (k + 2)
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            edge = head[u]
+            while edge >= 0:
+                if capacity[edge] > 0 and level[to[edge]] < 0:
+                    level[to[edge]] = level[u] + 1
+                    queue.append(to[edge])
+                edge = link[edge]
+        if level[sink] < 0:
+            break
+
+        # Blocking flow with iterative DFS, current[u] is the next edge of u to try
+        current = list(head)
+        while True:
+            path = []
+            u = source
+            while u != sink:
+                edge = current[u]
+                while edge >= 0 and not (capacity[edge] > 0 and level[to[edge]] == level[u] + 1):
+                    edge = link[edge]
+                current[u] = edge
+                if edge < 0:
+                    if u == source:
+                        break
+                    # Dead end: never come back here this phase, retreat one edge
+                    level[u] = -1
+                    u = to[path.pop() ^ 1]
+                    continue
+                path.append(edge)
+                u = to[edge]
+            if u != sink:
+                break
+            pushed = min(capacity[edge] for edge in path)
+            for edge in path:
+                capacity[edge] -= pushed
+                capacity[edge ^ 1] += pushed
+
+    # Source side of the minimum cut
+    chosen = {source}
+    queue = deque([source])
+    while queue:
+        u = queue.popleft()
+        edge = head[u]
+        while edge >= 0:
+            if capacity[edge] > 0 and to[edge] not in chosen:
+                chosen.add(to[edge])
+                queue.append(to[edge])
+            edge = link[edge]
+    chosen.discard(source)
+    return chosen
+
+
+def stable_matchings(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]]) -> Iterator[Dict[int, int]]:
+    """ Yields every stable matching of the instance lazily, see RotationPoset.matchings(). """
+    return RotationPoset(n, hospital_prefs, student_prefs).matchings()
+
+
+def main():
+    """
+    Runnable from command line, reads an instance like gale_shapley.py (a file, or stdin in one bulk read, text or binary):
+        cat input.in | python stable_lattice.py [--all | --limit 100] [--egalitarian] [--minimum-regret]
+        python stable_lattice.py input.gsb --all
+    Prints the number of rotations, then the requested matchings in the G-S output file format, one block each.
+    Errors go to stderr. If stdin is a terminal and no input file is given, prompts (on stderr) for the instance.
+    """
+    from contextlib import redirect_stdout
+    from data_helpers import read_instance
+
+    parser = argparse.ArgumentParser(description="Enumerate the stable matchings of an instance read from a file or stdin.")
+    parser.add_argument("input", nargs="?", default="-", help="G-S input file, text or binary (default: stdin)")
+    parser.add_argument("--format", choices=("text", "binary"), help="input format (default: detected from the binary magic)")
+    parser.add_argument("--all", action="store_true", help="print every stable matching")
+    parser.add_argument("--limit", type=int, default=0, help="print at most this many stable matchings")
+    parser.add_argument("--egalitarian", action="store_true", help="print the egalitarian stable matching")
+    parser.add_argument("--minimum-regret", action="store_true", help="print the minimum regret stable matching")
+    args = parser.parse_args()
+
+    with redirect_stdout(sys.stderr):
+        if args.input == "-" and sys.stdin.isatty():
+            n, hospital_prefs, student_prefs = read_input()
+        else:
+            n, hospital_prefs, student_prefs = read_instance(args.input, args.format)
+        if n < 1:
+            sys.exit(1)
+        poset = RotationPoset(n, hospital_prefs, student_prefs)
+    if poset.n == 0:
+        sys.exit(1)
+    print(f"----- {len(poset.rotations)} Rotations -----")
+
+    blocks = []
+    if args.all or args.limit:
+        for count, matching in enumerate(poset.matchings(), start=1):
+            blocks.append((f"Stable Matching {count}", matching))
+            if count == args.limit:
+                break
+    if args.egalitarian:
+        blocks.append(("Egalitarian Pairings", poset.egalitarian()))
+    if args.minimum_regret:
+        blocks.append(("Minimum Regret Pairings", poset.minimum_regret()))
+
+    for title, matching in blocks:
+        print(f"----- {title} -----")
+        for hospital, student in matching.items():
+            print(f"{hospital} {student}")
+
+
+if __name__ == "__main__":
+    main()
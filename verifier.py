@@ -1,20 +1,128 @@
 #!/usr/bin/env python3
+import argparse
 import os
-from typing import List, Dict
-from gale_shapley import gale_shapley
-from data_helpers import read_input, read_pairs, parse_input, parse_output
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
+from data_helpers import read_input, read_pairs, parse_input, parse_output, rank_table, valid_hr_input
 
 
-def verifier(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], pairs: Dict[int, int]) -> bool:
+VERIFIER_MODES = ("prefix", "array", "parallel", "sparse", "classic")
+
+
+@dataclass
+class VerifierStats:
+    """ Opt-in work counters and timings, added to by verifier() when passed as stats. """
+    pairs_inspected: int = 0 # (hospital, student) candidates compared against the student's current partner
+    check_time: float = 0.0 # seconds spent on the validity checks
+    init_time: float = 0.0 # building rank tables / matrices
+    search_time: float = 0.0 # searching for a blocking pair
+
+    def report(self) -> str:
+        return (f"pairs inspected {self.pairs_inspected}, validity check {self.check_time * 1000:.3f} ms, "
+                f"init {self.init_time * 1000:.3f} ms, blocking pair search {self.search_time * 1000:.3f} ms")
+
+
+def verifier(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], pairs: Dict[int, int], mode: str = "prefix", stats: Optional[VerifierStats] = None) -> bool:
     """ (sara)
     Takes in n, hospital_prefs, student_prefs matching gale_shapley() input, and pairs matching gale_shapley() output.
     Validity: Verifies that each hospital and each student is matched exactly once.
     Stability: Verifies that all pairings are stable, with no blocking pairs.
+    mode picks how blocking pairs are searched for, one of VERIFIER_MODES:
+        "prefix": per hospital, only checks the students it ranks above its current match, early-exits on the first unstable hospital
+        "array": builds rank matrices once and compares them with NumPy broadcasting, O(n^2) (needs numpy)
+        "parallel": the "array" comparison sharded by hospital ranges across worker processes (see parallel_verifier.py)
+        "sparse": converts the input to SparsePreferences and tests every ranked pair at once (needs numpy)
+        "classic": the original pair-by-pair scan using list.index(), O(n^3)
 
     Prints either "VALID STABLE" if no blocking pairs and returns True,
     or "UNSTABLE [hospital, student]" for the first found blocking pair and returns False,
     or "INVALID (reason)" if the matching or input is invalid and returns False.
     If both "UNSTABLE" and "INVALID", we'll output the first one to appear. 
+    Every mode reports the same blocking pair: the lowest hospital, then the lowest student for that hospital.
+    If stats is given, the number of candidate pairs inspected and the time spent per phase are added to it.
+    """
+
+    if mode not in VERIFIER_MODES:
+        print(f"Input Error: unknown verifier mode '{mode}', expected one of {', '.join(VERIFIER_MODES)}.")
+        return False
+
+    if stats is None:
+        stats = VerifierStats()
+
+    start = time.perf_counter()
+    reversePairs = check_pairs(n, pairs)
+    stats.check_time += time.perf_counter() - start
+    if reversePairs is None:
+        return False
+
+    if mode == "prefix":
+        blocking = _find_blocking_pair_prefix(n, hospital_prefs, student_prefs, pairs, reversePairs, stats)
+    elif mode == "classic":
+        blocking = _find_blocking_pair_classic(n, hospital_prefs, student_prefs, pairs, reversePairs, stats)
+    elif mode == "sparse":
+        from sparse_preferences import to_sparse, find_blocking_pair_sparse
+        from preference_arrays import pairs_to_array
+        start = time.perf_counter()
+        sparse = to_sparse(n, hospital_prefs, student_prefs)
+        stats.init_time += time.perf_counter() - start
+        blocking = find_blocking_pair_sparse(sparse, pairs_to_array(n, pairs), stats)
+    else:
+        from preference_arrays import to_arrays
+        start = time.perf_counter()
+        arrays = to_arrays(n, hospital_prefs, student_prefs)
+        stats.init_time += time.perf_counter() - start
+        blocking = _find_blocking_pair_arrays(arrays, pairs, mode, stats)
+
+    return _report(blocking)
+
+
+def verifier_array(arrays, pairs: Dict[int, int], mode: str = "array", stats: Optional[VerifierStats] = None) -> bool:
+    """
+    verifier() on a PreferenceArrays (see preference_arrays.py) that is already built, e.g. parsed straight into int32 matrices,
+    so no dicts or rank tables are built from it. mode is "array" or "parallel", prints and returns the same as verifier().
+    """
+    if mode not in ("array", "parallel"):
+        print(f"Input Error: unknown verifier mode '{mode}', expected array or parallel.")
+        return False
+
+    if stats is None:
+        stats = VerifierStats()
+
+    start = time.perf_counter()
+    reversePairs = check_pairs(arrays.n, pairs)
+    stats.check_time += time.perf_counter() - start
+    if reversePairs is None:
+        return False
+
+    return _report(_find_blocking_pair_arrays(arrays, pairs, mode, stats))
+
+
+def _find_blocking_pair_arrays(arrays, pairs: Dict[int, int], mode: str, stats: VerifierStats) -> Optional[Tuple[int, int]]:
+    """ The "array" and "parallel" modes' blocking pair search, on valid pairs. """
+    from preference_arrays import pairs_to_array
+    if mode == "parallel":
+        from parallel_verifier import find_blocking_pair_parallel
+        return find_blocking_pair_parallel(arrays, pairs_to_array(arrays.n, pairs), stats=stats)
+    return find_blocking_pair_array(arrays, pairs_to_array(arrays.n, pairs), stats)
+
+
+def _report(blocking: Optional[Tuple[int, int]]) -> bool:
+    """ Prints verifier()'s verdict for valid pairs, given the blocking pair found (if any). """
+    if blocking is not None:
+        print("UNSTABLE [" + str(blocking[0]) + ", " + str(blocking[1]) + "]")
+        return False
+
+    # If made it here, matchings are valid and stable.
+    print("VALID STABLE")
+    return True
+
+
+def check_pairs(n: int, pairs: Dict[int, int]) -> Optional[Dict[int, int]]:
+    """
+    Validity half of verifier(): each hospital 1..n and each student 1..n must be matched exactly once.
+    Prints "INVALID (reason)" and returns None if not, otherwise returns the reverse of pairs ([student, hospital]).
     """
 
     # Since a dict maps one key to one value, each hospital and student are matched once unless the hospital/student is a duplicate or missing.
@@ -22,10 +130,10 @@ def verifier(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[i
     # Check if there is a missing hospital in the final matchings.
     if(len(pairs) < n):
         print("INVALID (Missing Hospital)")
-        return False
+        return None
     
-    # List to keep track of which students we've visited.
-    visitedStudents = []
+    # Set to keep track of which students we've visited.
+    visitedStudents = set()
 
     # Create a dict that is reverse of pairs (matching with format (student, hospital)).
     reversePairs = {}
@@ -36,18 +144,270 @@ def verifier(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[i
         # If this student was visited before, then this is a duplicate student and invalid. Else, we add student to visitedStudents.
         if(student in visitedStudents):
             print("INVALID (Duplicate Student in Final Matchings) ")
-            return False
+            return None
         else:
-            visitedStudents.append(student)
+            visitedStudents.add(student)
 
         # We also check if the value of student == 0. If it is, this is our way to represent that a student is null/missing.
         if student == 0:
             print("INVALID (Missing Student for Hospital: " + str(hospital) + ")")
-            return False
+            return None
+
+        # Hospitals and students outside 1..n can't be part of the matching.
+        if not 1 <= hospital <= n:
+            print("INVALID (Unknown Hospital: " + str(hospital) + ")")
+            return None
+        if not 1 <= student <= n:
+            print("INVALID (Unknown Student for Hospital: " + str(hospital) + ")")
+            return None
 
         # Add matching to reversePairs
         reversePairs[student] = hospital
 
+    return reversePairs
+
+
+def _find_blocking_pair_prefix(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], pairs: Dict[int, int], reversePairs: Dict[int, int], stats: VerifierStats) -> Optional[Tuple[int, int]]:
+    """
+    A hospital can only block with a student it ranks above its current match, so only that prefix of its list is checked.
+    On Gale-Shapley output the prefixes hold exactly the rejected proposals, so the search is proportional to the proposal count.
+    Returns the first blocking pair (hospital, student) in hospital-major order, or None.
+    """
+
+    start = time.perf_counter()
+
+    # student_rank[student][hospital] = position of hospital in student's preference list
+    student_rank = rank_table(n, student_prefs)
+
+    # Rank each student gives its current hospital.
+    currentRank = [0] * (n + 1)
+    for student, hospital in reversePairs.items():
+        currentRank[student] = student_rank[student][hospital]
+
+    initialized = time.perf_counter()
+    stats.init_time += initialized - start
+
+    inspected = 0
+    for hospital in range(1, n + 1):
+        currentStudent = pairs[hospital]
+
+        # Walk the students this hospital prefers over its current assignment, keeping the lowest numbered blocking one.
+        blockingStudent = 0
+        for student in hospital_prefs[hospital]:
+            if student == currentStudent:
+                break
+            inspected += 1
+            if student_rank[student][hospital] < currentRank[student] and (blockingStudent == 0 or student < blockingStudent):
+                blockingStudent = student
+
+        if blockingStudent:
+            stats.pairs_inspected += inspected
+            stats.search_time += time.perf_counter() - initialized
+            return hospital, blockingStudent
+
+    stats.pairs_inspected += inspected
+    stats.search_time += time.perf_counter() - initialized
+    return None
+
+
+def find_blocking_pair_array(arrays, matches, stats: Optional[VerifierStats] = None) -> Optional[Tuple[int, int]]:
+    """
+    Takes a PreferenceArrays and a valid matches array (see preference_arrays.py).
+    Compares hospital and student rank matrices with NumPy broadcasting, a block of hospitals at a time.
+    Returns the first blocking pair (hospital, student) in hospital-major order, or None if the matching is stable.
+    """
+    start = time.perf_counter()
+    ranks = blocking_ranks(arrays, matches)
+    initialized = time.perf_counter()
+
+    found, inspected = scan_hospitals(*ranks, 0, arrays.n)
+
+    if stats is not None:
+        stats.init_time += initialized - start
+        stats.pairs_inspected += inspected
+        stats.search_time += time.perf_counter() - initialized
+    return found
+
+
+def blocking_ranks(arrays, matches) -> Tuple:
+    """
+    Builds what scan_hospitals() compares, all int32:
+        hospital_rank[h - 1, s - 1] = position of student s in hospital h's list
+        student_rank_t[h - 1, s - 1] = position of hospital h in student s's list (hospital-major copy of arrays.student_rank)
+        hospital_current[h - 1] / student_current[s - 1] = rank each agent gives its current partner
+    """
+    import numpy as np
+    from preference_arrays import rank_matrix
+
+    n = arrays.n
+    rows = np.arange(n)
+    hospital_rank = rank_matrix(arrays.hospital_prefs)
+    student_rank_t = np.ascontiguousarray(arrays.student_rank.T)
+
+    partners = np.empty(n, dtype=np.intp)
+    partners[matches.astype(np.intp) - 1] = rows
+    hospital_current = hospital_rank[rows, matches.astype(np.intp) - 1]
+    student_current = arrays.student_rank[rows, partners]
+    return hospital_rank, student_rank_t, hospital_current, student_current
+
+
+def scan_hospitals(hospital_rank, student_rank_t, hospital_current, student_current, first: int, last: int, stop=None) -> Tuple[Optional[Tuple[int, int]], int]:
+    """
+    Searches hospitals first + 1..last for a blocking pair, a block of hospitals at a time.
+    stop(hospital index) is checked before every block, returning True ends the search early.
+    Returns the first blocking pair (hospital, student) in hospital-major order or None, and the number of pairs compared.
+    """
+    n = student_rank_t.shape[1]
+    inspected = 0
+
+    # Blocks of roughly 4M comparisons keep the boolean temporaries small
+    block = max(1, (1 << 22) // n)
+    for start in range(first, last, block):
+        if stop is not None and stop(start):
+            break
+        stop_row = min(last, start + block)
+        blocking = (hospital_rank[start:stop_row] < hospital_current[start:stop_row, None]) & (student_rank_t[start:stop_row] < student_current[None, :])
+        inspected += blocking.size
+        if blocking.any():
+            row, student = divmod(int(blocking.argmax()), n)
+            return (start + row + 1, student + 1), inspected
+
+    return None, inspected
+
+
+def sparse_verifier(sparse, pairs: Dict[int, int], stats: Optional[VerifierStats] = None) -> bool:
+    """
+    verifier() for a SparsePreferences (see sparse_preferences.py), where lists may be incomplete and agents may stay unpaired.
+    Validity: every hospital and student is matched at most once, and only to an agent it ranks and that ranks it.
+    Stability: no hospital and student that rank each other both prefer each other to their partners (or are unpaired).
+    Prints and returns like verifier(), the blocking pair reported is the lowest hospital, then the lowest student.
+    """
+    import numpy as np
+    from sparse_preferences import valid_sparse, rank_index, lookup_ranks, find_blocking_pair_sparse
+
+    if stats is None:
+        stats = VerifierStats()
+
+    start = time.perf_counter()
+    n = sparse.n
+    if not valid_sparse(sparse):
+        return False
+
+    visitedStudents = set()
+    for hospital, student in pairs.items():
+        if not 1 <= hospital <= n:
+            print("INVALID (Unknown Hospital: " + str(hospital) + ")")
+            return False
+        if not 1 <= student <= n:
+            print("INVALID (Unknown Student for Hospital: " + str(hospital) + ")")
+            return False
+        if student in visitedStudents:
+            print("INVALID (Duplicate Student in Final Matchings) ")
+            return False
+        visitedStudents.add(student)
+
+    # Both sides have to rank each other
+    matches = np.zeros(n, dtype=np.int32)
+    matches[np.fromiter(pairs.keys(), dtype=np.int64, count=len(pairs)) - 1] = np.fromiter(pairs.values(), dtype=np.int32, count=len(pairs))
+    hospitals = np.flatnonzero(matches)
+    students = matches[hospitals].astype(np.int64) - 1
+    unacceptable = (lookup_ranks(rank_index(n, sparse.hospital_offsets, sparse.hospital_prefs), hospitals, students + 1) < 0) \
+        | (lookup_ranks(rank_index(n, sparse.student_offsets, sparse.student_prefs), students, hospitals + 1) < 0)
+    if unacceptable.any():
+        first = int(np.flatnonzero(unacceptable)[0])
+        print("INVALID (Unacceptable Pair: " + str(hospitals[first] + 1) + ", " + str(students[first] + 1) + ")")
+        return False
+    stats.check_time += time.perf_counter() - start
+
+    blocking = find_blocking_pair_sparse(sparse, matches, stats)
+    if blocking is not None:
+        print("UNSTABLE [" + str(blocking[0]) + ", " + str(blocking[1]) + "]")
+        return False
+
+    print("VALID STABLE")
+    return True
+
+
+def hr_verifier(n_hospitals: int, n_students: int, capacities: Dict[int, int], hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], assignment: Dict[int, List[int]], stats: Optional[VerifierStats] = None) -> bool:
+    """
+    verifier() for the hospitals/residents model, takes hospital_residents() input and output.
+    Validity: every student is admitted at most once, only by a hospital it ranks and that ranks it, and no hospital is over capacity.
+    Stability: no hospital and student that rank each other would both rather be matched together, where a hospital
+    wants any acceptable student while it has room, and otherwise one it ranks above its worst admitted student.
+    Prints and returns like verifier(), the blocking pair reported is the lowest hospital, then the lowest student.
+    """
+    if stats is None:
+        stats = VerifierStats()
+
+    start = time.perf_counter()
+    if not valid_hr_input(n_hospitals, n_students, capacities, hospital_prefs, student_prefs):
+        return False
+
+    # hospital_rank[hospital][student] / student_rank[student][hospital] = position in the list, for ranked agents only
+    hospital_rank = [None] + [{student: position for position, student in enumerate(hospital_prefs[hospital])} for hospital in range(1, n_hospitals + 1)]
+    student_rank = [None] + [{hospital: position for position, hospital in enumerate(student_prefs[student])} for student in range(1, n_students + 1)]
+
+    # assigned[student] = hospital that admitted student (0 = unassigned)
+    assigned = [0] * (n_students + 1)
+    for hospital, students in assignment.items():
+        if not 1 <= hospital <= n_hospitals:
+            print("INVALID (Unknown Hospital: " + str(hospital) + ")")
+            return False
+        if len(students) > capacities[hospital]:
+            print("INVALID (Hospital Over Capacity: " + str(hospital) + ")")
+            return False
+        for student in students:
+            if not 1 <= student <= n_students:
+                print("INVALID (Unknown Student for Hospital: " + str(hospital) + ")")
+                return False
+            if assigned[student]:
+                print("INVALID (Duplicate Student in Final Matchings) ")
+                return False
+            if student not in hospital_rank[hospital] or hospital not in student_rank[student]:
+                print("INVALID (Unacceptable Pair: " + str(hospital) + ", " + str(student) + ")")
+                return False
+            assigned[student] = hospital
+
+    initialized = time.perf_counter()
+    stats.check_time += initialized - start
+
+    # Like the prefix mode, a hospital can only block with students above its worst admitted one (or anyone it ranks if it has room)
+    blocking = None
+    inspected = 0
+    for hospital in range(1, n_hospitals + 1):
+        students = assignment.get(hospital, [])
+        ranks = hospital_rank[hospital]
+        prefix = max(ranks[student] for student in students) if len(students) == capacities[hospital] else len(ranks)
+
+        blockingStudent = 0
+        for student in hospital_prefs[hospital][:prefix]:
+            current = assigned[student]
+            if current == hospital:
+                continue
+            inspected += 1
+            rank = student_rank[student].get(hospital)
+            if rank is not None and (current == 0 or rank < student_rank[student][current]) and (blockingStudent == 0 or student < blockingStudent):
+                blockingStudent = student
+
+        if blockingStudent:
+            blocking = hospital, blockingStudent
+            break
+
+    stats.pairs_inspected += inspected
+    stats.search_time += time.perf_counter() - initialized
+
+    if blocking is not None:
+        print("UNSTABLE [" + str(blocking[0]) + ", " + str(blocking[1]) + "]")
+        return False
+
+    print("VALID STABLE")
+    return True
+
+
+def _find_blocking_pair_classic(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[int, List[int]], pairs: Dict[int, int], reversePairs: Dict[int, int], stats: VerifierStats) -> Optional[Tuple[int, int]]:
+    """ Original O(n^3) blocking pair search, returns the first blocking pair (hospital, student) or None. """
+    start = time.perf_counter()
+
     # We'll visit each possible pair of (hospital, student) and check if they are unstable.
     for hospital in range(1, n + 1):
         # Get the hospital's current assignment and preference list.
@@ -81,74 +441,178 @@ def verifier(n: int, hospital_prefs: Dict[int, List[int]], student_prefs: Dict[i
 
             # If both the hospital and student prefer each other over their current assignment, they're unstable.
             if hospitalPrefer == True and studentPrefer == True:
-                print("UNSTABLE [" + str(hospital) + ", " + str(student) + "]")
-                return False
+                stats.pairs_inspected += (hospital - 1) * n + student
+                stats.search_time += time.perf_counter() - start
+                return hospital, student
 
-    # If made it here, matchings are valid and stable.
-    print("VALID STABLE")
-    return True
+    stats.pairs_inspected += n * n
+    stats.search_time += time.perf_counter() - start
+    return None
 
 def main():
+    """
+    Runnable from command line, without prompts:
+        python verifier.py input.in pairs.out
+        cat input.gsb | python verifier.py - pairs.out --mode array
+        python verifier.py input.in --engine array
+    The instance is read from the input file, or from stdin in one bulk read with "-" (text or binary, told apart by
+    the magic unless --format is given). Without a pairs file, the pairings are computed by gale_shapley() in the
+    same process. Prints "VALID STABLE" (or what is wrong) and exits with status 1 unless the pairings are valid and stable.
+    Errors and stats go to stderr. With --mode array or parallel (and a pairs file or --engine array), the instance
+    is loaded straight into int32 matrices (binary files are memory-mapped) and never converted to dicts.
+    With --mode sparse, the instance is read as incomplete lists (see the incomplete-list formats in data_helpers.py),
+    hospitals may be left unpaired, the pairings are checked by sparse_verifier(), and without a pairs file they
+    come from gale_shapley_sparse().
+    With no input file while stdin is a terminal (or with --interactive), asks for the input method instead (prompts on stderr).
+    """
+    from contextlib import redirect_stdout
+    from data_helpers import read_instance
+    from gale_shapley import ENGINES, gale_shapley
+
+    parser = argparse.ArgumentParser(description="Verify a matching against an instance read from a file or stdin.")
+    parser.add_argument("input", nargs="?", help="G-S input file, text or binary, or - for stdin")
+    parser.add_argument("pairs", nargs="?", help="G-S output file to verify (default: run the matcher)")
+    parser.add_argument("--format", choices=("text", "binary"), help="input format (default: detected from the binary magic)")
+    parser.add_argument("--mode", choices=VERIFIER_MODES, default="prefix", help="verifier mode (default: %(default)s)")
+    parser.add_argument("--engine", choices=ENGINES, default="rank", help="matcher engine used without a pairs file (default: %(default)s)")
+    parser.add_argument("--interactive", action="store_true", help="ask for the input method, the instance and the pairings")
+    parser.add_argument("--stats", action="store_true", help="print the verifier's work counters and timings to stderr")
+    args = parser.parse_args()
+
+    arrays = None
+    sparse = None
+    if args.interactive or (args.input is None and sys.stdin.isatty()):
+        n, hospital_prefs, student_prefs, pairs = _interactive_input()
+    elif args.mode in ("array", "parallel") and (args.pairs or args.engine == "array"):
+        # Straight into int32 matrices, the dicts are never built
+        with redirect_stdout(sys.stderr):
+            arrays, pairs = _read_arrays(args)
+        if arrays is None:
+            sys.exit(1)
+    elif args.mode == "sparse":
+        with redirect_stdout(sys.stderr):
+            sparse, pairs = _read_sparse(args)
+        if sparse is None:
+            sys.exit(1)
+    else:
+        with redirect_stdout(sys.stderr):
+            n, hospital_prefs, student_prefs = read_instance(args.input or "-", args.format)
+            if n < 1:
+                sys.exit(1)
+            if args.pairs:
+                try:
+                    pairs = parse_output(args.pairs)
+                except (OSError, ValueError) as e:
+                    print(f"Parse_Output Error: {e}")
+                    sys.exit(1)
+            else:
+                pairs = gale_shapley(n, hospital_prefs, student_prefs, engine=args.engine, validate=False)
+
+    stats = VerifierStats() if args.stats else None
+    if arrays is not None:
+        stable = verifier_array(arrays, pairs, mode=args.mode, stats=stats)
+    elif sparse is not None:
+        stable = sparse_verifier(sparse, pairs, stats=stats)
+    else:
+        stable = verifier(n, hospital_prefs, student_prefs, pairs, mode=args.mode, stats=stats)
+    if stats is not None:
+        print(f"Stats: {stats.report()}", file=sys.stderr)
+    if not stable:
+        sys.exit(1)
+
+def _read_arrays(args) -> Tuple[Optional[object], Optional[Dict[int, int]]]:
+    """ main()'s input for the array and parallel modes: a PreferenceArrays from read_instance_arrays() and the pairs, or None, None. """
+    from preference_arrays import read_instance_arrays, make_arrays, pairs_from_array
+    from gale_shapley import gale_shapley_array
+
+    n, hospital_prefs, student_prefs = read_instance_arrays(args.input or "-", args.format)
+    if n < 1:
+        return None, None
+    arrays = make_arrays(n, hospital_prefs, student_prefs, validated=True)
+    if not args.pairs:
+        return arrays, pairs_from_array(gale_shapley_array(arrays))
+    try:
+        return arrays, parse_output(args.pairs)
+    except (OSError, ValueError) as e:
+        print(f"Parse_Output Error: {e}")
+        return None, None
+
+def _read_sparse(args) -> Tuple[Optional[object], Optional[Dict[int, int]]]:
+    """ main()'s input for the sparse mode: a SparsePreferences from read_instance_sparse() and the pairs, or None, None. """
+    from sparse_preferences import read_instance_sparse, gale_shapley_sparse
+    from preference_arrays import pairs_from_array
+
+    n, sparse = read_instance_sparse(args.input or "-", args.format)
+    if n < 1:
+        return None, None
+    if not args.pairs:
+        return sparse, pairs_from_array(gale_shapley_sparse(sparse, validate=False))
+    try:
+        return sparse, parse_output(args.pairs)
+    except (OSError, ValueError) as e:
+        print(f"Parse_Output Error: {e}")
+        return None, None
+
+def _interactive_input() -> Tuple[int, Dict[int, List[int]], Dict[int, List[int]], Dict[int, int]]:
+    """ The original interactive flow: asks (on stderr) for the instance and the pairings, returns n, hospital_prefs, student_prefs, pairs. """
+    from gale_shapley import gale_shapley
+
+    def ask(prompt: str) -> str:
+        print(prompt, end="", file=sys.stderr, flush=True)
+        return input().strip()
+
     # Choose input mode
     while True:
-        mode = input("Which input method? file (1) or manual (2): ").strip()
+        mode = ask("Which input method? file (1) or manual (2): ")
         if mode in ("1", "2"):
             break
-        print("Invalid choice. Enter 1 or 2.")
+        print("Invalid choice. Enter 1 or 2.", file=sys.stderr)
 
     if mode == "1":
         # .in file
         while True:
-            in_path = input("Enter .in file path: ").strip()
+            in_path = ask("Enter .in file path: ")
             if in_path.endswith(".in") and os.path.isfile(in_path):
                 n, hospital_prefs, student_prefs = parse_input(in_path)
                 if n >= 1:
                     break
-            print("Invalid .in file.")
+            print("Invalid .in file.", file=sys.stderr)
 
         # Manual vs .out file
         while True:
-            resp = input("Use existing .out pairings? (Y/N): ").strip().lower()
+            resp = ask("Use existing .out pairings? (Y/N): ").lower()
             if resp in ("y", "n"):
                 break
-            print("Enter Y or N.")
+            print("Enter Y or N.", file=sys.stderr)
         if resp == "y":
             # .out file
             while True:
-                out_path = input("Enter .out file path: ").strip()
+                out_path = ask("Enter .out file path: ")
                 if out_path.endswith(".out") and os.path.isfile(out_path):
                     pairs = parse_output(out_path)
                     if len(pairs) >= 1:
                         break
-                print("Invalid .out file.")
-            
-        else:
-            # Use gale_shapley
-            pairs = gale_shapley(n, hospital_prefs, student_prefs)
-            print("----- Gale-Shapley Pairings -----")
-            for hospital, student in pairs.items():
-                print(f"{hospital} {student}")
+                print("Invalid .out file.", file=sys.stderr)
+            return n, hospital_prefs, student_prefs, pairs
 
     else:
         n, hospital_prefs, student_prefs = read_input()
 
         while True:
-            resp = input("Manually output pairings? (Y/N): ").strip().lower()
+            resp = ask("Manually output pairings? (Y/N): ").lower()
             if resp in ("y", "n"):
                 break
-            print("Enter Y or N.")
+            print("Enter Y or N.", file=sys.stderr)
 
         if resp == "y":
-            pairs = read_pairs(n)
-        else:
-            pairs = gale_shapley(n, hospital_prefs, student_prefs)
-            print("----- Gale-Shapley Pairings -----")
-            for hospital, student in pairs.items():
-                print(f"{hospital} {student}")
-            
-
-    print("Running verifier...")
-    verifier(n, hospital_prefs, student_prefs, pairs)
+            return n, hospital_prefs, student_prefs, read_pairs(n)
+
+    # Use gale_shapley
+    pairs = gale_shapley(n, hospital_prefs, student_prefs)
+    print("----- Gale-Shapley Pairings -----", file=sys.stderr)
+    for hospital, student in pairs.items():
+        print(f"{hospital} {student}", file=sys.stderr)
+    return n, hospital_prefs, student_prefs, pairs
 
 if __name__ == "__main__":
     main()